@@ -15,6 +15,11 @@ import atexit
 
 load_dotenv()
 
+# Wallets are kept in the trader's wallet store, its paths in .env are relative to app_dir
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app_dir'))
+from library.wallet_store import WalletStore
+wallet_store = WalletStore(os.path.join('app_dir', os.getenv('WALLET_STORE_DB_PATH', '../configs/wallet_store.db')), os.path.join('app_dir', os.getenv('WALLET_SETTINGS', 'wallet_settings.json')))
+
 # Global variables
 redirect_logs = True
 show_terminal_button = None
@@ -180,19 +185,13 @@ def generate_wallet_credentials():
     return wallet_address, private_key
 
 def load_settings():
-    with open('app_dir/wallet_settings.json', 'r') as file:
-        return json.load(file)
-
-def save_settings(settings):
-    with open('app_dir/wallet_settings.json', 'w') as file:
-        json.dump(settings, file, indent=4)
+    return wallet_store.load_all()
 
 def update_settings(wallet, new_status, status_label, toggle_button):
-    settings = load_settings()
-    previous_status = settings[wallet]['enabled'] == "True"
+    previous_status = wallet_store.get(wallet)['enabled'] == "True"
     print(f"Updating settings for {wallet} to {not previous_status}")
-    settings[wallet]['enabled'] = str(not previous_status)
-    save_settings(settings)
+    # Only this wallet's row changes, the trader may be saving other wallets at the same time
+    settings = {wallet: wallet_store.update_settings(wallet, {'enabled': str(not previous_status)})}
     QMessageBox.information(None, "Update Successful", f"Settings for {wallet} have been updated to {'enabled' if settings[wallet]['enabled'] else 'disabled'}.")
     status_label.setText(f"<b>{wallet.upper()} IS <font color={'green' if settings[wallet]['enabled'] else 'red'}>{'ENABLED' if settings[wallet]['enabled'] else 'DISABLED'}</font></b>")
     toggle_button.setText(f"{'Disable' if settings[wallet]['enabled'] else 'Enable'} Wallet")
@@ -200,9 +199,7 @@ def update_settings(wallet, new_status, status_label, toggle_button):
     return settings[wallet]['enabled']
 
 def update_wallet_config(wallet, config_key, new_value, config_label):
-    settings = load_settings()
-    settings[wallet][config_key] = new_value
-    save_settings(settings)
+    wallet_store.update_settings(wallet, {config_key: new_value})
     QMessageBox.information(None, "Configuration Updated", f"Configuration {config_key} for {wallet} has been updated.")
     config_label.setText(f"{config_key}: {new_value}")
     
@@ -211,8 +208,7 @@ def load_wallet_template():
         return json.load(file)['template']
 
 def add_wallet(wallet_name, config_windows):
-    settings = load_settings()
-    if wallet_name in settings:
+    if wallet_store.get(wallet_name) is not None:
         QMessageBox.warning(None, "Warning", "Wallet already exists.")
         return
     wallet_template = load_wallet_template()
@@ -220,16 +216,14 @@ def add_wallet(wallet_name, config_windows):
     wallet_address, private_key = generate_wallet_credentials()
     wallet_template['wallet_address'] = wallet_address
     wallet_template['private_key'] = private_key
-    settings[wallet_name] = wallet_template
-    save_settings(settings)
+    if not wallet_store.add_wallet(wallet_name, wallet_template):
+        QMessageBox.warning(None, "Warning", "Wallet already exists.")
+        return
     QMessageBox.information(None, "Success", "Wallet added successfully with a new address and private key.")
     refresh_wallet_list(config_windows)  # Refresh the wallet list UI
 
 def delete_wallet(wallet_name, config_windows):
-    settings = load_settings()
-    if wallet_name in settings:
-        del settings[wallet_name]
-        save_settings(settings)
+    if wallet_store.delete_wallet(wallet_name):
         QMessageBox.information(None, "Success", "Wallet deleted successfully.")
         refresh_wallet_list(config_windows)  # Refresh the wallet list UI
     else:
@@ -625,8 +619,7 @@ def remove_selected_items(file_path, table):
         table.removeRow(row)
 
 def show_config(wallet, root, config_windows):
-    settings = load_settings()
-    details = settings[wallet]
+    details = wallet_store.get(wallet)
     if wallet not in config_windows:
         config_window = QWidget()
         config_window.setWindowTitle(f"Configuration for {wallet}")
@@ -701,7 +694,7 @@ def show_config(wallet, root, config_windows):
 
     update_button = QPushButton("Update All", button_container)
     update_button.setStyleSheet("background-color: blue; color: white; font-size: 12pt;")
-    update_button.clicked.connect(lambda: update_all_configs(wallet, entries, config_windows))
+    update_button.clicked.connect(lambda: update_all_configs(wallet, entries, config_windows, details))
     button_layout.addWidget(update_button)
 
     reset_button = QPushButton("Reset Current Holdings", button_container)
@@ -711,22 +704,29 @@ def show_config(wallet, root, config_windows):
 
     config_window.show()
 
-def update_all_configs(wallet, entries, config_windows):
-    settings = load_settings()
+def update_all_configs(wallet, entries, config_windows, details):
+    # Only the fields edited in this window are written, balances and holdings the trader saved meanwhile are kept
+    changes = {}
     for key, entry_widget in entries.items():
         new_value = entry_widget.currentText() if isinstance(entry_widget, QComboBox) else entry_widget.text()
-        settings[wallet][key] = new_value
-    save_settings(settings)
+        if new_value != str(details.get(key)):
+            changes[key] = new_value
+    settings = {wallet: wallet_store.update_settings(wallet, changes)}
+    if settings[wallet] is None:
+        # Deleted while this window was open
+        QMessageBox.warning(None, "Warning", "Wallet does not exist.")
+        return
+    details.update(settings[wallet])
     QMessageBox.information(None, "Configuration Updated", f"All configurations for {wallet} have been updated.")
     for key, entry_widget in entries.items():
         if isinstance(entry_widget, QLineEdit):
-            entry_widget.setText(settings[wallet][key])
+            entry_widget.setText(str(settings[wallet][key]))
     config_windows[wallet].raise_()
 
 def reset_current_holdings(wallet, entries):
-    settings = load_settings()
-    settings[wallet]['current_holdings'] = {}
-    save_settings(settings)
+    if wallet_store.update_settings(wallet, {'current_holdings': {}}) is None:
+        QMessageBox.warning(None, "Warning", "Wallet does not exist.")
+        return
     entries['current_holdings'].setText("{}")
     QMessageBox.information(None, "Holdings Reset", "Current holdings have been reset to 0.")
 
@@ -6,6 +6,10 @@ from termcolor import colored
 import datetime
 import random  # Import for simulating network factors
 from library.transaction_builder import estimate_gas_fee, check_coin_approval, calculate_slippage  # Importing functions from modified_trade.py
+from library.snapshot_store import get_snapshot_store
+from library.wallet_store import get_wallet_store
+from library.price_record import format_price
+from library.token_registry import get_token_registry
 from loguru import logger
 from tqdm import tqdm  # Import for progress bar
 import argparse
@@ -23,6 +27,7 @@ coin_mapping = {}
 coin_counts = {}
 desired_coin_list = os.getenv('DESIRED_COIN_FILE', 'desired_coin_list.json')
 available_coin_list = os.getenv('AVAILABLE_COIN_FILE', 'available_coin_list.json')
+token_registry = get_token_registry(available_coin_list)
 
 def load_json_file(file_path):
     """Load and return JSON data from a file."""
@@ -31,11 +36,10 @@ def load_json_file(file_path):
 
 def filter_market_data(binance_coins):
     """Filter and return market data for coins present in binance_coins."""
-    coin_list = load_json_file(available_coin_list)
-    return {coin_id: coin_info['symbol'].lower() for coin_id, coin_info in coin_list.items() if coin_info['symbol'].lower() in binance_coins}
+    return {coin_id: coin_info['symbol'].lower() for coin_id, coin_info in token_registry.coins.items() if coin_info['symbol'].lower() in binance_coins}
 
 # Load wallet settings
-wallet_settings = load_json_file(os.getenv('WALLET_SETTINGS', 'wallet_settings.json'))
+wallet_settings = get_wallet_store().load_all()
 
 # Filter market data for desired coins
 coin_mapping = filter_market_data([coin.lower() for coin in load_json_file(desired_coin_list)])
@@ -64,9 +68,10 @@ wallet_trading_stats = {wallet_id: {
     'slippage_losses': 0,  # New field to track losses due to slippage
 } for wallet_id, settings in wallet_settings.items()}
 
-# Load and sort data files
+# Open the snapshot store, rounds are already ordered from oldest to newest
 data_directory = os.getenv('DATA_DIRECTORY', 'data')
-data_files = sorted(os.listdir(data_directory))  # Sort data files from oldest to newest
+snapshot_store = get_snapshot_store(data_directory)
+data_files = snapshot_store.snapshot_ids()
 
 def simulate_network_factor():
     """Simulate network congestion that might affect trade execution with improved accuracy."""
@@ -108,14 +113,14 @@ def process_trade_actions(wallet_id, file_index, current_prices, previous_prices
     """Process trade actions based on current and previous prices."""
     stats = wallet_trading_stats[wallet_id]
     settings = wallet_settings[wallet_id]
-    available_coins = load_json_file(available_coin_list)
+    available_coins = token_registry.coins
     trade_datetime = datetime.datetime.fromtimestamp(int(data_files[file_index]) / 1000000).strftime('%Y-%m-%d %H:%M:%S.%f')
     for coin_id, price_info in current_prices.items():
-        dex_price = float(price_info[-1]) if len(price_info) > 2 and price_info[-1] != "N/A" and float(price_info[-1]) != 0 else 0
+        dex_price = price_info.real_price
         if coin_id in stats['current_holdings']:
             holding_info = stats['current_holdings'][coin_id]
-            if float(holding_info[0]) != 0:
-                sell_ratio = dex_price / float(holding_info[0])
+            if holding_info[0] != 0:
+                sell_ratio = dex_price / holding_info[0]
                 simulated_sell_price = dex_price
                 coin_name = available_coins[coin_id]['symbol']
                 tokens_sold = holding_info[2] 
@@ -133,14 +138,14 @@ def process_trade_actions(wallet_id, file_index, current_prices, previous_prices
                     stats['wins'] += profit_or_loss
                     stats['total_money_gained'] += money_received
                     if DEBUG_MODE:
-                        print(colored(f"{wallet_id} : SELLING TOKENS {coin_name} at {trade_datetime}: \nCurrent Price - {holding_info[0]} \nDEX Price - {dex_price} \nMoney Received - {money_received} \nTokens Sold - {tokens_sold} \nPercentage Change - {percentage_change:.2f}% \nPrice Ratio - {sell_ratio:.2f} \nToken Volume - {float(price_info[1])}", "green"))
+                        print(colored(f"{wallet_id} : SELLING TOKENS {coin_name} at {trade_datetime}: \nCurrent Price - {format_price(holding_info[0])} \nDEX Price - {format_price(dex_price)} \nMoney Received - {money_received} \nTokens Sold - {tokens_sold} \nPercentage Change - {percentage_change:.2f}% \nPrice Ratio - {sell_ratio:.2f} \nToken Volume - {price_info.volume}", "green"))
                     record_trade(wallet_id, True, file_index, coin_id, price_info, tokens_sold, money_received, percentage_change)
                     update_token_state(coin_id, price_info)
                 elif sell_ratio <= settings['STOP_LOSS_TARGET']:
                     stats['losses'] += -profit_or_loss
                     stats['total_money_lost'] += money_received
                     if DEBUG_MODE:
-                        print(colored(f"{wallet_id} : STOPLOSS TOKENS {coin_name} at {trade_datetime}: \nCurrent Price - {holding_info[0]} \nDEX Price - {dex_price} \nMoney Received - {money_received} \nTokens Sold - {tokens_sold} \nPercentage Change - {percentage_change:.2f}% \nPrice Ratio - {sell_ratio:.2f} \nToken Volume - {float(price_info[1])}", "red"))
+                        print(colored(f"{wallet_id} : STOPLOSS TOKENS {coin_name} at {trade_datetime}: \nCurrent Price - {format_price(holding_info[0])} \nDEX Price - {format_price(dex_price)} \nMoney Received - {money_received} \nTokens Sold - {tokens_sold} \nPercentage Change - {percentage_change:.2f}% \nPrice Ratio - {sell_ratio:.2f} \nToken Volume - {price_info.volume}", "red"))
                     record_trade(wallet_id, False, file_index, coin_id, price_info, tokens_sold, money_received, percentage_change)
                     update_token_state(coin_id, price_info)
         else:
@@ -153,14 +158,14 @@ def process_trade_actions(wallet_id, file_index, current_prices, previous_prices
                         print(colored(f"Execution failed for {coin_id} due to network congestion at {trade_datetime}", "red"))
                     break  # Skip this trade due to network issues
                 try:
-                    money_spent = max(min(float(settings['MAXIMUM_BUY']), float(price_info[1]) / simulated_buy_price), float(settings['MINIMUM_BUY']))
+                    money_spent = max(min(float(settings['MAXIMUM_BUY']), price_info.volume / simulated_buy_price), float(settings['MINIMUM_BUY']))
                     tokens_to_buy = (money_spent - settings['FEE']) / simulated_buy_price * ((100 - settings['SLIPPAGE']) / 100)
                 except ZeroDivisionError:
                     tokens_to_buy = 0
                     money_spent = 0
                     break
                 if DEBUG_MODE:
-                    print(colored(f"{wallet_id} : BUYING TOKENS {available_coins[coin_id]['symbol']} at {trade_datetime}: \nCurrent Price - {format(float(price_info[0]), '.8f')} \nDEX Price - {format(float(simulated_buy_price), '.8f')} \nMoney Spent - {format(float(money_spent), '.2f')} \nTokens Bought - {format(float(tokens_to_buy), '.2f')}", "blue"))
+                    print(colored(f"{wallet_id} : BUYING TOKENS {available_coins[coin_id]['symbol']} at {trade_datetime}: \nCurrent Price - {format(price_info.price, '.8f')} \nDEX Price - {format(simulated_buy_price, '.8f')} \nMoney Spent - {format(float(money_spent), '.2f')} \nTokens Bought - {format(float(tokens_to_buy), '.2f')}", "blue"))
                 buy_coin(wallet_id, coin_id, file_index, price_info, tokens_to_buy, money_spent)
                 stats['money_spent'] += money_spent
                 update_token_state(coin_id, price_info)
@@ -169,7 +174,7 @@ def record_trade(wallet_id, is_win, file_index, coin_id, price_info, tokens, mon
     """Record a trade as win or loss, including tokens traded and money involved."""
     stats = wallet_trading_stats[wallet_id]
     trade_duration = int(data_files[file_index]) - stats['current_holdings'][coin_id][1]
-    trade_info = (trade_duration, coin_mapping[coin_id], stats['current_holdings'][coin_id][1], stats['current_holdings'][coin_id][0], int(data_files[file_index]), price_info[-1], tokens, money, percentage_change)
+    trade_info = (trade_duration, coin_mapping[coin_id], stats['current_holdings'][coin_id][1], stats['current_holdings'][coin_id][0], int(data_files[file_index]), price_info.real_price, tokens, money, percentage_change)
     if is_win:
         stats['winning_trades'].append(trade_info)
     else:
@@ -188,18 +193,18 @@ def should_buy(wallet_id, coin_id, price_info, previous_prices):
         update_token_state(coin_id, price_info)
         return False
     
-    current_price = float(price_info[-1]) if len(price_info) > 2 and price_info[-1] != 'N/A' and float(price_info[-1]) != 0 else 0
-    previous_price = float(previous_prices[coin_id][-1]) if len(previous_prices[coin_id]) > 2 and previous_prices[coin_id][-1] != 'N/A' and float(previous_prices[coin_id][-1]) != 0 else 0
+    current_price = price_info.real_price
+    previous_price = previous_prices[coin_id].real_price
     
     if current_price == 0 or previous_price == 0:
         return False
     
-    return coin_id in coin_mapping and previous_price != 0 and current_price / previous_price <= settings['BUY_TARGET'] and float(price_info[1]) > float(settings['MINIMUM_VOLUME'])
+    return coin_id in coin_mapping and previous_price != 0 and current_price / previous_price <= settings['BUY_TARGET'] and price_info.volume > float(settings['MINIMUM_VOLUME'])
 
 def buy_coin(wallet_id, coin_id, file_index, price_info, tokens_to_buy, money_spent):
     """Buy a coin and update current holdings, including tokens bought and money spent."""
     stats = wallet_trading_stats[wallet_id]
-    stats['current_holdings'][coin_id] = (price_info[-1], int(data_files[file_index]), tokens_to_buy, money_spent)
+    stats['current_holdings'][coin_id] = (price_info.real_price, int(data_files[file_index]), tokens_to_buy, money_spent)
     stats['total_holding_value'] += money_spent  # Add the value of the new holding
     stats['total_holding_trades'] += 1  # Increment the total holding trades count when a new coin is bought
 
@@ -208,25 +213,17 @@ def buy_coin(wallet_id, coin_id, file_index, price_info, tokens_to_buy, money_sp
 def load_prices(file_index, data_files, trade_mode, timeframe):
     global token_state
 
-    def read_json_file(file_path):
-        with open(file_path) as f:
-            try:
-                return json.load(f)["0"]
-            except json.JSONDecodeError:
-                f.seek(0)
-                return json.loads(f.readline())["0"]
-
-    current_prices = read_json_file(os.path.join(data_directory, data_files[file_index]))
+    current_prices = snapshot_store.read(file_index)
 
     if trade_mode == "Event":
         if token_state:
             previous_prices = token_state
         else:
-            previous_prices = read_json_file(os.path.join(data_directory, data_files[file_index]))
+            previous_prices = snapshot_store.read(file_index)
             token_state = previous_prices
     elif trade_mode == "TimeFrame":
         target_file_index = max(0, file_index - timeframe)  # Ensure non-negative index
-        previous_prices = read_json_file(os.path.join(data_directory, data_files[target_file_index]))
+        previous_prices = snapshot_store.read(target_file_index)
 
     return current_prices, previous_prices
 
@@ -6,6 +6,10 @@ import sys
 import json, os
 from dotenv import load_dotenv
 from library.transaction_builder import get_token_price_from_router, get_token_address, load_router_contract, get_token_price_from_router_2
+from library.snapshot_store import get_snapshot_store
+from library.token_registry import get_token_registry
+from library.utils import get_web3
+from library.price_record import PriceRecord
 import concurrent.futures
 from loguru import logger  # Add this import
 
@@ -33,18 +37,19 @@ minimum_volume = float(os.getenv('MINIMUM_VOLUME'))
 data_location = os.getenv('DATA_DIRECTORY')
 coingecko_api_key = os.getenv('COINGECKO_API_KEY')
 market_prices = {}
+fetched_block_number = 0
 
 def load_json_file(file_path):
     with open(file_path, 'r') as file:
         return json.load(file)
 
-# Load desired and available coins from JSON files
+# Load desired coins from JSON, available coins come from the registry shared with the trader
 desired_coins_list = load_json_file(desired_coin_file)
-available_coins_list = load_json_file(available_coin_file)
+token_registry = get_token_registry(available_coin_file)
 
 # Convert coin symbols to lowercase for comparison
 desired_coins_symbols_lowercase = {coin.lower() for coin in desired_coins_list}
-available_coins_symbols_lowercase = {coin['symbol'].lower() for coin in available_coins_list.values()}
+available_coins_symbols_lowercase = {coin['symbol'].lower() for coin in token_registry.coins.values()}
 
 # Identify Binance coins by finding the intersection of desired and available coins
 binance_coins_intersection = desired_coins_symbols_lowercase & available_coins_symbols_lowercase
@@ -106,39 +111,20 @@ def fetch_bsc_coins(provider='coingecko'):
     update_available_coins(available_coin_file, updated_available_coins_data)
 
 def update_available_coins(file_path, coins_data):
-    try:
-        with open(file_path, 'r') as file:
-            existing_data = json.load(file)
-    except FileNotFoundError:
-        existing_data = {}
-
-    is_updated = False
-    existing_symbols = {coin_info['symbol'].lower(): id for id, coin_info in existing_data.items()}
-
-    # Append new data, avoiding duplicates
-    for coin_id, coin_info in coins_data.items():
-        symbol = coin_info.get('symbol', 'N/A').lower()
-        if symbol in existing_symbols:
-            # Update existing coin data
-            existing_id = existing_symbols[symbol]
-            existing_data[existing_id].update(coin_info)
-            is_updated = True
-        else:
-            # Add new coin data
-            existing_data[coin_id] = coin_info
-            existing_symbols[symbol] = coin_id
-            is_updated = True
+    registry = get_token_registry(file_path)
+    registry.refresh()
+
+    # Append new data, coins already known by symbol are updated in place
+    is_updated = registry.merge(coins_data)
 
     # Save updated data if changes were made
     if is_updated:
-        with open(file_path, 'w') as file:
-            json.dump(existing_data, file, indent=4)
+        registry.save()
         logger.info("Coin list updated.")  # Changed
 
-def log_cmc_data(unique_id, data):
-    formatted_id = str(unique_id).zfill(20)
-    with open(f"{data_location}/{formatted_id}", "w") as file:
-        file.write(data)
+def log_cmc_data(unique_id, data, block_number=0):
+    # Append the round to the columnar snapshot store instead of writing one JSON file per round
+    return get_snapshot_store(data_location).append(unique_id, data, block_number=block_number)
 
 def fetch_blockchain_price(filtered_prices_data, coins_data):
     logger.info("Fetch From Blockchain started...")  # Changed
@@ -162,17 +148,17 @@ def fetch_blockchain_price(filtered_prices_data, coins_data):
 
                 coin_id = futures[future]
                 data = filtered_prices_data[coin_id]
-                price = "{:.18f}".format(float(data.get('usd', 0))).rstrip('0').rstrip('.')
-                volume_24h = "{:.2f}".format(float(data.get('usd_24h_vol', 0)))
                 symbol = data.get('symbol', 'N/A').lower()
                 contract_address = coin_addresses[coin_id] or "N/A"
-                real_price = "{:.18f}".format(float(future.result())).rstrip('0').rstrip('.') if future.result() else "0"
-                market_prices[coin_id] = [price, volume_24h, real_price]
+                real_price = float(future.result()) if future.result() else 0.0
+                market_prices[coin_id] = PriceRecord(float(data.get('usd', 0)), float(data.get('usd_24h_vol', 0)), real_price, 0.0)
                 coins_data[coin_id] = {"symbol": symbol, "contract_address": contract_address}
         except concurrent.futures.TimeoutError:
-            logger.error("Timeout while fetching blockchain data. Your network is not stable or the node is too slow?")  # Changed
-            executor.shutdown(wait=False)  # Immediately free up resources
-            raise Exception("Operation timed out and was cancelled.")
+            # Keep the prices that arrived and drop the stragglers instead of failing the whole round
+            pending = [future for future in futures if not future.done()]
+            for future in pending:
+                future.cancel()
+            logger.warning(f"Timeout while fetching blockchain data, continuing with {completed_futures}/{total_futures} prices ({len(pending)} dropped)")
         except Exception as e:
             logger.error(f"An error occurred: {e}")  # Changed
     return market_prices, coins_data
@@ -189,8 +175,19 @@ async def batch_fetch_blockchain_price(filtered_prices_data, coins_data, provide
     
     addr_list = [addr for addr in coin_addresses.values() if addr and addr != "N/A"]
     
-    data_token = await get_token_price_from_router_2(addr_list, router_contract)
+    # Pin the whole pricing pass to one block and record it with the snapshot
+    global fetched_block_number
+    fetched_block_number = get_web3().eth.block_number
+    data_token = await get_token_price_from_router_2(addr_list, router_contract, block_identifier=fetched_block_number)
+    if data_token is None:
+        logger.warning("On-chain pricing failed for this round, continuing with API data only")
+        data_token = {}
     
+    # Reverse index so each router result maps back to its coin in O(1), first coin wins like the old scan
+    address_to_coin = {}
+    for coin_id, addr in valid_coin_addresses.items():
+        address_to_coin.setdefault(addr, coin_id)
+
     total_tokens = len(data_token)
     processed_tokens = 0
     start_time = time.time()
@@ -198,15 +195,15 @@ async def batch_fetch_blockchain_price(filtered_prices_data, coins_data, provide
     for token_address, token_data in data_token.items():
         processed_tokens += 1
         
-        coin_id = next((id for id, addr in valid_coin_addresses.items() if addr == token_address), None)
+        coin_id = address_to_coin.get(token_address)
         if coin_id:
             data = filtered_prices_data[coin_id]
-            price_usd = "{:.18f}".format(float(data.get('usd', 0) if provider == 'coingecko' else 0)).rstrip('0').rstrip('.')
-            volume_24h = "{:.2f}".format(float(data.get('usd_24h_vol', 0) if provider == 'coingecko' else data.get('v24hUSD', 0))).rstrip('0').rstrip('.')
+            price_usd = float(data.get('usd', 0) if provider == 'coingecko' else 0)
+            volume_24h = float(data.get('usd_24h_vol', 0) if provider == 'coingecko' else data.get('v24hUSD', 0))
             symbol = data.get('symbol', 'N/A').lower()
-            real_price = "{:.18f}".format(float(token_data[0])).rstrip('0').rstrip('.') if token_data[0] else "0"
-            market_cap = "{:.2f}".format(float(token_data[1])).rstrip('0').rstrip('.') if token_data[1] else "0"
-            market_prices[coin_id] = [price_usd, volume_24h, real_price, market_cap]
+            real_price = float(token_data[0]) if token_data[0] else 0.0
+            market_cap = float(token_data[1]) if token_data[1] else 0.0
+            market_prices[coin_id] = PriceRecord(price_usd, volume_24h, real_price, market_cap)
             coins_data[coin_id] = {"symbol": symbol, "contract_address": token_address}
         
         # Update progress
@@ -279,7 +276,7 @@ async def fetch_birdeye():
 def fetch_api_price():
     global market_prices
     api_url = f"{os.getenv('COINGECKO_URL')}/api/v3/simple/price"
-    all_coin_ids = [coin['id'] for coin in available_coins_list.values() if 'id' in coin]
+    all_coin_ids = [coin['id'] for coin in token_registry.coins.values() if 'id' in coin]
     # Splitting all_coin_ids into chunks of 250 for batch processing
     chunks = [all_coin_ids[i:i + 250] for i in range(0, len(all_coin_ids), 250)]
     all_prices_data = []
@@ -359,16 +356,25 @@ def fetch_prices_for_chunk(chunk, api_url):
         logger.error(f"Failed to fetch prices for chunk: {response.status_code}")  # Changed
         return None
     
-if __name__ == "__main__":
-    # fetch_birdeye()
+def run_fetch_round(provider='birdeye'):
+    # One fetch round as a plain function so a long-lived process can keep web3, contracts and coin lists warm
     start_time = time.time()
+    global fetched_block_number
+    market_prices.clear()  # Start every round from an empty snapshot, tokens from older rounds must not leak in
+    fetched_block_number = 0
+    token_registry.refresh()
 
-    fetch_bsc_coins(provider='birdeye')
-    asyncio.run(fetch_market_data(provider='birdeye'))
+    fetch_bsc_coins(provider=provider)
+    asyncio.run(fetch_market_data(provider=provider))
 
     logger.info(f"here\n{len(market_prices)}")  # Changed
-    data_log = {"0": market_prices}
-    log_cmc_data(int(time.time() * 1000000), json.dumps(data_log))
+    snapshot_id = log_cmc_data(int(time.time() * 1000000), market_prices, fetched_block_number)
 
     end_time = time.time()
     logger.info(f"Total time spent on Fetching BSC Coins and Market Data: {end_time - start_time} seconds")  # Changed
+    # Hand the snapshot to the caller so the trader does not have to read it back from disk
+    return snapshot_id, dict(market_prices)
+
+if __name__ == "__main__":
+    # fetch_birdeye()
+    run_fetch_round(provider='birdeye')
@@ -0,0 +1,32 @@
+from types import MappingProxyType
+from library.strategy import MarketUniverse
+
+
+class MarketContext:
+    # Market inputs of one round, built once and shared read-only by every wallet
+    def __init__(self, snapshot_store, snapshot_id, latest_data, filtered_coins, blacklist):
+        self.snapshot_store = snapshot_store
+        self.round_count = len(snapshot_store)
+        self.snapshot_id = snapshot_id
+        self.latest_data = MappingProxyType(latest_data)
+        self.universe = MarketUniverse(latest_data)
+        for column in (self.universe.price, self.universe.volume, self.universe.real_price, self.universe.market_cap):
+            column.flags.writeable = False
+        self.filtered_coins = MappingProxyType(filtered_coins)  # coin id -> lowercase symbol of the coins wallets may trade
+        self.blacklist = frozenset(blacklist)
+        self.comparisons = {}  # timeframe -> snapshot that many rounds back
+        self.comparison_prices = {}  # timeframe -> its price column aligned with the universe
+
+    def comparison(self, timeframe):
+        # Read on first use, wallets sharing a timeframe share the snapshot
+        data = self.comparisons.get(timeframe)
+        if data is None:
+            data = self.comparisons[timeframe] = MappingProxyType(self.snapshot_store.read(-timeframe))
+        return data
+
+    def comparison_price(self, timeframe):
+        prices = self.comparison_prices.get(timeframe)
+        if prices is None:
+            prices = self.comparison_prices[timeframe] = self.universe.align(self.comparison(timeframe))
+            prices.flags.writeable = False
+        return prices
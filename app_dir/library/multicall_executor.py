@@ -0,0 +1,129 @@
+import os
+import time
+import asyncio
+import threading
+import concurrent.futures
+from dotenv import load_dotenv
+from loguru import logger
+
+# Load environment variables
+load_dotenv()
+
+# Chunking settings, the chunk size adapts between the bounds from what the node accepts and how fast it answers
+multicall_workers = int(os.getenv('MULTICALL_WORKERS', 8))
+initial_chunk_size = int(os.getenv('MULTICALL_CHUNK_SIZE', 1000))
+min_chunk_size = int(os.getenv('MULTICALL_MIN_CHUNK_SIZE', 50))
+max_chunk_size = int(os.getenv('MULTICALL_MAX_CHUNK_SIZE', 5000))
+target_latency = float(os.getenv('MULTICALL_TARGET_LATENCY', 2.0))
+max_split_depth = int(os.getenv('MULTICALL_MAX_SPLIT_DEPTH', 6))  # Halvings of one rejected chunk before its calls are given up as failed
+transport_attempts = int(os.getenv('MULTICALL_TRANSPORT_ATTEMPTS', 2))  # Sends of a whole chunk when the node times out or drops the connection
+
+# Node errors meaning the chunk was too big for it (gas cap, response size), the only ones worth splitting the chunk for
+OVERSIZED_MARKERS = ('gas', 'too large', 'too big', 'response size', 'exceeds', 'payload')
+
+FAILED_RESULT = (False, b'')
+
+multicall_executors = {}
+
+
+def is_oversized(error):
+    return any(marker in str(error).lower() for marker in OVERSIZED_MARKERS)
+
+
+class MulticallExecutor:
+    # Runs aggregate3 calls in concurrent chunks over a bounded thread pool
+    def __init__(self, multicall_contract, workers=multicall_workers, chunk_size=initial_chunk_size):
+        self.multicall = multicall_contract
+        self.workers = max(1, workers)
+        self.chunk_size = max(min_chunk_size, min(chunk_size, max_chunk_size))
+        self.lock = threading.Lock()
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='multicall')
+
+    def _record_success(self, size, elapsed):
+        # Additive increase while the node answers quickly, back off gently when it slows down
+        with self.lock:
+            if elapsed < target_latency and size >= self.chunk_size:
+                self.chunk_size = min(max_chunk_size, self.chunk_size + max(min_chunk_size, self.chunk_size // 4))
+            elif elapsed > target_latency * 2:
+                self.chunk_size = max(min_chunk_size, int(self.chunk_size * 0.75))
+
+    def _record_failure(self, size):
+        # Multiplicative decrease, the node rejected the batch as too large
+        # Halves produced by bisection are smaller than the current size and do not shrink it further
+        with self.lock:
+            if size >= self.chunk_size:
+                self.chunk_size = max(min_chunk_size, size // 2)
+
+    def _call(self, calls, block_identifier):
+        start_time = time.time()
+        results = self.multicall.functions.aggregate3(calls).call(block_identifier=block_identifier)
+        self._record_success(len(calls), time.time() - start_time)
+        return results
+
+    def _send_chunk(self, calls, block_identifier):
+        # Timeouts, dropped connections and 5xx answers are retried as a whole chunk, then raised to the caller
+        for attempt in range(transport_attempts):
+            try:
+                return self._call(calls, block_identifier)
+            except Exception as e:
+                if is_oversized(e) or attempt == transport_attempts - 1:
+                    raise
+                logger.debug(f"Multicall chunk of {len(calls)} calls failed, sending it again: {e}")
+                time.sleep(0.5 * (attempt + 1))
+
+    def _execute_chunk(self, calls, block_identifier, depth=0):
+        # A chunk the node rejects as too large is split in two and each half retried, a bounded number of times
+        try:
+            return self._send_chunk(calls, block_identifier)
+        except Exception as e:
+            if not is_oversized(e):
+                raise
+            self._record_failure(len(calls))
+            if len(calls) == 1 or depth >= max_split_depth:
+                logger.debug(f"Multicall gave up on {len(calls)} calls starting at {calls[0][0]}: {e}")
+                return [FAILED_RESULT] * len(calls)
+            middle = len(calls) // 2
+            logger.debug(f"Multicall chunk of {len(calls)} calls rejected as too large, retrying in halves: {e}")
+            return self._execute_chunk(calls[:middle], block_identifier, depth + 1) + self._execute_chunk(calls[middle:], block_identifier, depth + 1)
+
+    def execute(self, calls, block_identifier='latest'):
+        # Returns one (success, return_data) per call, in the order of calls
+        calls = list(calls)
+        if not calls:
+            return []
+        chunks = []
+        position = 0
+        while position < len(calls):
+            size = self.chunk_size
+            chunks.append((position, calls[position:position + size]))
+            position += size
+        results = [FAILED_RESULT] * len(calls)
+        futures = {self.pool.submit(self._execute_chunk, chunk, block_identifier): (offset, len(chunk)) for offset, chunk in chunks}
+        transport_errors = []
+        for future in concurrent.futures.as_completed(futures):
+            offset, size = futures[future]
+            try:
+                chunk_results = future.result()
+            except Exception as e:
+                # Out of transport attempts, only this chunk's calls fail and the other chunks keep their results
+                logger.warning(f"Multicall chunk of {size} calls at {offset} failed after {transport_attempts} attempts: {e}")
+                transport_errors.append(e)
+                continue
+            results[offset:offset + len(chunk_results)] = [(bool(result[0]), bytes(result[1])) for result in chunk_results]
+        if len(transport_errors) == len(chunks):
+            raise transport_errors[-1]  # Nothing came back, the caller falls back as it does when the node is down
+        logger.info(f"Multicall executed {len(calls)} calls in {len(chunks)} chunks, next chunk size {self.chunk_size}")
+        return results
+
+    async def execute_async(self, calls, block_identifier='latest'):
+        # Keep the event loop free while the worker threads wait on the node
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.execute, calls, block_identifier)
+
+
+def get_multicall_executor(multicall_contract):
+    # One executor per multicall contract so the learned chunk size survives between rounds
+    executor = multicall_executors.get(multicall_contract.address)
+    if executor is None:
+        executor = multicall_executors[multicall_contract.address] = MulticallExecutor(multicall_contract)
+    return executor
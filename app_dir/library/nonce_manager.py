@@ -0,0 +1,89 @@
+import threading
+from web3 import Web3
+from loguru import logger
+
+# Send errors that mean the local nonce is out of step with the chain
+NONCE_ERROR_MARKERS = ('nonce too low', 'nonce too high', 'replacement transaction underpriced', 'invalid nonce')
+ALREADY_KNOWN_MARKERS = ('already known', 'known transaction')
+
+nonce_managers = {}
+nonce_managers_lock = threading.Lock()
+
+
+class NonceManager:
+    # Hands out consecutive nonces of one wallet locally so several transactions can be in flight at once
+    def __init__(self, web3, wallet_address):
+        self.web3 = web3
+        self.wallet_address = Web3.to_checksum_address(wallet_address)
+        self.lock = threading.Lock()
+        self.next_nonce = None  # None until synced from the chain
+
+    def invalidate(self):
+        # Out of step with the chain, the next reserve reads the pending count again
+        with self.lock:
+            self.next_nonce = None
+
+    def seed(self, pending_nonce):
+        # A pending count read elsewhere (trade preflight), only moves the local nonce forward
+        with self.lock:
+            if self.next_nonce is None or pending_nonce > self.next_nonce:
+                self.next_nonce = pending_nonce
+
+    def reserve(self):
+        with self.lock:
+            if self.next_nonce is None:
+                self.next_nonce = self.web3.eth.get_transaction_count(self.wallet_address, 'pending')
+                logger.debug(f"Nonce of {self.wallet_address} synced to {self.next_nonce}")
+            nonce = self.next_nonce
+            self.next_nonce += 1
+            return nonce
+
+    def release(self, nonce):
+        # The transaction with this nonce was never sent, hand the nonce out again
+        with self.lock:
+            if self.next_nonce is not None and nonce == self.next_nonce - 1:
+                self.next_nonce = nonce
+            elif self.next_nonce is not None and nonce < self.next_nonce:
+                # Later nonces are already out and would stall behind the gap
+                logger.warning(f"Nonce {nonce} of {self.wallet_address} released behind later transactions, resyncing")
+                self.next_nonce = None
+
+    def send_signed(self, signed_transaction, nonce=None):
+        # Broadcast a signed transaction, nonce is the reserved one when the caller knows it
+        try:
+            return self.web3.eth.send_raw_transaction(signed_transaction.rawTransaction)
+        except Exception as e:
+            message = str(e).lower()
+            if any(marker in message for marker in ALREADY_KNOWN_MARKERS):
+                return signed_transaction.hash  # Reached the node before, e.g. through another broadcast node
+            if nonce is None or any(marker in message for marker in NONCE_ERROR_MARKERS):
+                logger.warning(f"Transaction of {self.wallet_address} rejected ({e}), resyncing the nonce from chain")
+                self.invalidate()
+            else:
+                self.release(nonce)
+            raise
+
+    def send(self, transaction, private_key):
+        # Reserve, sign and broadcast without waiting for a receipt, retried once when the node rejects the local nonce
+        for attempt in range(2):
+            nonce = self.reserve()
+            try:
+                signed_transaction = self.web3.eth.account.sign_transaction({**transaction, 'nonce': nonce}, private_key=private_key)
+            except Exception:
+                self.release(nonce)
+                raise
+            try:
+                return self.send_signed(signed_transaction, nonce)
+            except Exception as e:
+                if attempt or not any(marker in str(e).lower() for marker in NONCE_ERROR_MARKERS):
+                    raise
+
+
+def get_nonce_manager(web3, wallet_address):
+    # One manager per wallet for the lifetime of the process
+    wallet_address = Web3.to_checksum_address(wallet_address)
+    with nonce_managers_lock:
+        manager = nonce_managers.get(wallet_address)
+        if manager is None:
+            manager = nonce_managers[wallet_address] = NonceManager(web3, wallet_address)
+        return manager
@@ -0,0 +1,170 @@
+import os
+import time
+import asyncio
+import threading
+import aiohttp
+from dotenv import load_dotenv
+from loguru import logger
+
+# Load environment variables
+load_dotenv()
+
+telegram_api_url = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+notify_chat_rate = float(os.getenv('NOTIFY_CHAT_RATE', 1))  # Messages per second to one private chat, Telegram allows about 1
+notify_group_rate = float(os.getenv('NOTIFY_GROUP_RATE', 20))  # Messages per minute to one group (negative chat id), Telegram allows 20
+notify_burst = int(os.getenv('NOTIFY_BURST', 3))  # Messages one chat may receive back to back before the rate applies
+notify_queue_size = int(os.getenv('NOTIFY_QUEUE_SIZE', 500))  # Messages waiting to be sent, newer ones are dropped beyond that
+notify_max_attempts = int(os.getenv('NOTIFY_MAX_ATTEMPTS', 3))
+notify_drain_timeout = float(os.getenv('NOTIFY_DRAIN_TIMEOUT', 30))  # Seconds a standalone run waits for queued messages before it exits
+debug_mode = os.getenv('DEBUG_MODE') == 'True'
+TELEGRAM_MAX_LENGTH = 4096
+
+notifier = None
+notifier_lock = threading.Lock()
+
+
+class ChatBucket:
+    # Token bucket of one chat, the dispatcher waits for a token before every message to that chat
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def wait_time(self):
+        # Takes a token and returns 0 when one is available, otherwise the seconds until there will be
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+def split_message(text, limit=TELEGRAM_MAX_LENGTH):
+    # Chunks under Telegram's length limit, cut at line boundaries so HTML tags stay balanced
+    chunks, current = [], ''
+    for line in text.split('\n'):
+        if current and len(current) + len(line) + 1 > limit:
+            chunks.append(current)
+            current = ''
+        current = f"{current}\n{line}" if current else line[:limit]
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class Notifier:
+    # Telegram messages sent from one background thread: one pooled session, per-chat rate limits, callers never wait
+    def __init__(self, token=None, chat_id=None, queue_size=notify_queue_size):
+        self.token = token or os.getenv('TELEGRAM_BOT_TOKEN')
+        self.chat_id = chat_id or os.getenv('TELEGRAM_CHAT_ID')
+        self.queue_size = queue_size
+        self.buckets = {}
+        self.digest = {}  # section (wallet) -> lines coalesced until flush_digest
+        self.digest_lock = threading.Lock()
+        self.loop = asyncio.new_event_loop()
+        self.queue = None
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='notifier', daemon=True)
+        self.thread.start()
+        self.ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.loop.create_task(self._sender())
+        self.ready.set()
+        self.loop.run_forever()
+
+    def send(self, message, parse_mode="HTML", chat_id=None):
+        # Queue a message from any thread or event loop and return at once
+        if debug_mode:
+            logger.debug(message)
+        for chunk in split_message(message):
+            self.loop.call_soon_threadsafe(self._put, (chunk, parse_mode, chat_id or self.chat_id))
+
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            logger.warning(f"Notification queue full, dropped a message for chat {item[2]}")
+
+    def add(self, section, line):
+        # Coalesce a line into the current digest instead of sending it on its own
+        with self.digest_lock:
+            self.digest.setdefault(section, []).append(line)
+
+    def flush_digest(self, title):
+        # One message (split only past Telegram's length limit) holding every line added since the last flush
+        with self.digest_lock:
+            digest, self.digest = self.digest, {}
+        if not digest:
+            return 0
+        sections = [f"<b>{section}</b>\n" + '\n'.join(lines) for section, lines in digest.items()]
+        self.send(f"{title}\n\n" + '\n\n'.join(sections))
+        return sum(len(lines) for lines in digest.values())
+
+    def drain(self, timeout=notify_drain_timeout):
+        # Wait until every queued message went out, for processes about to exit
+        try:
+            asyncio.run_coroutine_threadsafe(self.queue.join(), self.loop).result(timeout)
+            return True
+        except Exception:
+            logger.warning(f"Notification queue not drained within {timeout} seconds")
+            return False
+
+    def _bucket(self, chat_id):
+        bucket = self.buckets.get(chat_id)
+        if bucket is None:
+            is_group = str(chat_id).startswith('-')
+            bucket = self.buckets[chat_id] = ChatBucket(notify_group_rate / 60 if is_group else notify_chat_rate, notify_burst)
+        return bucket
+
+    async def _sender(self):
+        session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15))
+        try:
+            while True:
+                message, parse_mode, chat_id = await self.queue.get()
+                try:
+                    await self._deliver(session, message, parse_mode, chat_id)
+                except Exception as e:
+                    logger.error(f"Failed to send notification: {e}")
+                finally:
+                    self.queue.task_done()
+        finally:
+            await session.close()
+
+    async def _deliver(self, session, message, parse_mode, chat_id):
+        url = f"{telegram_api_url}/bot{self.token}/sendMessage"
+        data = {"chat_id": chat_id, "text": message}
+        if parse_mode:
+            data["parse_mode"] = parse_mode
+        bucket = self._bucket(chat_id)
+        for attempt in range(notify_max_attempts):
+            delay = bucket.wait_time()
+            while delay > 0:
+                await asyncio.sleep(delay)
+                delay = bucket.wait_time()
+            async with session.post(url, data=data) as response:
+                if response.status == 200:
+                    return
+                text = await response.text()
+                if response.status != 429:
+                    logger.error(f"Failed to send message: {text}")
+                    return
+                # Telegram says how long to back off, the chat's bucket is emptied for that long
+                retry_after = (await response.json(content_type=None)).get('parameters', {}).get('retry_after', 1)
+                bucket.tokens = -retry_after * bucket.rate
+                logger.warning(f"Telegram rate limited chat {chat_id}, retrying in {retry_after} seconds")
+        logger.error(f"Dropped a message for chat {chat_id} after {notify_max_attempts} rate limited attempts")
+
+
+def get_notifier():
+    # Trade threads may ask for it at the same time, only one dispatcher thread is ever started
+    global notifier
+    with notifier_lock:
+        if notifier is None:
+            notifier = Notifier()
+        return notifier
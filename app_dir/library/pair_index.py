@@ -0,0 +1,129 @@
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+from dotenv import load_dotenv
+from eth_abi import abi
+from web3 import Web3
+from loguru import logger
+
+# Load environment variables
+load_dotenv()
+
+pair_index_db_path = os.getenv('PAIR_INDEX_DB_PATH', '../configs/pair_index.db')
+pair_recheck_interval = float(os.getenv('PAIR_INDEX_RECHECK', 86400))  # Missing pairs can be created later, ask again after this many seconds
+
+ZERO_ADDRESS = '0x0000000000000000000000000000000000000000'
+GET_PAIR_SELECTOR = Web3.keccak(text='getPair(address,address)')[:4]
+
+# Factories can be pinned in the environment, otherwise they are read once from router.factory()
+factory_env_names = {
+    os.getenv('PANCAKE_ROUTER_ADDRESS'): 'PANCAKE_FACTORY_ADDRESS',
+    os.getenv('BAKERY_ROUTER_ADDRESS'): 'BAKERY_FACTORY_ADDRESS',
+    os.getenv('APESWAP_ROUTER_ADDRESS'): 'APESWAP_FACTORY_ADDRESS',
+    os.getenv('BISWAP_ROUTER_ADDRESS'): 'BISWAP_FACTORY_ADDRESS',
+}
+
+pair_index = None
+
+
+def sort_tokens(token_a, token_b):
+    # Pairs order their tokens by address, token0 is the lower one
+    token_a, token_b = Web3.to_checksum_address(token_a), Web3.to_checksum_address(token_b)
+    return (token_a, token_b) if int(token_a, 16) < int(token_b, 16) else (token_b, token_a)
+
+
+class PairIndex:
+    # Persisted (factory, token0, token1) -> pair address, None recorded for pairs the factory does not have
+    def __init__(self, db_path=pair_index_db_path):
+        self.db_path = db_path
+        self.pairs = {}
+        self.factories = {}
+        self.lock = threading.Lock()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with sqlite3.connect(db_path) as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS pairs
+                            (factory TEXT, token0 TEXT, token1 TEXT, pair TEXT, checked_at REAL, PRIMARY KEY(factory, token0, token1))''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS factories
+                            (router TEXT PRIMARY KEY, factory TEXT)''')
+            for factory, token0, token1, pair, checked_at in conn.execute('SELECT factory, token0, token1, pair, checked_at FROM pairs'):
+                self.pairs[(factory, token0, token1)] = (pair, checked_at)
+            self.factories = dict(conn.execute('SELECT router, factory FROM factories'))
+        logger.info(f"Pair index loaded {len(self.pairs)} pairs from {db_path}")
+
+    def _key(self, factory_address, token_a, token_b):
+        return (Web3.to_checksum_address(factory_address), *sort_tokens(token_a, token_b))
+
+    def has_pair(self, factory_address, token_a, token_b):
+        # True or False when known, None when the factory was never asked
+        entry = self.pairs.get(self._key(factory_address, token_a, token_b))
+        return None if entry is None else entry[0] is not None
+
+    def get_pair(self, factory_address, token_a, token_b):
+        entry = self.pairs.get(self._key(factory_address, token_a, token_b))
+        return entry[0] if entry else None
+
+    def _needs_check(self, key, now):
+        entry = self.pairs.get(key)
+        return entry is None or (entry[0] is None and now - entry[1] > pair_recheck_interval)
+
+    def resolve(self, executor, factory_address, token_pairs):
+        # Fills the index with getPair multicalls for unknown pairs and returns {(token0, token1): pair or None}
+        factory_address = Web3.to_checksum_address(factory_address)
+        keys = {self._key(factory_address, token_a, token_b) for token_a, token_b in token_pairs}
+        now = time.time()
+        missing = [key for key in keys if self._needs_check(key, now)]
+        if missing:
+            calls = [(factory_address, True, GET_PAIR_SELECTOR + abi.encode(['address', 'address'], [key[1], key[2]])) for key in missing]
+            rows = []
+            for key, (success, data) in zip(missing, executor.execute(calls)):
+                if not success or not data:
+                    continue  # Unknown, ask again next time
+                pair_address = Web3.to_checksum_address(abi.decode(['address'], data)[0])
+                pair_address = pair_address if pair_address != ZERO_ADDRESS else None
+                self.pairs[key] = (pair_address, now)
+                rows.append((*key, pair_address, now))
+            self._write_pairs(rows)
+            logger.info(f"Pair index checked {len(missing)} pairs on {factory_address}, {sum(1 for row in rows if row[3])} exist")
+        return {key[1:]: self.pairs[key][0] if key in self.pairs else None for key in keys}
+
+    async def resolve_async(self, executor, factory_address, token_pairs):
+        return await asyncio.to_thread(self.resolve, executor, factory_address, token_pairs)
+
+    def _write_pairs(self, rows):
+        if rows:
+            with self.lock, sqlite3.connect(self.db_path) as conn:
+                conn.executemany('INSERT OR REPLACE INTO pairs (factory, token0, token1, pair, checked_at) VALUES (?, ?, ?, ?, ?)', rows)
+
+    def factory_of(self, router_contract):
+        # The factory behind a router, from the environment, the index, or a one-off router.factory() call
+        router_address = Web3.to_checksum_address(router_contract.address)
+        factory_address = self.factories.get(router_address)
+        if factory_address:
+            return factory_address
+        env_name = next((name for router, name in factory_env_names.items() if router and Web3.to_checksum_address(router) == router_address), None)
+        factory_address = os.getenv(env_name) if env_name else None
+        if not factory_address:
+            try:
+                factory_address = router_contract.functions.factory().call()
+            except Exception as e:
+                logger.warning(f"Could not read the factory of router {router_address}: {e}")
+                return None
+        factory_address = self.factories[router_address] = Web3.to_checksum_address(factory_address)
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            conn.execute('INSERT OR REPLACE INTO factories (router, factory) VALUES (?, ?)', (router_address, factory_address))
+        return factory_address
+
+    def path_exists(self, factory_address, path):
+        # False only when a hop is known to have no pair, unknown hops are given the benefit of the doubt
+        return all(self.has_pair(factory_address, token_in, token_out) is not False for token_in, token_out in zip(path, path[1:]))
+
+
+def get_pair_index():
+    global pair_index
+    if pair_index is None:
+        pair_index = PairIndex()
+    return pair_index
@@ -0,0 +1,97 @@
+import os
+import time
+from types import MappingProxyType
+from typing import NamedTuple
+from dotenv import load_dotenv
+from eth_abi import abi
+from web3 import Web3
+from loguru import logger
+from library.rpc_pool import send_batch
+from library.pair_index import get_pair_index, sort_tokens
+from library.reserve_pricing import GET_RESERVES_CALLDATA
+
+# Load environment variables
+load_dotenv()
+
+AGGREGATE3_SELECTOR = Web3.keccak(text='aggregate3((address,bool,bytes)[])')[:4]
+BALANCE_OF_SELECTOR = Web3.keccak(text='balanceOf(address)')[:4]
+ALLOWANCE_SELECTOR = Web3.keccak(text='allowance(address,address)')[:4]
+GET_ETH_BALANCE_SELECTOR = Web3.keccak(text='getEthBalance(address)')[:4]
+GET_BLOCK_NUMBER_CALLDATA = Web3.keccak(text='getBlockNumber()')[:4]
+
+usdt_address = Web3.to_checksum_address(os.getenv('USDT_ADDRESS'))
+bnb_address = Web3.to_checksum_address(os.getenv('BNB_ADDRESS'))
+pancake_factory = os.getenv('PANCAKE_FACTORY_ADDRESS')
+
+
+class TradePreflight(NamedTuple):
+    # Everything the trade path reads before a swap, taken in one round trip and never updated afterwards
+    wallet_address: str
+    token_address: str
+    spender_address: str  # Router the allowances were read for
+    block_number: int
+    chain_id: int
+    nonce: int  # Pending nonce of the wallet
+    gas_price: int
+    bnb_balance: int  # Native BNB, wei
+    usdt_balance: int
+    token_balance: int
+    wbnb_balance: int
+    allowances: MappingProxyType  # token -> amount the spender may move
+    bnb_price: float  # USDT per BNB from the WBNB/USDT reserves, None when the pair could not be read
+    timestamp: float
+
+    def allowance(self, token_address):
+        return self.allowances.get(Web3.to_checksum_address(token_address), 0)
+
+
+def decode_uint(success, data):
+    return abi.decode(['uint256'], data)[0] if success and len(data) >= 32 else 0
+
+
+def fetch_trade_preflight(web3, executor, wallet_address, token_address, spender_address):
+    # One JSON-RPC batch: an aggregate3 eth_call for balances, allowances and WBNB/USDT reserves, plus nonce, gas price and chain id
+    wallet_address = Web3.to_checksum_address(wallet_address)
+    token_address = Web3.to_checksum_address(token_address)
+    spender_address = Web3.to_checksum_address(spender_address)
+    multicall_address = executor.multicall.address
+    # Known after the first trade or pricing pass, the index persists it
+    pair_address = get_pair_index().resolve(executor, pancake_factory, [(bnb_address, usdt_address)]).get(sort_tokens(bnb_address, usdt_address))
+
+    allowance_tokens = list(dict.fromkeys([usdt_address, bnb_address, token_address]))
+    calls = [
+        (multicall_address, True, GET_BLOCK_NUMBER_CALLDATA),
+        (multicall_address, True, GET_ETH_BALANCE_SELECTOR + abi.encode(['address'], [wallet_address])),
+        (usdt_address, True, BALANCE_OF_SELECTOR + abi.encode(['address'], [wallet_address])),
+        (token_address, True, BALANCE_OF_SELECTOR + abi.encode(['address'], [wallet_address])),
+        (bnb_address, True, BALANCE_OF_SELECTOR + abi.encode(['address'], [wallet_address])),
+    ] + [(token, True, ALLOWANCE_SELECTOR + abi.encode(['address', 'address'], [wallet_address, spender_address])) for token in allowance_tokens]
+    if pair_address:
+        calls.append((pair_address, True, GET_RESERVES_CALLDATA))
+    call_data = Web3.to_hex(AGGREGATE3_SELECTOR + abi.encode(['(address,bool,bytes)[]'], [calls]))
+
+    responses = send_batch(web3, [
+        ('eth_call', [{'to': multicall_address, 'data': call_data}, 'latest']),
+        ('eth_getTransactionCount', [wallet_address, 'pending']),
+        ('eth_gasPrice', []),
+        ('eth_chainId', []),
+    ])
+    errors = [response['error'] for response in responses if 'error' in response]
+    if errors:
+        raise ValueError(f"Trade preflight failed: {errors[0]}")
+    aggregate_result, nonce, gas_price, chain_id = [response['result'] for response in responses]
+    results = abi.decode(['(bool,bytes)[]'], Web3.to_bytes(hexstr=aggregate_result))[0]
+
+    block_number, bnb_balance, usdt_balance, token_balance, wbnb_balance = [decode_uint(*result) for result in results[:5]]
+    allowances = {token: decode_uint(*result) for token, result in zip(allowance_tokens, results[5:5 + len(allowance_tokens)])}
+    if not results[3][0]:
+        logger.warning(f"balanceOf failed for {token_address}, treating the balance as 0")
+
+    bnb_price = None
+    if pair_address and results[-1][0] and len(results[-1][1]) >= 96:
+        reserve0, reserve1, _ = abi.decode(['uint112', 'uint112', 'uint32'], results[-1][1])
+        reserve_bnb, reserve_usdt = (reserve0, reserve1) if sort_tokens(bnb_address, usdt_address)[0] == bnb_address else (reserve1, reserve0)
+        bnb_price = reserve_usdt / reserve_bnb if reserve_bnb else None
+
+    return TradePreflight(wallet_address, token_address, spender_address, block_number, int(chain_id, 16), int(nonce, 16), int(gas_price, 16),
+                          bnb_balance, usdt_balance, token_balance, wbnb_balance, MappingProxyType(allowances), bnb_price, time.time())
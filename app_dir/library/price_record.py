@@ -0,0 +1,39 @@
+from typing import NamedTuple
+
+
+class PriceRecord(NamedTuple):
+    # Numeric market data for one token in one round, serialized to JSON as a plain list of numbers
+    price: float
+    volume: float
+    real_price: float
+    market_cap: float
+
+
+EMPTY_RECORD = PriceRecord(0.0, 0.0, 0.0, 0.0)
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0  # "N/A" and empty values from older snapshots
+
+
+def to_price_record(values):
+    # Accepts records, numeric lists and the legacy lists of 18-decimal strings
+    if isinstance(values, PriceRecord):
+        return values
+    values = [to_float(value) for value in values]
+    if len(values) == 2:
+        values.append(values[0])  # Old two-column entries had no router price, the API price stood in for it
+    values = (values + [0.0, 0.0, 0.0, 0.0])[:4]
+    return PriceRecord(*values)
+
+
+def to_price_records(data):
+    return {coin_id: to_price_record(values) for coin_id, values in data.items()}
+
+
+def format_price(value):
+    # Display/CSV formatting only, values are kept as floats everywhere else
+    return "{:.18f}".format(float(value)).rstrip('0').rstrip('.') or "0"
@@ -0,0 +1,112 @@
+import os
+import time
+import asyncio
+import threading
+import concurrent.futures
+from dotenv import load_dotenv
+from web3 import Web3
+from web3.datastructures import AttributeDict
+from web3.exceptions import TimeExhausted
+from web3._utils.method_formatters import receipt_formatter
+from loguru import logger
+from library.rpc_pool import send_batch
+
+# Load environment variables
+load_dotenv()
+
+receipt_poll_interval = float(os.getenv('RECEIPT_POLL_INTERVAL', 1.0))  # Seconds between block number checks
+receipt_timeout = float(os.getenv('RECEIPT_TIMEOUT', 120))  # Seconds before a pending transaction is given up on
+receipt_batch_size = int(os.getenv('RECEIPT_BATCH_SIZE', 100))  # Receipts per JSON-RPC batch
+
+receipt_tracker = None
+
+
+class ReceiptTracker:
+    # Polls the receipts of every pending transaction together, once per new block, and resolves one future per hash
+    def __init__(self, web3):
+        self.web3 = web3
+        self.lock = threading.Lock()
+        self.pending = {}  # tx hash -> (future, deadline)
+        self.unchecked = set()  # Hashes not polled yet, their receipt may already be in the last block seen
+        self.last_block = None
+        self.worker = None
+
+    def track(self, tx_hash, timeout=receipt_timeout):
+        # Future resolved with the receipt, or failed with TimeExhausted after timeout seconds
+        tx_hash = tx_hash.lower() if isinstance(tx_hash, str) else Web3.to_hex(tx_hash)
+        deadline = time.time() + timeout
+        with self.lock:
+            entry = self.pending.get(tx_hash)
+            if entry is None:
+                entry = self.pending[tx_hash] = (concurrent.futures.Future(), deadline)
+                self.unchecked.add(tx_hash)
+            elif deadline > entry[1]:
+                entry = self.pending[tx_hash] = (entry[0], deadline)  # Same future, the longest wait wins
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self._poll_worker, name='receipt-tracker', daemon=True)
+                self.worker.start()
+        return entry[0]
+
+    def wait_for_receipt(self, tx_hash, timeout=receipt_timeout):
+        # Blocking wait for threads outside the event loop
+        return self.track(tx_hash, timeout).result()
+
+    async def wait_for_receipt_async(self, tx_hash, timeout=receipt_timeout):
+        return await asyncio.wrap_future(self.track(tx_hash, timeout))
+
+    def _poll_worker(self):
+        while True:
+            with self.lock:
+                if not self.pending:
+                    self.worker = None
+                    return
+            try:
+                self._poll()
+            except Exception as e:
+                logger.warning(f"Receipt polling failed, retrying: {e}")
+            time.sleep(receipt_poll_interval)
+
+    def _poll(self):
+        block_number = self.web3.eth.block_number
+        new_block = self.last_block is None or block_number > self.last_block
+        with self.lock:
+            # Without a new block only hashes that were never polled can have a receipt
+            hashes = list(self.pending) if new_block else list(self.unchecked)
+        try:
+            for i in range(0, len(hashes), receipt_batch_size):
+                chunk = hashes[i:i + receipt_batch_size]
+                responses = send_batch(self.web3, [('eth_getTransactionReceipt', [tx_hash]) for tx_hash in chunk])
+                for tx_hash, response in zip(chunk, responses):
+                    if 'error' in response:
+                        continue  # Not answered, the hash is polled again on the next pass
+                    if response.get('result'):
+                        self._resolve(tx_hash, AttributeDict.recursive(receipt_formatter(response['result'])))
+                    with self.lock:
+                        self.unchecked.discard(tx_hash)
+            # The block counts as seen only once every pending hash was polled in it
+            self.last_block = block_number
+        finally:
+            self._expire()
+
+    def _resolve(self, tx_hash, receipt):
+        with self.lock:
+            entry = self.pending.pop(tx_hash, None)
+        if entry is not None:
+            entry[0].set_result(receipt)
+
+    def _expire(self):
+        now = time.time()
+        with self.lock:
+            expired = [(tx_hash, entry) for tx_hash, entry in self.pending.items() if entry[1] <= now]
+            for tx_hash, _ in expired:
+                del self.pending[tx_hash]
+                self.unchecked.discard(tx_hash)
+        for tx_hash, (future, _) in expired:
+            future.set_exception(TimeExhausted(f"Transaction {tx_hash} was not mined before its wait timed out"))
+
+
+def get_receipt_tracker(web3):
+    global receipt_tracker
+    if receipt_tracker is None:
+        receipt_tracker = ReceiptTracker(web3)
+    return receipt_tracker
@@ -0,0 +1,129 @@
+import os
+import time
+import numpy as np
+from dotenv import load_dotenv
+from eth_abi import abi
+from web3 import Web3
+from loguru import logger
+from library.pair_index import get_pair_index, sort_tokens
+
+# Load environment variables
+load_dotenv()
+
+# 'router' quotes every token with getAmountsOut, 'reserves' prices locally from one getReserves multicall,
+# 'sync' keeps those reserves current from Sync event logs between periodic full rescans
+pricing_mode = os.getenv('PRICING_MODE', 'router').lower()
+reserve_snapshot_max_age = float(os.getenv('RESERVE_SNAPSHOT_MAX_AGE', 30))  # Seconds a snapshot may be used for trade sizing and path search
+
+# PancakeSwap v2 charges 0.25% on the input amount
+FEE_NUMERATOR = 9975
+FEE_DENOMINATOR = 10000
+GET_RESERVES_CALLDATA = Web3.keccak(text='getReserves()')[:4]
+
+latest_reserve_snapshot = None
+
+
+class ReserveSnapshot:
+    # Reserves of many pairs read in one multicall, every quote is computed locally from them
+    def __init__(self, reserves, timestamp, block_number=None, fee_numerator=FEE_NUMERATOR, fee_denominator=FEE_DENOMINATOR):
+        self.reserves = reserves  # (token0, token1) -> (reserve0, reserve1) as raw integers
+        self.timestamp = timestamp
+        self.block_number = block_number
+        self.fee_numerator = fee_numerator
+        self.fee_denominator = fee_denominator
+
+    def age(self):
+        return time.time() - self.timestamp
+
+    def get_reserves(self, token_in, token_out):
+        key = sort_tokens(token_in, token_out)
+        reserves = self.reserves.get(key)
+        if reserves is None:
+            return None
+        return reserves if key[0] == Web3.to_checksum_address(token_in) else (reserves[1], reserves[0])
+
+    def get_amount_out(self, amount_in, token_in, token_out):
+        # Same integer math as the router's getAmountOut
+        reserves = self.get_reserves(token_in, token_out)
+        if reserves is None or reserves[0] == 0 or reserves[1] == 0:
+            return None
+        amount_in_with_fee = int(amount_in) * self.fee_numerator
+        return amount_in_with_fee * reserves[1] // (reserves[0] * self.fee_denominator + amount_in_with_fee)
+
+    def get_amounts_out(self, amount_in, path):
+        # Mirrors router getAmountsOut, None when a hop has no known pair
+        amounts = [int(amount_in)]
+        for token_in, token_out in zip(path, path[1:]):
+            amount_out = self.get_amount_out(amounts[-1], token_in, token_out)
+            if amount_out is None:
+                return None
+            amounts.append(amount_out)
+        return amounts
+
+    def reserve_arrays(self, base_token, tokens):
+        # Float reserves of base/token pairs aligned with tokens, zero where there is no pair
+        reserve_base = np.zeros(len(tokens), dtype=np.float64)
+        reserve_token = np.zeros(len(tokens), dtype=np.float64)
+        for i, token in enumerate(tokens):
+            reserves = self.get_reserves(base_token, token)
+            if reserves is not None:
+                reserve_base[i], reserve_token[i] = reserves
+        return reserve_base, reserve_token
+
+    def amounts_out(self, amounts_in, reserve_in, reserve_out):
+        # Vectorized constant-product output, amounts_in broadcasts against the reserve arrays
+        amounts_in_with_fee = np.asarray(amounts_in, dtype=np.float64) * self.fee_numerator
+        denominator = np.asarray(reserve_in, dtype=np.float64) * self.fee_denominator + amounts_in_with_fee
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(denominator > 0, amounts_in_with_fee * reserve_out / denominator, 0.0)
+
+    def price_impact(self, token_in, token_out, amounts_in):
+        # Fraction lost against the mid price (fee included) for each input size
+        reserves = self.get_reserves(token_in, token_out)
+        amounts_in = np.asarray(amounts_in, dtype=np.float64)
+        if reserves is None or reserves[0] == 0 or reserves[1] == 0:
+            return np.ones_like(amounts_in)
+        amounts_out = self.amounts_out(amounts_in, reserves[0], reserves[1])
+        mid_price = reserves[1] / reserves[0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(amounts_in > 0, 1 - amounts_out / (amounts_in * mid_price), 0.0)
+
+    def max_amount_within_impact(self, token_in, token_out, max_impact):
+        # Largest input whose price impact stays at or below max_impact, solved from the constant-product formula
+        reserves = self.get_reserves(token_in, token_out)
+        if reserves is None or reserves[0] == 0:
+            return 0.0
+        fee = self.fee_numerator / self.fee_denominator
+        if 1 - fee >= max_impact:
+            return 0.0  # The fee alone exceeds the allowed impact
+        # impact(a) = 1 - fee * r_in / (r_in + fee * a)  =>  a = r_in * (fee / (1 - impact) - 1) / fee
+        return reserves[0] * (fee / (1 - max_impact) - 1) / fee
+
+
+async def fetch_reserve_snapshot(executor, factory_address, token_pairs, extra_calls=(), block_identifier='latest'):
+    # One multicall for every indexed pair's reserves, extra calls ride along in the same call list
+    pairs = await get_pair_index().resolve_async(executor, factory_address, token_pairs)
+    keys = [key for key, pair_address in pairs.items() if pair_address]
+    extra_calls = list(extra_calls)
+    calls = [(pairs[key], True, GET_RESERVES_CALLDATA) for key in keys] + extra_calls
+    results = await executor.execute_async(calls, block_identifier)
+    reserves = {}
+    for key, (success, data) in zip(keys, results):
+        if success and len(data) >= 96:
+            reserve0, reserve1, _ = abi.decode(['uint112', 'uint112', 'uint32'], data)
+            reserves[key] = (reserve0, reserve1)
+    logger.info(f"Reserve snapshot: {len(reserves)} pairs with reserves out of {len(pairs)} requested")
+    block_number = block_identifier if isinstance(block_identifier, int) else None
+    return ReserveSnapshot(reserves, time.time(), block_number), results[len(keys):]
+
+
+def set_latest_reserve_snapshot(snapshot):
+    global latest_reserve_snapshot
+    latest_reserve_snapshot = snapshot
+
+
+def get_latest_reserve_snapshot(max_age=reserve_snapshot_max_age):
+    # The snapshot of the latest pricing pass, only while it is fresh enough to size or route a trade
+    if latest_reserve_snapshot is None or (max_age is not None and latest_reserve_snapshot.age() > max_age):
+        return None
+    return latest_reserve_snapshot
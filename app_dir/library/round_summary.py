@@ -0,0 +1,99 @@
+import os
+import json
+from datetime import datetime
+import numpy as np
+
+# Layout inside CSV_FOLDER, next to the trade action log:
+#   trade_actions_summary_YYYYMMDD.json - {wallet: {action: {rows, priced, pnl[, symbols]}}} of the day, merged in once per round
+FILE_PREFIX = 'trade_actions_summary_'
+
+
+def summary_name(day=None):
+    return f"{FILE_PREFIX}{(day or datetime.now()).strftime('%Y%m%d')}.json"
+
+
+def empty_entry():
+    # rows: decisions taken, priced: those with a profit or loss, pnl: their sum, symbols: distinct held coins (hold only)
+    return {'rows': 0, 'priced': 0, 'pnl': 0.0}
+
+
+def merge_entry(total, entry):
+    total['rows'] += entry['rows']
+    total['priced'] += entry['priced']
+    total['pnl'] += entry['pnl']
+    if 'symbols' in entry:
+        total['symbols'] = sorted(set(total.get('symbols', [])) | set(entry['symbols']))
+
+
+class RoundSummary:
+    # Counts and PnL per wallet and action, updated as decisions are made instead of rescanning the logged rows
+    def __init__(self, folder):
+        self.folder = folder
+        self.current = {}
+        self.last_round = {}
+
+    def record(self, wallet_id, actions, pnl, symbols):
+        # One vectorized pass per action present in a batch of decisions (actions, pnl with NaN for none, symbols)
+        actions = np.asarray(actions)
+        pnl = np.asarray(pnl, dtype=float)
+        priced = ~np.isnan(pnl)
+        wallet = self.current.setdefault(wallet_id, {})
+        for action in np.unique(actions).tolist():
+            mask = actions == action
+            entry = {'rows': int(mask.sum()), 'priced': int((mask & priced).sum()), 'pnl': float(pnl[mask & priced].sum())}
+            if action == 'hold':
+                entry['symbols'] = [str(symbols[row]).upper() for row in np.nonzero(mask & priced)[0].tolist()]
+            merge_entry(wallet.setdefault(action, empty_entry()), entry)
+
+    def flush(self):
+        # Merge the round into the day's summary file, O(wallets x actions) however many rows the round logged
+        current, self.current = self.current, {}
+        self.last_round = current
+        path = os.path.join(self.folder, summary_name())
+        day = load_summary(path)
+        for wallet_id, actions in current.items():
+            for action, entry in actions.items():
+                merge_entry(day.setdefault(wallet_id, {}).setdefault(action, empty_entry()), entry)
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, 'w') as file:
+            json.dump(day, file)
+        os.replace(temporary_path, path)
+        return day
+
+    def round_totals(self):
+        return self.last_round
+
+
+def transactions_count(actions):
+    # Rows the wallet has in the day's combined CSV, which has always dropped no_action rows before the report counted them
+    return sum(entry['rows'] for action, entry in actions.items() if action != 'no_action')
+
+
+def total_pnl(actions):
+    return sum(entry['pnl'] for action, entry in actions.items() if action != 'no_action')
+
+
+def load_summary(path):
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def read_day(folder, date_str):
+    # The day's aggregate, empty when the day was traded before summaries were kept
+    return load_summary(os.path.join(folder, f"{FILE_PREFIX}{date_str}.json"))
+
+
+def summary_from_rows(wallets, actions, pnl, symbols):
+    # Aggregate of already logged rows (Wallet, Action, Profits/Losses with '-' for none, Symbol), for days without a summary file
+    summary = RoundSummary(None)
+    wallets = np.asarray(wallets, dtype=object)
+    pnl = np.array([np.nan if value == '-' else float(value) for value in pnl], dtype=float)
+    actions = np.asarray(actions, dtype=object)
+    symbols = list(symbols)
+    for wallet_id in dict.fromkeys(wallet_id for wallet_id in wallets.tolist() if wallet_id == wallet_id):  # NaN wallets are skipped
+        rows = np.nonzero(wallets == wallet_id)[0]
+        summary.record(str(wallet_id), actions[rows].astype(str), pnl[rows], [symbols[row] for row in rows.tolist()])
+    return summary.current
@@ -0,0 +1,366 @@
+import os
+import json
+import time
+import random
+import threading
+import contextlib
+import contextvars
+import collections
+import concurrent.futures
+from dotenv import load_dotenv
+from web3 import Web3
+from web3.providers.base import JSONBaseProvider
+from web3._utils.request import make_post_request
+from loguru import logger
+
+# Load environment variables
+load_dotenv()
+
+rpc_timeout = float(os.getenv('RPC_TIMEOUT', 10))  # Seconds per HTTP request
+rpc_node_concurrency = int(os.getenv('RPC_NODE_CONCURRENCY', 8))  # In-flight requests per node
+rpc_max_attempts = int(os.getenv('RPC_MAX_ATTEMPTS', 3))  # Nodes tried per call before giving up
+rpc_breaker_threshold = int(os.getenv('RPC_BREAKER_THRESHOLD', 3))  # Consecutive failures that open a node's circuit
+rpc_breaker_cooldown = float(os.getenv('RPC_BREAKER_COOLDOWN', 30))  # Seconds before an open circuit lets a trial call through
+rpc_probe_interval = float(os.getenv('RPC_PROBE_INTERVAL', 30))  # Seconds between background health probes
+rpc_max_block_lag = int(os.getenv('RPC_MAX_BLOCK_LAG', 3))  # Blocks behind the best node before a node is deprioritized
+rpc_hedge_enabled = os.getenv('RPC_HEDGE_ENABLED', 'False') == 'True'  # Hedge reads and broadcast raw transactions inside hedged_calls()
+rpc_hedge_percentile = float(os.getenv('RPC_HEDGE_PERCENTILE', 90))  # Primary node latency percentile after which a read is sent to a second node
+rpc_hedge_min_delay = float(os.getenv('RPC_HEDGE_MIN_DELAY', 0.05))  # Seconds, floor of the hedge delay
+rpc_broadcast_nodes = int(os.getenv('RPC_BROADCAST_NODES', 3))  # Nodes a raw transaction is sent to at once
+
+# Errors returned as JSON-RPC responses that say something about the node rather than the call
+NODE_ERROR_MARKERS = ('header not found', 'missing trie node', 'rate limit', 'limit exceeded', 'too many requests', 'unknown block', 'timeout')
+LATENCY_SMOOTHING = 0.2
+LATENCY_SAMPLES = 100
+# Reads that are safe to send twice, the first answer wins
+HEDGED_METHODS = {'eth_call', 'eth_getBalance', 'eth_estimateGas', 'eth_getTransactionCount', 'eth_blockNumber', 'eth_gasPrice',
+                  'eth_getTransactionReceipt', 'eth_getTransactionByHash', 'eth_getBlockByNumber', 'eth_chainId'}
+
+# Set for the calls of one trade, a context variable so it follows the trade's task and asyncio.to_thread calls
+hedging = contextvars.ContextVar('rpc_hedging', default=False)
+
+rpc_pool = None
+hedge_executor = None
+
+
+@contextlib.contextmanager
+def hedged_calls():
+    # Calls made inside are hedged when RPC_HEDGE_ENABLED is set
+    token = hedging.set(rpc_hedge_enabled)
+    try:
+        yield
+    finally:
+        hedging.reset(token)
+
+
+class BatchUnsupported(Exception):
+    # The node answered a batch with a single error object or refused it outright, it is healthy for single calls
+    pass
+
+
+class NodeUnavailable(Exception):
+    # The node could not serve the call, response holds its JSON-RPC error when it sent one
+    def __init__(self, error, response=None):
+        super().__init__(error)
+        self.response = response
+
+
+class RpcNode:
+    def __init__(self, url):
+        self.url = url
+        self.provider = Web3.HTTPProvider(url, request_kwargs={'timeout': rpc_timeout})
+        self.semaphore = threading.BoundedSemaphore(rpc_node_concurrency)
+        self.lock = threading.Lock()
+        self.latency = None  # Smoothed seconds per call
+        self.samples = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.error_rate = 0.0  # Smoothed share of failed calls
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.open_until = 0
+        self.trial_running = False
+        self.block_number = 0
+        self.batch_supported = True  # False once the node refused a JSON-RPC batch, its batches then go out as single calls
+
+    def available(self, now):
+        # Closed circuit, or an open one whose cooldown passed and has no trial call running yet
+        return self.open_until == 0 or (now >= self.open_until and not self.trial_running)
+
+    def score(self, head):
+        latency = self.latency if self.latency is not None else rpc_timeout / 10
+        score = latency * (1 + 4 * self.error_rate) * (1 + self.in_flight / rpc_node_concurrency)
+        if head - self.block_number > rpc_max_block_lag:
+            score *= 10  # Lagging nodes cannot serve pinned blocks
+        return score
+
+    def latency_percentile(self, percentile):
+        samples = sorted(self.samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * percentile / 100))]
+
+    def record_success(self, elapsed):
+        with self.lock:
+            self.samples.append(elapsed)
+            self.latency = elapsed if self.latency is None else self.latency + LATENCY_SMOOTHING * (elapsed - self.latency)
+            self.error_rate -= LATENCY_SMOOTHING * self.error_rate
+            self.consecutive_failures = 0
+            if self.open_until:
+                logger.info(f"RPC node {self.url} recovered, closing its circuit")
+            self.trips = 0
+            self.open_until = 0
+            self.trial_running = False
+
+    def record_failure(self, error):
+        with self.lock:
+            self.error_rate += LATENCY_SMOOTHING * (1 - self.error_rate)
+            self.consecutive_failures += 1
+            self.trial_running = False
+            if self.consecutive_failures >= rpc_breaker_threshold:
+                # Each consecutive trip doubles the cooldown, up to ten times the base
+                self.trips += 1
+                self.open_until = time.time() + rpc_breaker_cooldown * min(2 ** (self.trips - 1), 10)
+                logger.warning(f"RPC node {self.url} failed {self.consecutive_failures} times in a row, circuit open for {self.open_until - time.time():.0f}s: {error}")
+
+
+class RpcPool(JSONBaseProvider):
+    # Web3 provider routing every request to the best healthy node of a list
+    def __init__(self, urls):
+        super().__init__()
+        self.nodes = [RpcNode(url) for url in dict.fromkeys(url for url in urls if url and url.startswith('http'))]
+        if not self.nodes:
+            raise ValueError("No HTTP RPC node configured")
+        self.lock = threading.Lock()
+        self.head = 0
+        self.prober = None
+
+    def _select(self, tried):
+        # Best scored node with a free slot, spread randomly over nodes close to the best one
+        now = time.time()
+        with self.lock:
+            candidates = sorted((node for node in self.nodes if node not in tried and node.available(now)), key=lambda node: node.score(self.head))
+            if not candidates:
+                return None
+            best_score = candidates[0].score(self.head)
+            close = [node for node in candidates if node.score(self.head) <= best_score * 1.25 and node.in_flight < rpc_node_concurrency]
+            free = [node for node in candidates if node.in_flight < rpc_node_concurrency]
+            node = random.choice(close) if close else (free[0] if free else candidates[0])
+            if node.open_until:
+                node.trial_running = True  # Half-open, this call decides whether the circuit closes
+            node.in_flight += 1
+            return node
+
+    def _call(self, node, method, params):
+        return self._send(node, lambda: node.provider.make_request(method, params))
+
+    def _send(self, node, send):
+        with node.semaphore:
+            start_time = time.time()
+            try:
+                response = send()
+            finally:
+                with self.lock:
+                    node.in_flight -= 1
+            return response, time.time() - start_time
+
+    def _attempt(self, node, method, params):
+        # One call on one node, raises NodeUnavailable when another node should be asked
+        try:
+            response, elapsed = self._call(node, method, params)
+        except Exception as e:
+            node.record_failure(e)
+            raise NodeUnavailable(e)
+        error = response.get('error') if isinstance(response, dict) else None
+        if error and any(marker in str(error.get('message', '')).lower() for marker in NODE_ERROR_MARKERS):
+            node.record_failure(error)
+            raise NodeUnavailable(error, response)
+        node.record_success(elapsed)
+        if method == 'eth_blockNumber' and 'result' in response:
+            self._record_block(node, int(response['result'], 16))
+        return response
+
+    def _request(self, method, params, tried):
+        last_error = None
+        last_response = None
+        while len(tried) < min(rpc_max_attempts, len(self.nodes)):
+            node = self._select(tried)
+            if node is None:
+                break
+            tried.add(node)
+            try:
+                return self._attempt(node, method, params)
+            except NodeUnavailable as e:
+                last_error = e
+                last_response = e.response if e.response is not None else last_response
+        if last_response is not None:
+            return last_response
+        raise ConnectionError(f"All RPC nodes failed for {method}: {last_error}")
+
+    def _hedged_request(self, method, params):
+        # Ask the best node, and a second one too when the first is slower than its usual percentile latency
+        primary = self._select(set())
+        if primary is None:
+            return self._request(method, params, set())
+        tried = {primary}
+        futures = [get_hedge_executor().submit(self._attempt, primary, method, params)]
+        delay = max(rpc_hedge_min_delay, primary.latency_percentile(rpc_hedge_percentile) or rpc_timeout / 10)
+        done, _ = concurrent.futures.wait(futures, timeout=delay)
+        if not done:
+            secondary = self._select(tried)
+            if secondary is not None:
+                tried.add(secondary)
+                futures.append(get_hedge_executor().submit(self._attempt, secondary, method, params))
+                logger.debug(f"Hedging {method} from {primary.url} to {secondary.url} after {delay * 1000:.0f}ms")
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                return future.result()
+            except NodeUnavailable:
+                continue
+        # Every hedged node failed, fall back to the usual retries on the remaining nodes
+        return self._request(method, params, tried)
+
+    def _broadcast(self, method, params):
+        # Send a raw transaction to several nodes at once, the first node to accept it answers
+        nodes = []
+        while len(nodes) < min(rpc_broadcast_nodes, len(self.nodes)):
+            node = self._select(set(nodes))
+            if node is None:
+                break
+            nodes.append(node)
+        if not nodes:
+            return self._request(method, params, set())
+        futures = [get_hedge_executor().submit(self._attempt, node, method, params) for node in nodes]
+        first_response = None
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                response = future.result()
+            except NodeUnavailable as e:
+                response = e.response
+            if response is None:
+                continue
+            if 'result' in response:
+                return response
+            first_response = first_response or response
+        # Rejected everywhere, the first rejection carries the reason
+        if first_response is not None:
+            return first_response
+        return self._request(method, params, set(nodes))
+
+    def make_batch_request(self, batch):
+        # Several (method, params) calls in one HTTP round trip on one node, responses in request order
+        payload = json.dumps([{'jsonrpc': '2.0', 'method': method, 'params': params, 'id': i} for i, (method, params) in enumerate(batch)]).encode()
+        # Nodes known to refuse batches are skipped here, they still serve the single calls of the fallback below
+        tried = {node for node in self.nodes if not node.batch_supported}
+        attempts = 0
+        last_error = None
+        while attempts < min(rpc_max_attempts, len(self.nodes)):
+            node = self._select(tried)
+            if node is None:
+                break
+            tried.add(node)
+            attempts += 1
+            try:
+                raw, elapsed = self._send(node, lambda: make_post_request(node.url, payload, **dict(node.provider.get_request_kwargs())))
+                responses = json.loads(raw)
+                if not isinstance(responses, list):
+                    raise BatchUnsupported(responses)
+            except BatchUnsupported as e:
+                node.batch_supported = False
+                logger.warning(f"RPC node {node.url} does not accept batch requests, sending its batches as single calls: {e}")
+                attempts -= 1
+                continue
+            except Exception as e:
+                if 'batch' in str(getattr(getattr(e, 'response', None), 'text', '')).lower():
+                    node.batch_supported = False
+                    logger.warning(f"RPC node {node.url} refused a batch request, sending its batches as single calls: {e}")
+                    attempts -= 1
+                    continue
+                node.record_failure(e)
+                last_error = e
+                continue
+            errors = [response['error'] for response in responses if 'error' in response]
+            if any(marker in str(error.get('message', '')).lower() for error in errors for marker in NODE_ERROR_MARKERS):
+                node.record_failure(errors[0])
+                last_error = errors[0]
+                continue
+            node.record_success(elapsed)
+            return sorted(responses, key=lambda response: response['id'])
+        if last_error is None:
+            # No node takes batches, the calls go one by one through the usual routing
+            return [{**self._request(method, params, set()), 'id': i} for i, (method, params) in enumerate(batch)]
+        raise ConnectionError(f"All RPC nodes failed for a batch of {len(batch)} calls: {last_error}")
+
+    def make_request(self, method, params):
+        if hedging.get():
+            if method == 'eth_sendRawTransaction':
+                return self._broadcast(method, params)
+            if method in HEDGED_METHODS:
+                return self._hedged_request(method, params)
+        return self._request(method, params, set())
+
+    def is_connected(self, show_traceback=False):
+        return any(node.available(time.time()) for node in self.nodes)
+
+    def _record_block(self, node, block_number):
+        with self.lock:
+            node.block_number = block_number
+            self.head = max(self.head, block_number)
+
+    def probe(self):
+        # Ask every node for its block number, which also measures latency and lets open circuits recover
+        def probe_node(node):
+            start_time = time.time()
+            try:
+                response = node.provider.make_request('eth_blockNumber', [])
+                self._record_block(node, int(response['result'], 16))
+                node.record_success(time.time() - start_time)
+            except Exception as e:
+                node.record_failure(e)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(self.nodes)) as executor:
+            list(executor.map(probe_node, [node for node in self.nodes if node.available(time.time()) or node.open_until]))
+
+    def start_probing(self):
+        def probe_loop():
+            while True:
+                self.probe()
+                time.sleep(rpc_probe_interval)
+        if self.prober is None:
+            self.prober = threading.Thread(target=probe_loop, name='rpc-probe', daemon=True)
+            self.prober.start()
+
+    def status(self):
+        # Per node health for logs and dashboards
+        now = time.time()
+        return [{
+            'url': node.url,
+            'latency_ms': round(node.latency * 1000, 1) if node.latency is not None else None,
+            'error_rate': round(node.error_rate, 3),
+            'in_flight': node.in_flight,
+            'block_lag': self.head - node.block_number,
+            'circuit': 'closed' if not node.open_until else ('open' if now < node.open_until else 'half-open'),
+        } for node in self.nodes]
+
+
+def send_batch(web3, batch):
+    # One round trip through the pool, one request per call on any other provider
+    if isinstance(web3.provider, RpcPool):
+        return web3.provider.make_batch_request(batch)
+    return [web3.provider.make_request(method, params) for method, params in batch]
+
+
+def get_hedge_executor():
+    # Shared threads for hedged and broadcast calls, a losing call finishes in the background
+    global hedge_executor
+    if hedge_executor is None:
+        hedge_executor = concurrent.futures.ThreadPoolExecutor(max_workers=4 * rpc_broadcast_nodes + 16, thread_name_prefix='rpc-hedge')
+    return hedge_executor
+
+
+def create_rpc_pool(urls):
+    global rpc_pool
+    rpc_pool = RpcPool(urls)
+    return rpc_pool
+
+
+def get_rpc_pool():
+    return rpc_pool
@@ -0,0 +1,334 @@
+import os
+import json
+import numpy as np
+from dotenv import load_dotenv
+from loguru import logger
+from library.price_record import PriceRecord, to_price_record
+
+# Load environment variables
+load_dotenv()
+
+# Layout of the store inside DATA_DIRECTORY:
+#   tokens.txt  - token id dictionary, one coin id per line, the line number is the token index
+#   columns.bin - fixed-width records appended per round (token index + numeric columns)
+#   rounds.bin  - timestamp index, one entry per round pointing at its slice of columns.bin
+#   meta.bin    - per round block number and keyframe position, rounds written before it existed default to (0, -1)
+#   patches.bin - append-only journal of corrections (executed prices) keyed by round timestamp and token, merged on read
+# A round is either a keyframe holding every token, or a delta holding only the tokens that changed since its
+# keyframe. Tokens dropped since the keyframe are stored as a row of NaN.
+TOKENS_FILE = 'tokens.txt'
+COLUMNS_FILE = 'columns.bin'
+ROUNDS_FILE = 'rounds.bin'
+META_FILE = 'meta.bin'
+PATCHES_FILE = 'patches.bin'
+
+COLUMN_NAMES = ('price', 'volume', 'real_price', 'market_cap')
+record_dtype = np.dtype([('token', '<u4')] + [(name, '<f8') for name in COLUMN_NAMES])
+round_dtype = np.dtype([('timestamp', '<i8'), ('offset', '<i8'), ('count', '<i8')])
+meta_dtype = np.dtype([('block', '<i8'), ('base', '<i8')])
+patch_dtype = np.dtype([('timestamp', '<i8'), ('token', '<u4'), ('column', '<u1'), ('value', '<f8')])
+
+keyframe_interval = int(os.getenv('SNAPSHOT_KEYFRAME_INTERVAL', 60))  # Rounds between two full keyframes
+
+snapshot_store = None
+
+
+def format_snapshot_id(timestamp):
+    # Snapshot ids keep the zero padded format of the old one-file-per-round names
+    return str(int(timestamp)).zfill(20)
+
+
+class SnapshotStore:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.tokens_path = os.path.join(directory, TOKENS_FILE)
+        self.columns_path = os.path.join(directory, COLUMNS_FILE)
+        self.rounds_path = os.path.join(directory, ROUNDS_FILE)
+        self.meta_path = os.path.join(directory, META_FILE)
+        self.patches_path = os.path.join(directory, PATCHES_FILE)
+        self.token_ids = []
+        self.token_index = {}
+        self.tokens_offset = 0
+        self.rounds = np.zeros(0, dtype=round_dtype)
+        self.columns = np.zeros(0, dtype=record_dtype)
+        self.meta = np.zeros(0, dtype=meta_dtype)
+        self.rounds_size = -1
+        self.columns_size = -1
+        self.meta_size = -1
+        self.patches = {}  # timestamp -> {token: {column index: value}}
+        self.token_patches = {}  # token -> {timestamp: the same column dict}
+        self.patches_offset = 0
+        self.keyframe_cache = (None, None)
+        self.refresh()
+
+    def refresh(self):
+        # Pick up rounds appended by another process, only re-mapping files whose size changed
+        self._load_tokens()
+        self._load_patches()
+        rounds_size = os.path.getsize(self.rounds_path) if os.path.exists(self.rounds_path) else 0
+        columns_size = os.path.getsize(self.columns_path) if os.path.exists(self.columns_path) else 0
+        meta_size = os.path.getsize(self.meta_path) if os.path.exists(self.meta_path) else 0
+        if rounds_size != self.rounds_size:
+            count = rounds_size // round_dtype.itemsize
+            self.rounds = np.memmap(self.rounds_path, dtype=round_dtype, mode='r', shape=(count,)) if count else np.zeros(0, dtype=round_dtype)
+            self.rounds_size = rounds_size
+        if columns_size != self.columns_size:
+            count = columns_size // record_dtype.itemsize
+            self.columns = np.memmap(self.columns_path, dtype=record_dtype, mode='r', shape=(count,)) if count else np.zeros(0, dtype=record_dtype)
+            self.columns_size = columns_size
+        if meta_size != self.meta_size:
+            count = meta_size // meta_dtype.itemsize
+            self.meta = np.memmap(self.meta_path, dtype=meta_dtype, mode='r', shape=(count,)) if count else np.zeros(0, dtype=meta_dtype)
+            self.meta_size = meta_size
+
+    def _load_tokens(self):
+        if not os.path.exists(self.tokens_path):
+            return
+        with open(self.tokens_path, 'r') as file:
+            file.seek(self.tokens_offset)
+            for line in iter(file.readline, ''):
+                if not line.endswith('\n'):
+                    break  # Partially written line, read it on the next refresh
+                coin_id = line[:-1]
+                self.token_index[coin_id] = len(self.token_ids)
+                self.token_ids.append(coin_id)
+                self.tokens_offset = file.tell()
+
+    def _load_patches(self):
+        # Only complete records, one still being appended is picked up on the next refresh
+        if not os.path.exists(self.patches_path):
+            return
+        size = os.path.getsize(self.patches_path)
+        size -= size % patch_dtype.itemsize
+        if size <= self.patches_offset:
+            return
+        with open(self.patches_path, 'rb') as file:
+            file.seek(self.patches_offset)
+            records = np.frombuffer(file.read(size - self.patches_offset), dtype=patch_dtype)
+        self.patches_offset = size
+        for timestamp, token, column, value in records.tolist():
+            self._index_patch(timestamp, token, column, value)
+
+    def _index_patch(self, timestamp, token, column, value):
+        # Later records win, the journal order is the order corrections were made in
+        columns = self.patches.setdefault(timestamp, {}).setdefault(token, {})
+        self.token_patches.setdefault(token, {})[timestamp] = columns
+        columns[column] = value
+
+    def __len__(self):
+        return len(self.rounds)
+
+    def timestamps(self):
+        return np.asarray(self.rounds['timestamp'])
+
+    def snapshot_ids(self):
+        return [format_snapshot_id(timestamp) for timestamp in self.rounds['timestamp']]
+
+    def position_of(self, snapshot_id):
+        timestamps = self.timestamps()
+        position = int(np.searchsorted(timestamps, int(snapshot_id)))
+        if position < len(timestamps) and timestamps[position] == int(snapshot_id):
+            return position
+        return None
+
+    def records(self, position):
+        # Only the records stored for this round, a delta round carries the rest from its keyframe
+        entry = self.rounds[position]
+        return self.columns[entry['offset']:entry['offset'] + entry['count']]
+
+    def meta_of(self, position):
+        # (block number, keyframe position or -1) of one round
+        position = position % len(self)
+        if position >= len(self.meta):
+            return 0, -1
+        return int(self.meta[position]['block']), int(self.meta[position]['base'])
+
+    def block_of(self, position):
+        return self.meta_of(position)[0]
+
+    def _decode(self, records):
+        values = np.column_stack([records[name] for name in COLUMN_NAMES]).tolist()
+        return zip((self.token_ids[token] for token in records['token'].tolist()), values)
+
+    def _keyframe(self, position):
+        # Consecutive delta rounds share one keyframe, keep the last one materialized
+        if self.keyframe_cache[0] != position:
+            self.keyframe_cache = (position, {coin_id: PriceRecord(*row) for coin_id, row in self._decode(self.records(position))})
+        return self.keyframe_cache[1]
+
+    def read(self, position):
+        # Materialize one round as {coin_id: PriceRecord}, with the journaled corrections of that round applied
+        position = position % len(self)
+        base = self.meta_of(position)[1]
+        if base < 0:
+            data = dict(self._keyframe(position))
+        else:
+            data = dict(self._keyframe(base))
+            for coin_id, row in self._decode(self.records(position)):
+                if row[0] != row[0]:
+                    data.pop(coin_id, None)  # NaN marks a token dropped since the keyframe
+                else:
+                    data[coin_id] = PriceRecord(*row)
+        for token, columns in self.patches.get(int(self.rounds[position]['timestamp']), {}).items():
+            coin_id = self.token_ids[token]
+            if coin_id in data:
+                data[coin_id] = data[coin_id]._replace(**{COLUMN_NAMES[column]: value for column, value in columns.items()})
+        return data
+
+    def latest(self):
+        self.refresh()
+        if not len(self):
+            return None, {}
+        return format_snapshot_id(self.rounds[-1]['timestamp']), self.read(-1)
+
+    def rounds_ago(self, count):
+        self.refresh()
+        if count >= len(self):
+            return None, {}
+        return format_snapshot_id(self.rounds[-1 - count]['timestamp']), self.read(-1 - count)
+
+    def token_range(self, coin_id, start_timestamp=None, end_timestamp=None):
+        # Every stored round for one token between two timestamps, as (timestamps, records)
+        self.refresh()
+        token = self.token_index.get(coin_id)
+        if token is None or not len(self):
+            return np.zeros(0, dtype='<i8'), np.zeros(0, dtype=record_dtype)
+        timestamps = self.timestamps()
+        first = int(np.searchsorted(timestamps, start_timestamp)) if start_timestamp is not None else 0
+        last = int(np.searchsorted(timestamps, end_timestamp, side='right')) if end_timestamp is not None else len(timestamps)
+        if first >= last:
+            return np.zeros(0, dtype='<i8'), np.zeros(0, dtype=record_dtype)
+        start = self.rounds[first]['offset']
+        end = self.rounds[last - 1]['offset'] + self.rounds[last - 1]['count']
+        window = self.columns[start:end]
+        matches = np.nonzero(window['token'] == token)[0]
+        round_offsets = np.asarray(self.rounds['offset'][first:last])
+        round_positions = np.searchsorted(round_offsets, matches + start, side='right') - 1
+        records = np.zeros(last - first, dtype=record_dtype)
+        found = np.zeros(last - first, dtype=bool)
+        records[round_positions] = window[matches]
+        found[round_positions] = True
+        # Delta rounds without their own record for the token carry it from their keyframe
+        bases = np.full(last - first, -1, dtype='<i8')
+        known = min(last, len(self.meta)) - first
+        if known > 0:
+            bases[:known] = self.meta['base'][first:first + known]
+        for base in np.unique(bases[~found & (bases >= 0)]).tolist():
+            keyframe_records = self.records(base)
+            keyframe_matches = np.nonzero(keyframe_records['token'] == token)[0]
+            if len(keyframe_matches):
+                carried = ~found & (bases == base)
+                records[carried] = keyframe_records[keyframe_matches[0]]
+                found |= carried
+        found &= ~np.isnan(records['price'])
+        timestamps, records = timestamps[first:last][found], records[found]
+        for timestamp, columns in self.token_patches.get(token, {}).items():
+            position = int(np.searchsorted(timestamps, timestamp))
+            if position < len(timestamps) and timestamps[position] == timestamp:
+                for column, value in columns.items():
+                    records[COLUMN_NAMES[column]][position] = value
+        return timestamps, records
+
+    def append(self, timestamp, market_prices, block_number=0):
+        self.refresh()
+        if len(self) and int(timestamp) <= self.rounds[-1]['timestamp']:
+            raise ValueError(f"Snapshot {timestamp} is not newer than the latest stored round")
+        market_prices = {coin_id: to_price_record(row) for coin_id, row in market_prices.items()}  # Legacy rows may be shorter or hold strings
+        new_tokens = [coin_id for coin_id in market_prices if coin_id not in self.token_index]
+        if new_tokens:
+            with open(self.tokens_path, 'a') as file:
+                file.write(''.join(f"{coin_id}\n" for coin_id in new_tokens))
+            self._load_tokens()
+
+        # Store only what changed since the current keyframe while the delta stays small
+        base, rows = -1, market_prices
+        if len(self):
+            keyframe = self.meta_of(-1)[1] if self.meta_of(-1)[1] >= 0 else len(self) - 1
+            if len(self) - keyframe < keyframe_interval:
+                keyframe_data = self._keyframe(keyframe)
+                changed = {coin_id: record for coin_id, record in market_prices.items() if keyframe_data.get(coin_id) != record}
+                changed.update({coin_id: PriceRecord(*[np.nan] * len(COLUMN_NAMES)) for coin_id in keyframe_data if coin_id not in market_prices})
+                if len(changed) <= len(market_prices) // 2:
+                    base, rows = keyframe, changed
+
+        records = np.zeros(len(rows), dtype=record_dtype)
+        records['token'] = [self.token_index[coin_id] for coin_id in rows]
+        if rows:
+            values = np.array(list(rows.values()), dtype='<f8')
+            for column, name in enumerate(COLUMN_NAMES):
+                records[name] = values[:, column]
+
+        # Records left behind by an interrupted append are not referenced by any round, overwrite them
+        offset = int(self.rounds[-1]['offset'] + self.rounds[-1]['count']) if len(self) else 0
+        if self.columns_size > offset * record_dtype.itemsize:
+            self.columns = np.zeros(0, dtype=record_dtype)  # Release the mapping before shrinking the file
+            self.columns_size = -1
+            with open(self.columns_path, 'r+b') as file:
+                file.truncate(offset * record_dtype.itemsize)
+        with open(self.columns_path, 'ab') as file:
+            file.write(records.tobytes())
+        # Metadata lines up with the rounds, pad for rounds stored before it existed and drop entries of an interrupted append
+        meta = np.zeros(len(self) + 1, dtype=meta_dtype)
+        meta['base'] = -1
+        meta[:min(len(self), len(self.meta))] = self.meta[:min(len(self), len(self.meta))]
+        meta[-1] = (int(block_number), base)
+        if len(self.meta) != len(self):
+            self.meta = np.zeros(0, dtype=meta_dtype)
+            self.meta_size = -1
+            with open(self.meta_path, 'wb') as file:
+                file.write(meta.tobytes())
+        else:
+            with open(self.meta_path, 'ab') as file:
+                file.write(meta[-1:].tobytes())
+        # The round entry is written last, readers never see a round whose records are incomplete
+        entry = np.array([(int(timestamp), offset, len(records))], dtype=round_dtype)
+        with open(self.rounds_path, 'ab') as file:
+            file.write(entry.tobytes())
+        self.refresh()
+        return format_snapshot_id(timestamp)
+
+    def patch(self, snapshot_id, coin_id, column, value):
+        # Journal one correction instead of touching the round's records. A single O_APPEND write of one fixed-width
+        # record, so concurrent writers never interleave or overwrite each other.
+        self.refresh()
+        position = self.position_of(snapshot_id)
+        token = self.token_index.get(coin_id)
+        if position is None or token is None:
+            return False
+        record = np.array([(int(snapshot_id), token, COLUMN_NAMES.index(column), value)], dtype=patch_dtype)
+        fd = os.open(self.patches_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, record.tobytes())
+        finally:
+            os.close(fd)
+        self._load_patches()  # Also picks up records other writers appended meanwhile
+        return True
+
+    def import_legacy_directory(self, directory):
+        # One-off migration of the old one JSON file per round layout
+        latest_timestamp = self.rounds[-1]['timestamp'] if len(self) else -1
+        legacy_files = sorted(f for f in os.listdir(directory) if f.isdigit() and int(f) > latest_timestamp)
+        for file_name in legacy_files:
+            try:
+                with open(os.path.join(directory, file_name), 'r') as file:
+                    market_prices = json.load(file).get("0", {})
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Skipping unreadable snapshot file {file_name}: {e}")
+                continue
+            self.append(int(file_name), market_prices)
+        if legacy_files:
+            logger.info(f"Imported {len(legacy_files)} legacy snapshot files into the snapshot store.")
+        return len(legacy_files)
+
+
+def get_snapshot_store(directory=None):
+    global snapshot_store
+    directory = directory or os.getenv('DATA_DIRECTORY', 'newerdata')
+    if snapshot_store is None or snapshot_store.directory != directory:
+        snapshot_store = SnapshotStore(directory)
+        if not len(snapshot_store):
+            snapshot_store.import_legacy_directory(directory)
+    else:
+        snapshot_store.refresh()
+    return snapshot_store
@@ -0,0 +1,129 @@
+from itertools import chain
+from typing import NamedTuple
+import numpy as np
+
+MISSING_PRICE = (np.nan,)
+
+
+def target_digits(value):
+    # Decimal places a target is written with, price ratios are rounded to them before comparing
+    text = str(value)
+    return len(text.split('.')[1]) if '.' in text else 0
+
+
+class MarketUniverse:
+    # One round of market data as aligned column arrays, built once and evaluated by every wallet strategy
+    def __init__(self, latest_data):
+        self.coin_ids = list(latest_data)
+        self.index = {coin_id: position for position, coin_id in enumerate(self.coin_ids)}
+        # fromiter over the flattened records avoids numpy inspecting every tuple
+        values = np.fromiter(chain.from_iterable(latest_data.values()), dtype=float, count=4 * len(self.coin_ids)).reshape(-1, 4)
+        self.price, self.volume, self.real_price, self.market_cap = values.T
+
+    def __len__(self):
+        return len(self.coin_ids)
+
+    def align(self, data, coin_ids=None):
+        # Price column of another {coin_id: PriceRecord} mapping in this universe's order, NaN where a coin is missing
+        coin_ids = self.coin_ids if coin_ids is None else coin_ids
+        return np.fromiter((data.get(coin_id, MISSING_PRICE)[0] for coin_id in coin_ids), dtype=float, count=len(coin_ids))
+
+
+class Signals(NamedTuple):
+    # Evaluation of one side of a strategy, every array is aligned with coin_ids
+    coin_ids: list
+    symbols: list
+    positions: np.ndarray  # Index of each coin in the universe
+    reference_price: np.ndarray  # Holding price for exits, comparison price for entries
+    ratio: np.ndarray
+    actions: np.ndarray
+    pnl: np.ndarray  # NaN where the action has no profit or loss
+    execute: np.ndarray  # Coins that go on to the per-coin execution path
+    skipped: list  # Coins failing the volume, price or symbol checks
+    unseen: list  # Entry candidates without comparison data yet
+
+
+class WalletStrategy:
+    # Buy, sell and stop-loss conditions of one wallet, parsed once from its settings
+    def __init__(self, wallet_settings):
+        self.minimum_volume = float(wallet_settings['MINIMUM_VOLUME'])
+        self.buy_target = float(wallet_settings['BUY_TARGET'])
+        self.buy_digits = target_digits(wallet_settings['BUY_TARGET'])
+        self.sell_target = float(wallet_settings['SELL_TARGET'])
+        self.sell_digits = target_digits(wallet_settings['SELL_TARGET'])
+        self.stop_loss_target = float(wallet_settings['STOP_LOSS_TARGET'])
+        self.stop_loss_digits = target_digits(wallet_settings['STOP_LOSS_TARGET'])
+        self.tolerance = float(wallet_settings.get('PRICE_DIFF_TOLERANCE', '0'))
+        self.sell_factor = (100 - float(wallet_settings['SLIPPAGE'])) / 100
+        self.simulation = wallet_settings.get('SIMULATION') == "True"
+
+    def _tradable(self, universe, positions):
+        # Enough volume, a router price, and API and router prices within 10x of each other
+        price, real_price = universe.price[positions], universe.real_price[positions]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            discrepancy = (price > 0) & ((real_price / price > 10) | (price / real_price > 10))
+        return (universe.volume[positions] >= self.minimum_volume) & (real_price > 0) & ~discrepancy
+
+    def _with_symbols(self, universe, coin_ids, positions, symbol_of):
+        # Symbols are only resolved for coins passing the numeric checks
+        mask = self._tradable(universe, positions)
+        symbols = [symbol_of(coin_id) if ok else 'N/A' for coin_id, ok in zip(coin_ids, mask.tolist())]
+        mask &= np.array([symbol != 'N/A' for symbol in symbols], dtype=bool)
+        return mask, symbols
+
+    def evaluate_exits(self, universe, holdings, symbol_of):
+        # Sell and stop-loss conditions for every held coin
+        held = list(holdings)
+        in_universe = [coin_id in universe.index for coin_id in held]
+        coin_ids = [coin_id for coin_id, ok in zip(held, in_universe) if ok]
+        skipped = [coin_id for coin_id, ok in zip(held, in_universe) if not ok]
+        positions = np.array([universe.index[coin_id] for coin_id in coin_ids], dtype=np.intp)
+        mask, symbols = self._with_symbols(universe, coin_ids, positions, symbol_of)
+        skipped += [coin_id for coin_id, ok in zip(coin_ids, mask.tolist()) if not ok]
+        coin_ids = [coin_id for coin_id, ok in zip(coin_ids, mask.tolist()) if ok]
+        symbols = [symbol for symbol, ok in zip(symbols, mask.tolist()) if ok]
+        positions = positions[mask]
+
+        holding = [holdings[coin_id] for coin_id in coin_ids]
+        holding_price = np.array([float(info[0]) for info in holding], dtype=float)
+        holding_usd = np.array([float(info[2]) if len(info) > 2 else 0 for info in holding], dtype=float)
+        holding_tokens = np.array([float(info[3]) if len(info) > 3 else 0 for info in holding], dtype=float)
+        price, real_price = universe.price[positions], universe.real_price[positions]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where(holding_price != 0, real_price / holding_price, 0.0)
+        sell = np.round(ratio, self.sell_digits) >= self.sell_target
+        stop_loss = ~sell & (np.round(ratio, self.stop_loss_digits) <= self.stop_loss_target)
+        actions = np.where(sell, 'sell', np.where(stop_loss, 'stop_loss', 'hold'))
+        pnl = holding_tokens * self.sell_factor * real_price - holding_usd
+        if self.simulation:
+            execute = sell | stop_loss
+        else:
+            # The API price has to confirm the move within the tolerance before a sell goes out
+            execute = (sell & (price >= real_price * (1 - self.tolerance))) | (stop_loss & (price <= real_price * (1 + self.tolerance)))
+        return Signals(coin_ids, symbols, positions, holding_price, ratio, actions, pnl, execute, skipped, [])
+
+    def evaluate_entries(self, universe, comparison_price, holdings, symbol_of, is_known):
+        # Buy condition for every coin of the universe not held yet, comparison_price is aligned with the universe (NaN for unseen coins)
+        not_held = np.array([coin_id not in holdings for coin_id in universe.coin_ids], dtype=bool)
+        positions = np.nonzero(not_held)[0]
+        coin_ids = [universe.coin_ids[position] for position in positions.tolist()]
+        mask, symbols = self._with_symbols(universe, coin_ids, positions, symbol_of)
+        skipped = [coin_id for coin_id, ok in zip(coin_ids, mask.tolist()) if not ok]
+
+        comparison_price = comparison_price[positions]
+        seen = ~np.isnan(comparison_price)
+        unseen = [coin_id for coin_id, ok in zip(coin_ids, (mask & ~seen).tolist()) if ok]
+        mask &= seen
+        mask &= np.array([is_known(coin_id) if ok else False for coin_id, ok in zip(coin_ids, mask.tolist())], dtype=bool)
+        # Counted as processed but not compared, like a coin without a usable price
+        priceless = mask & ((universe.price[positions] == 0) | (comparison_price == 0))
+        skipped += [coin_id for coin_id, ok in zip(coin_ids, priceless.tolist()) if ok]
+
+        keep = mask & ~priceless
+        coin_ids = [coin_id for coin_id, ok in zip(coin_ids, keep.tolist()) if ok]
+        symbols = [symbol for symbol, ok in zip(symbols, keep.tolist()) if ok]
+        positions, comparison_price = positions[keep], comparison_price[keep]
+        ratio = universe.real_price[positions] / comparison_price
+        buy = np.round(ratio, self.buy_digits) <= self.buy_target
+        actions = np.where(buy, 'buy', 'no_action')
+        return Signals(coin_ids, symbols, positions, comparison_price, ratio, actions, np.full(len(coin_ids), np.nan), buy, skipped, unseen)
@@ -0,0 +1,123 @@
+import os
+import time
+import queue
+import sqlite3
+import threading
+import requests
+from dotenv import load_dotenv
+from loguru import logger
+
+# Load environment variables
+load_dotenv()
+
+supply_cache_db_path = os.getenv('SUPPLY_CACHE_DB_PATH', '../configs/supply_cache.db')
+supply_cache_ttl = float(os.getenv('SUPPLY_CACHE_TTL', 86400))  # Circulating supply moves slowly, one day by default
+bscscan_rate_limit = float(os.getenv('BSCSCAN_RATE_LIMIT', 4))  # Requests per second, the free BscScan tier allows 5
+supply_write_batch = 100
+
+supply_cache = None
+
+
+def fetch_circulating_supply(token_address):
+    # Raises on network errors, returns None when BscScan has no circulating supply for the token
+    api_key = os.getenv("BSCSCAN_API_KEY")
+    api_url = f"https://api.bscscan.com/api?module=stats&action=tokenCsupply&contractaddress={token_address}&apikey={api_key}"
+    response = requests.get(api_url, timeout=10)
+    response.raise_for_status()
+    result = response.json()
+    if result.get('status') == '1':
+        return float(result['result'])
+    return None
+
+
+class SupplyCache:
+    # Circulating supplies persisted in SQLite, lookups never block and stale entries are refreshed by a background thread
+    def __init__(self, db_path=supply_cache_db_path, ttl=supply_cache_ttl):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.entries = {}  # lowercase address -> (circulating supply or None, fetched_at)
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.worker = None
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with sqlite3.connect(db_path) as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS circulating_supply
+                            (address TEXT PRIMARY KEY, supply REAL, fetched_at REAL)''')
+            for address, supply, fetched_at in conn.execute('SELECT address, supply, fetched_at FROM circulating_supply'):
+                self.entries[address] = (supply, fetched_at)
+        logger.info(f"Supply cache loaded {len(self.entries)} tokens from {db_path}")
+
+    def get(self, token_address):
+        # Returns the cached supply (possibly stale) or None, and schedules a refresh when needed
+        address = token_address.lower()
+        entry = self.entries.get(address)
+        if entry is None or time.time() - entry[1] > self.ttl:
+            self._schedule(address)
+        return entry[0] if entry else None
+
+    def _schedule(self, address):
+        with self.lock:
+            if address in self.pending:
+                return
+            self.pending.add(address)
+            self.queue.put(address)
+            if self.worker is None or not self.worker.is_alive():
+                self._start_worker()
+
+    def _start_worker(self):
+        self.worker = threading.Thread(target=self._refresh_worker, name='supply-cache', daemon=True)
+        self.worker.start()
+
+    def _refresh_worker(self):
+        conn = sqlite3.connect(self.db_path)
+        batch = []
+        interval = 1 / bscscan_rate_limit if bscscan_rate_limit > 0 else 0
+        try:
+            while True:
+                try:
+                    address = self.queue.get(timeout=5)
+                except queue.Empty:
+                    break
+                started = time.time()
+                try:
+                    supply = fetch_circulating_supply(address)
+                except Exception as e:
+                    logger.debug(f"Circulating supply fetch failed for {address}: {e}")
+                    with self.lock:
+                        self.pending.discard(address)
+                    time.sleep(max(0, interval - (time.time() - started)))
+                    continue
+                # Tokens without a circulating supply are remembered too, they fall back to totalSupply until the TTL expires
+                entry = (supply, time.time())
+                self.entries[address] = entry
+                batch.append((address, *entry))
+                with self.lock:
+                    self.pending.discard(address)
+                if len(batch) >= supply_write_batch:
+                    self._write(conn, batch)
+                    batch = []
+                time.sleep(max(0, interval - (time.time() - started)))
+        finally:
+            self._write(conn, batch)
+            conn.close()
+            with self.lock:
+                # Addresses queued while the worker was shutting down need a new worker
+                if self.queue.empty():
+                    self.worker = None
+                else:
+                    self._start_worker()
+
+    def _write(self, conn, batch):
+        if batch:
+            conn.executemany('INSERT OR REPLACE INTO circulating_supply (address, supply, fetched_at) VALUES (?, ?, ?)', batch)
+            conn.commit()
+
+
+def get_supply_cache():
+    global supply_cache
+    if supply_cache is None:
+        supply_cache = SupplyCache()
+    return supply_cache
@@ -0,0 +1,277 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import bisect
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+from eth_abi import abi
+from web3 import Web3
+from loguru import logger
+from library.pair_index import get_pair_index, sort_tokens, GET_PAIR_SELECTOR, ZERO_ADDRESS
+from library.reserve_pricing import fetch_reserve_snapshot, GET_RESERVES_CALLDATA
+
+# Load environment variables
+load_dotenv()
+
+SYNC_TOPIC = Web3.to_hex(Web3.keccak(text='Sync(uint112,uint112)'))
+AGGREGATE3_SELECTOR = Web3.keccak(text='aggregate3((address,bool,bytes)[])')[:4]
+sync_log_block_range = int(os.getenv('SYNC_LOG_BLOCK_RANGE', 500))  # Blocks per eth_getLogs request
+sync_log_address_chunk = int(os.getenv('SYNC_LOG_ADDRESS_CHUNK', 1000))  # Pair addresses per eth_getLogs request
+sync_reconcile_interval = float(os.getenv('SYNC_RECONCILE_INTERVAL', 900))  # Seconds between full getReserves rescans
+
+sync_feeds = {}
+
+
+def fetch_sync_logs(web3, addresses, from_block, to_block):
+    # eth_getLogs split by block range and address count so the node's response limits are respected
+    logs = []
+    for range_start in range(from_block, to_block + 1, sync_log_block_range):
+        range_end = min(range_start + sync_log_block_range - 1, to_block)
+        for i in range(0, len(addresses), sync_log_address_chunk):
+            logs.extend(web3.eth.get_logs({
+                'fromBlock': range_start,
+                'toBlock': range_end,
+                'address': addresses[i:i + sync_log_address_chunk],
+                'topics': [SYNC_TOPIC],
+            }))
+    return logs
+
+
+class SyncFeed:
+    # Keeps a reserve snapshot current from Sync events, with a periodic full multicall rescan to correct any drift
+    def __init__(self, web3, factory_address):
+        self.web3 = web3
+        self.factory_address = Web3.to_checksum_address(factory_address)
+        self.snapshot = None
+        self.pairs = {}  # pair address -> (token0, token1)
+        self.last_block = None
+        self.last_reconcile = 0
+
+    async def reconcile(self, executor, token_pairs, block_number):
+        # Read the reserves of the given pairs at block_number and start tracking them
+        snapshot, _ = await fetch_reserve_snapshot(executor, self.factory_address, token_pairs, block_identifier=block_number)
+        if self.snapshot is None:
+            self.snapshot = snapshot
+        else:
+            self.snapshot.reserves.update(snapshot.reserves)
+        pair_index = get_pair_index()
+        for key in snapshot.reserves:
+            self.pairs[pair_index.get_pair(self.factory_address, *key)] = key
+        return snapshot
+
+    def poll(self, to_block):
+        # Apply every Sync event of the tracked pairs after last_block, returns the pairs that changed
+        changed = set()
+        if self.last_block is None or to_block <= self.last_block or not self.pairs:
+            self.last_block = max(self.last_block or 0, to_block)
+            return changed
+        logs = fetch_sync_logs(self.web3, list(self.pairs), self.last_block + 1, to_block)
+        # Only the last Sync of a pair in the range matters, apply them in chain order
+        for log in sorted(logs, key=lambda log: (log['blockNumber'], log['logIndex'])):
+            key = self.pairs.get(Web3.to_checksum_address(log['address']))
+            if key is None:
+                continue
+            reserve0, reserve1 = abi.decode(['uint112', 'uint112'], bytes(log['data']))
+            self.snapshot.reserves[key] = (reserve0, reserve1)
+            changed.add(key)
+        self.last_block = to_block
+        logger.info(f"Sync feed applied {len(logs)} Sync events up to block {to_block}, {len(changed)} pairs changed")
+        return changed
+
+    async def update(self, executor, token_pairs, block_number):
+        # Returns a snapshot current at block_number, rescanning fully only when the reconciliation interval is due
+        keys = {sort_tokens(token_a, token_b) for token_a, token_b in token_pairs}
+        if self.snapshot is None or time.time() - self.last_reconcile > sync_reconcile_interval:
+            self.snapshot = None
+            self.pairs = {}
+            await self.reconcile(executor, token_pairs, block_number)
+            self.last_block = block_number
+            self.last_reconcile = time.time()
+        else:
+            await asyncio.to_thread(self.poll, block_number)
+            tracked = set(self.pairs.values())
+            new_pairs = [key for key in keys if key not in tracked]
+            if new_pairs:
+                await self.reconcile(executor, new_pairs, block_number)
+        self.snapshot.timestamp = time.time()
+        self.snapshot.block_number = block_number
+        return self.snapshot
+
+
+def get_sync_feed(web3, factory_address):
+    # One feed per factory for the lifetime of the process, its reserves carry over between rounds
+    factory_address = Web3.to_checksum_address(factory_address)
+    feed = sync_feeds.get(factory_address)
+    if feed is None:
+        feed = sync_feeds[factory_address] = SyncFeed(web3, factory_address)
+    return feed
+
+
+def read_reserves_at(web3, multicall_address, pair_addresses, block_number, chunk_size=500):
+    # getReserves of every pair at one block through aggregate3, None for pairs that did not answer
+    reserves = []
+    for i in range(0, len(pair_addresses), chunk_size):
+        calls = [(pair_address, True, GET_RESERVES_CALLDATA) for pair_address in pair_addresses[i:i + chunk_size]]
+        data = web3.eth.call({'to': Web3.to_checksum_address(multicall_address), 'data': Web3.to_hex(AGGREGATE3_SELECTOR + abi.encode(['(address,bool,bytes)[]'], [calls]))}, block_number)
+        for success, return_data in abi.decode(['(bool,bytes)[]'], bytes(data))[0]:
+            reserves.append(list(abi.decode(['uint112', 'uint112', 'uint32'], return_data)[:2]) if success and len(return_data) >= 96 else None)
+    return reserves
+
+
+def record_logs(web3, factory_address, from_block, to_block, output_path, multicall_address=None):
+    # Save the Sync events of every indexed pair of the factory, with the pairs and their reserves before from_block,
+    # so both the feed and its reconciliation can be replayed offline
+    factory_address = Web3.to_checksum_address(factory_address)
+    indexed = [(key[1], key[2], pair) for key, (pair, _) in get_pair_index().pairs.items() if pair and key[0] == factory_address]
+    addresses = [pair for _, _, pair in indexed]
+    logs = fetch_sync_logs(web3, addresses, from_block, to_block)
+    start_reserves = read_reserves_at(web3, multicall_address or os.getenv('MULTICALL_ADDRESS'), addresses, from_block - 1)
+    recorded = [{
+        'address': log['address'],
+        'blockNumber': log['blockNumber'],
+        'blockHash': Web3.to_hex(log['blockHash']),
+        'transactionHash': Web3.to_hex(log['transactionHash']),
+        'transactionIndex': log['transactionIndex'],
+        'logIndex': log['logIndex'],
+        'data': Web3.to_hex(log['data']),
+        'topics': [Web3.to_hex(topic) for topic in log['topics']],
+        'removed': False,
+    } for log in logs]
+    pairs = [{'token0': token0, 'token1': token1, 'pair': pair, 'reserves': reserves}
+             for (token0, token1, pair), reserves in zip(indexed, start_reserves) if reserves is not None]
+    with open(output_path, 'w') as file:
+        json.dump({'factory': factory_address, 'start': from_block, 'head': to_block, 'pairs': pairs, 'logs': recorded}, file)
+    logger.info(f"Recorded {len(recorded)} Sync events of {len(pairs)} pairs from block {from_block} to {to_block} into {output_path}")
+
+
+class RecordedChain:
+    # Answers the reads the feed makes from a recording: eth_getLogs, and eth_call for getPair and getReserves, alone or in aggregate3
+    def __init__(self, recording):
+        self.logs = recording['logs']
+        self.head = recording.get('head') or max((log['blockNumber'] for log in self.logs), default=0)
+        self.factory = recording.get('factory', ZERO_ADDRESS).lower()
+        self.pairs = {(pair['token0'].lower(), pair['token1'].lower()): pair['pair'] for pair in recording.get('pairs', [])}
+        # pair -> Sync states in chain order, the recorded starting reserves first
+        self.states = {pair['pair'].lower(): [((-1, -1), tuple(pair['reserves']))] for pair in recording.get('pairs', [])}
+        for log in sorted(self.logs, key=lambda log: (log['blockNumber'], log['logIndex'])):
+            states = self.states.get(log['address'].lower())
+            if states is not None:
+                states.append(((log['blockNumber'], log['logIndex']), abi.decode(['uint112', 'uint112'], bytes.fromhex(log['data'][2:]))))
+
+    def to_block_number(self, value):
+        if value in (None, 'latest', 'safe', 'finalized', 'pending'):
+            return self.head
+        return value if isinstance(value, int) else int(value, 16)
+
+    def reserves_at(self, pair_address, block_number):
+        states = self.states[pair_address.lower()]
+        position = bisect.bisect_right(states, (block_number, float('inf')), key=lambda state: state[0]) - 1
+        return states[max(position, 0)][1]
+
+    def call(self, target, data, block_number):
+        # (success, return data) of one call at block_number
+        target = target.lower()
+        if target == self.factory and data[:4] == GET_PAIR_SELECTOR:
+            token0, token1 = sort_tokens(*abi.decode(['address', 'address'], data[4:]))
+            return True, abi.encode(['address'], [self.pairs.get((token0.lower(), token1.lower()), ZERO_ADDRESS)])
+        if target in self.states and data[:4] == GET_RESERVES_CALLDATA:
+            return True, abi.encode(['uint112', 'uint112', 'uint32'], [*self.reserves_at(target, block_number), 0])
+        if data[:4] == AGGREGATE3_SELECTOR:
+            calls = abi.decode(['(address,bool,bytes)[]'], data[4:])[0]
+            results = [self.call(call_target, call_data, block_number) for call_target, _, call_data in calls]
+            if any(not success and not allow_failure for (success, _), (_, allow_failure, _) in zip(results, calls)):
+                return False, b''
+            return True, abi.encode(['(bool,bytes)[]'], [results])
+        return False, b''
+
+    def eth_call(self, params):
+        transaction = params[0]
+        success, data = self.call(transaction['to'], bytes.fromhex(transaction.get('data', transaction.get('input', '0x'))[2:]), self.to_block_number(params[1] if len(params) > 1 else 'latest'))
+        if not success:
+            raise ValueError('execution reverted')
+        return Web3.to_hex(data)
+
+    def get_logs(self, params):
+        from_block, to_block = self.to_block_number(params.get('fromBlock', 'latest')), self.to_block_number(params.get('toBlock', 'latest'))
+        addresses = params.get('address') or []
+        addresses = {address.lower() for address in ([addresses] if isinstance(addresses, str) else addresses)}
+        topics = params.get('topics') or []
+        result = []
+        for log in self.logs:
+            if not from_block <= log['blockNumber'] <= to_block:
+                continue
+            if addresses and log['address'].lower() not in addresses:
+                continue
+            if topics and topics[0] and log['topics'][0].lower() not in ([topics[0]] if isinstance(topics[0], str) else topics[0]):
+                continue
+            result.append({**log, 'blockNumber': hex(log['blockNumber']), 'transactionIndex': hex(log['transactionIndex']), 'logIndex': hex(log['logIndex'])})
+        return result
+
+
+def make_replay_server(recording_path, host='127.0.0.1', port=8545):
+    # Minimal JSON-RPC stand-in serving a recording, port 0 picks a free port
+    with open(recording_path, 'r') as file:
+        chain = RecordedChain(json.load(file))
+
+    methods = {
+        'eth_chainId': lambda params: hex(56),
+        'net_version': lambda params: '56',
+        'eth_blockNumber': lambda params: hex(chain.head),
+        'eth_getLogs': lambda params: chain.get_logs(params[0]),
+        'eth_call': chain.eth_call,
+    }
+
+    def handle(request):
+        method = methods.get(request.get('method'))
+        if method is None:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {'code': -32601, 'message': f"Method {request.get('method')} not recorded"}}
+        try:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'result': method(request.get('params') or [])}
+        except ValueError as e:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {'code': 3, 'message': str(e)}}
+
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            response = json.dumps([handle(item) for item in payload] if isinstance(payload, list) else handle(payload)).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(response)))
+            self.end_headers()
+            self.wfile.write(response)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    logger.info(f"Serving {len(chain.logs)} recorded Sync events of {len(chain.states)} pairs up to block {chain.head} on http://{host}:{server.server_address[1]}")
+    return server
+
+
+def serve_recorded_logs(recording_path, host='127.0.0.1', port=8545):
+    make_replay_server(recording_path, host, port).serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record Sync events or serve a recording as a JSON-RPC stand-in")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    record_parser = subparsers.add_parser('record')
+    record_parser.add_argument('output')
+    record_parser.add_argument('--from-block', type=int, required=True)
+    record_parser.add_argument('--to-block', type=int, required=True)
+    record_parser.add_argument('--factory', default=os.getenv('PANCAKE_FACTORY_ADDRESS'))
+    serve_parser = subparsers.add_parser('serve')
+    serve_parser.add_argument('recording')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8545)
+    args = parser.parse_args()
+    if args.command == 'record':
+        from library.utils import get_web3
+        record_logs(get_web3(), args.factory, args.from_block, args.to_block, args.output)
+    else:
+        serve_recorded_logs(args.recording, args.host, args.port)
+    sys.exit(0)
@@ -0,0 +1,157 @@
+import os
+import json
+import threading
+from dotenv import load_dotenv
+from loguru import logger
+
+# Load environment variables
+load_dotenv()
+
+token_registries = {}
+
+
+class TokenRegistry:
+    # In-memory view of available_coin_list.json with O(1) lookups by address, coin id and symbol
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.coins = {}
+        self.by_address = {}  # lowercase contract address -> coin key, equivalent to comparing checksum addresses
+        self.by_id = {}  # coin['id'] -> coin key
+        self.by_symbol = {}  # uppercase symbol -> first coin key with that symbol
+        # Each index with its holders: value -> every coin key with that value in indexing order, so removals find the next one in O(1)
+        self.indexes = ((self.by_address, {}), (self.by_id, {}), (self.by_symbol, {}))
+        self.mtime = None
+        self.lock = threading.RLock()
+        self.refresh()
+
+    def refresh(self):
+        # Re-read the backing file only when it changed and re-index only the entries that differ
+        with self.lock:
+            try:
+                current_mtime = os.path.getmtime(self.file_path)
+            except OSError:
+                return False
+            if current_mtime == self.mtime:
+                return False
+            try:
+                with open(self.file_path, 'r') as file:
+                    coins = json.load(file)
+            except json.JSONDecodeError as e:
+                logger.warning(f"Coin list {self.file_path} is being rewritten, keeping the previous version: {e}")
+                return False
+            for key in [key for key in self.coins if key not in coins]:
+                self._unindex(key)
+                del self.coins[key]
+            for key, coin in coins.items():
+                if self.coins.get(key) != coin:
+                    self._set(key, coin)
+            self.mtime = current_mtime
+            return True
+
+    def _index(self, key, coin):
+        for index, holders_of in self.indexes:
+            value = self._values(coin, index)
+            if not value or (index is self.by_address and value == 'n/a') or (index is self.by_id and 'id' not in coin):
+                continue
+            holders_of.setdefault(value, {})[key] = None
+            index.setdefault(value, key)
+
+    def _unindex(self, key):
+        coin = self.coins.get(key, {})
+        for index, holders_of in self.indexes:
+            value = self._values(coin, index)
+            holders = holders_of.get(value)
+            if holders is None or key not in holders:
+                continue
+            del holders[key]
+            if not holders:
+                del holders_of[value]
+            if index.get(value) == key:
+                # Another coin may share the value, point the index at the next one that was indexed with it
+                if holders:
+                    index[value] = next(iter(holders))
+                else:
+                    del index[value]
+
+    def _values(self, coin, index):
+        if index is self.by_address:
+            return str(coin.get('contract_address', '')).lower()
+        if index is self.by_id:
+            return str(coin.get('id', ''))
+        return str(coin.get('symbol', '')).strip().upper()
+
+    def _set(self, key, coin):
+        previous = self.coins.get(key)
+        if previous is not None:
+            if all(self._values(previous, index) == self._values(coin, index) for index in (self.by_address, self.by_id, self.by_symbol)):
+                self.coins[key] = coin  # Indexed fields unchanged, nothing to re-index
+                return
+            self._unindex(key)
+        self.coins[key] = coin
+        self._index(key, coin)
+
+    def get(self, coin_id):
+        key = coin_id if coin_id in self.coins else self.by_id.get(coin_id)
+        return self.coins.get(key) if key is not None else None
+
+    def has_id(self, coin_id):
+        return coin_id in self.by_id
+
+    def coin_id_of(self, token_address):
+        return self.by_address.get(str(token_address).lower())
+
+    def symbol_of(self, token_address):
+        key = self.coin_id_of(token_address)
+        return self.coins[key]['symbol'].strip() if key is not None else None
+
+    def address_of(self, token_symbol):
+        # Accepts a coin key, a coin id or a symbol, like the old linear scan in get_token_address
+        token_symbol = str(token_symbol)
+        key = token_symbol if token_symbol in self.coins else self.by_id.get(token_symbol)
+        if key is None:
+            key = self.by_symbol.get(token_symbol.upper())
+        if key is None:
+            return None
+        address = self.coins[key].get('contract_address')
+        if address and address.lower() != "n/a":
+            return address
+        return None
+
+    def symbols(self):
+        return set(self.by_symbol.keys())
+
+    def add(self, coin_id, coin_info):
+        with self.lock:
+            self._set(coin_id, coin_info)
+
+    def remove(self, coin_id):
+        with self.lock:
+            if coin_id in self.coins:
+                self._unindex(coin_id)
+                del self.coins[coin_id]
+
+    def merge(self, coins_data):
+        # Same rules as the fetcher always used: coins already known by symbol are updated in place
+        with self.lock:
+            for coin_id, coin_info in coins_data.items():
+                existing_key = self.by_symbol.get(str(coin_info.get('symbol', 'N/A')).strip().upper())
+                if existing_key is not None:
+                    self._set(existing_key, {**self.coins[existing_key], **coin_info})
+                else:
+                    self._set(coin_id, coin_info)
+            return bool(coins_data)
+
+    def save(self):
+        with self.lock:
+            with open(self.file_path, 'w') as file:
+                json.dump(self.coins, file, indent=4)
+            self.mtime = os.path.getmtime(self.file_path)
+
+
+def get_token_registry(file_path=None):
+    # One registry per process and file, callers refresh() it at round boundaries
+    file_path = file_path or os.getenv('AVAILABLE_COIN_FILE')
+    registry = token_registries.get(file_path)
+    if registry is None:
+        registry = token_registries[file_path] = TokenRegistry(file_path)
+    return registry
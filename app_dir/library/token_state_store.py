@@ -0,0 +1,222 @@
+import os
+import json
+import threading
+import numpy as np
+from types import MappingProxyType
+from loguru import logger
+from library.price_record import to_price_record, to_price_records
+
+# Layout next to TOKEN_STATE_FILE (configs/token_state.json):
+#   token_state.json                - shared base, the state every wallet starts from
+#   token_state_<wallet>.jsonl      - per-wallet overlay journal, one [coin_id, price, volume, real_price, market_cap] line per change,
+#                                     a bare [coin_id] hides a coin the wallet has not seen yet although the base has it
+#   token_state_<wallet>.json       - legacy full per-wallet copy, folded into the overlay the first time a wallet is loaded
+# A wallet sees the base as it was when the wallet started: update_base pins the values it overwrites into every overlay first
+WALLET_PREFIX = 'token_state_'
+COMPACT_RATIO = 4  # Rewrite an overlay journal once it holds this many lines per live entry
+
+token_state_stores = {}
+
+
+def journal_line(coin_id, record):
+    # None is a coin hidden from the wallet, written as a bare [coin_id]
+    return json.dumps([coin_id] if record is None else [coin_id, *record])
+
+
+class WalletTokenState:
+    # Mapping view of one wallet's token state: its own overlay on top of the shared base, None entries hide a base coin
+    def __init__(self, store, path, overlay, journal_lines):
+        self.store = store
+        self.path = path
+        self.overlay = overlay
+        self.journal_lines = journal_lines
+        self.dirty = set()
+
+    def __getitem__(self, coin_id):
+        if coin_id not in self.overlay:
+            return self.store.base()[coin_id]
+        record = self.overlay[coin_id]
+        if record is None:
+            raise KeyError(coin_id)
+        return record
+
+    def get(self, coin_id, default=None):
+        if coin_id not in self.overlay:
+            return self.store.base().get(coin_id, default)
+        record = self.overlay[coin_id]
+        return record if record is not None else default
+
+    def __contains__(self, coin_id):
+        return self.overlay[coin_id] is not None if coin_id in self.overlay else coin_id in self.store.base()
+
+    def __setitem__(self, coin_id, record):
+        record = to_price_record(record)
+        if coin_id in self.overlay:
+            if self.overlay[coin_id] == record:
+                return
+        elif self.store.base().get(coin_id) == record:
+            return  # Equal to the base, update_base pins it should the base change
+        self.overlay[coin_id] = record
+        self.dirty.add(coin_id)
+
+    def pin(self, previous):
+        # Keep the base values about to be overwritten (None for coins the base did not have) for coins the wallet did not change
+        for coin_id, record in previous.items():
+            if coin_id not in self.overlay:
+                self.overlay[coin_id] = record
+                self.dirty.add(coin_id)
+        return self.save()
+
+    def keys(self):
+        hidden = {coin_id for coin_id, record in self.overlay.items() if record is None}
+        return (self.store.base().keys() | self.overlay.keys()) - hidden
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        base = self.store.base()
+        return ((coin_id, self.overlay[coin_id] if coin_id in self.overlay else base[coin_id]) for coin_id in self.keys())
+
+    def aligned_price(self, universe):
+        # Price column in universe order: the base column is shared by every wallet, only the overlay is applied per wallet
+        prices = self.store.base_price(universe).copy()
+        for coin_id, record in self.overlay.items():
+            position = universe.index.get(coin_id)
+            if position is not None:
+                prices[position] = record.price if record is not None else np.nan
+        return prices
+
+    def save(self):
+        # Append only the entries changed since the last save, compacting the journal when it outgrows the overlay
+        if not self.dirty:
+            return 0
+        lines = [journal_line(coin_id, self.overlay[coin_id]) for coin_id in self.dirty]
+        if self.journal_lines + len(lines) > COMPACT_RATIO * max(len(self.overlay), 64):
+            self.compact()
+        else:
+            with open(self.path, 'a') as file:
+                file.write('\n'.join(lines) + '\n')
+            self.journal_lines += len(lines)
+        count = len(self.dirty)
+        self.dirty.clear()
+        return count
+
+    def compact(self):
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, 'w') as file:
+            file.write(''.join(journal_line(coin_id, record) + '\n' for coin_id, record in self.overlay.items()))
+        os.replace(temporary_path, self.path)
+        self.journal_lines = len(self.overlay)
+        self.dirty.clear()
+
+
+class TokenStateStore:
+    def __init__(self, base_path):
+        self.base_path = base_path
+        self.base_data = MappingProxyType({})
+        self.base_mtime = None
+        self.base_prices = (None, None)  # (universe, base price column aligned with it)
+        self.wallets = {}
+        self.lock = threading.RLock()
+
+    def base(self):
+        # Shared read-only base, reloaded only when the file changed
+        with self.lock:
+            try:
+                mtime = os.path.getmtime(self.base_path)
+            except OSError:
+                return self.base_data
+            if mtime != self.base_mtime:
+                with open(self.base_path, 'r') as file:
+                    self.base_data = MappingProxyType(to_price_records(json.load(file).get("0", {})))
+                self.base_mtime = mtime
+                self.base_prices = (None, None)
+            return self.base_data
+
+    def base_price(self, universe):
+        with self.lock:
+            base = self.base()
+            if self.base_prices[0] is not universe:
+                prices = universe.align(base)
+                prices.flags.writeable = False
+                self.base_prices = (universe, prices)
+            return self.base_prices[1]
+
+    def update_base(self, records):
+        # Merge records into the shared base, written compactly to a temporary file and swapped in
+        with self.lock:
+            base = self.base()
+            records = to_price_records(records)
+            previous = {coin_id: base.get(coin_id) for coin_id, record in records.items() if base.get(coin_id) != record}
+            if previous:
+                # Pinned and saved before the base moves on, an interruption in between only leaves overlay entries equal to the base
+                for wallet_name in self.wallet_names():
+                    self.wallet(wallet_name).pin(previous)
+            merged = dict(base)
+            merged.update(records)
+            temporary_path = f"{self.base_path}.tmp"
+            with open(temporary_path, 'w') as file:
+                json.dump({"0": merged}, file, separators=(',', ':'))
+            os.replace(temporary_path, self.base_path)
+            self.base_data = MappingProxyType(merged)
+            self.base_mtime = os.path.getmtime(self.base_path)
+            self.base_prices = (None, None)
+            return len(merged)
+
+    def wallet_path(self, wallet_name, extension):
+        return self.base_path.replace('token_state.json', f'{WALLET_PREFIX}{wallet_name}{extension}')
+
+    def wallet_names(self):
+        # Wallets loaded in this process and those with an overlay or a legacy copy on disk
+        names = set(self.wallets)
+        folder = os.path.dirname(self.base_path) or '.'
+        for file_name in os.listdir(folder) if os.path.isdir(folder) else []:
+            stem, extension = os.path.splitext(file_name)
+            if stem.startswith(WALLET_PREFIX) and extension in ('.jsonl', '.json'):
+                names.add(stem[len(WALLET_PREFIX):])
+        return sorted(names)
+
+    def wallet(self, wallet_name):
+        # Overlay of one wallet, loaded once per process and kept in step by its own saves
+        with self.lock:
+            state = self.wallets.get(wallet_name)
+            if state is None:
+                state = self.wallets[wallet_name] = self._load_wallet(wallet_name)
+            return state
+
+    def _load_wallet(self, wallet_name):
+        path = self.wallet_path(wallet_name, '.jsonl')
+        overlay, journal_lines = {}, 0
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                for line in file:
+                    try:
+                        coin_id, *values = json.loads(line)
+                    except (ValueError, TypeError):
+                        continue  # A line cut short by an interrupted append
+                    overlay[coin_id] = to_price_record(values) if values else None
+                    journal_lines += 1
+            return WalletTokenState(self, path, overlay, journal_lines)
+        state = WalletTokenState(self, path, overlay, 0)
+        legacy_path = self.wallet_path(wallet_name, '.json')
+        if os.path.exists(legacy_path):
+            # The legacy copy is what the wallet saw: all of it goes into the overlay and base coins it lacks are hidden
+            with open(legacy_path, 'r') as file:
+                legacy = to_price_records(json.load(file).get("0", {}))
+            overlay.update({coin_id: None for coin_id in self.base() if coin_id not in legacy})
+            overlay.update(legacy)
+            logger.info(f"Folded {legacy_path} into a {len(overlay)} entry token state overlay")
+        state.compact()
+        return state
+
+
+def get_token_state_store(base_path=None):
+    base_path = base_path or os.getenv('TOKEN_STATE_FILE', 'configs/token_state.json')
+    store = token_state_stores.get(base_path)
+    if store is None:
+        store = token_state_stores[base_path] = TokenStateStore(base_path)
+    return store
@@ -0,0 +1,117 @@
+import os
+import time
+import asyncio
+import collections
+import concurrent.futures
+from dotenv import load_dotenv
+from loguru import logger
+
+# Load environment variables
+load_dotenv()
+
+trade_engine_workers = int(os.getenv('TRADE_ENGINE_WORKERS', 8))  # Trades executing at once across all wallets
+trade_queue_size = int(os.getenv('TRADE_QUEUE_SIZE', 64))  # Intents waiting for a worker before submitters are held back
+trade_wallet_concurrency = int(os.getenv('TRADE_WALLET_CONCURRENCY', 2))  # Trades of one wallet executing at once, only 1 keeps them in submission order
+trade_rpc_budget = float(os.getenv('TRADE_RPC_BUDGET', 50))  # RPC calls per second shared by every trade, 0 for no limit
+trade_rpc_cost = float(os.getenv('TRADE_RPC_COST', 15))  # RPC calls one trade is expected to make
+
+
+class RpcBudget:
+    # Token bucket shared by every wallet, each trade draws its expected number of RPC calls before it starts
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, cost):
+        if self.rate <= 0:
+            return
+        cost = min(cost, self.burst)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= cost:
+                    self.tokens -= cost
+                    return
+                await asyncio.sleep((cost - self.tokens) / self.rate)
+
+
+class TradeEngine:
+    # Executes trade intents off the analysis path: per-wallet queues drained by workers, a wallet's intents are only taken
+    # while it has a free slot, so a busy wallet never holds a worker that other wallets could use
+    def __init__(self, execute, workers=trade_engine_workers, queue_size=trade_queue_size, wallet_concurrency=trade_wallet_concurrency,
+                 rpc_budget=trade_rpc_budget, rpc_cost=trade_rpc_cost):
+        self.execute = execute  # Coroutine function running one trade
+        self.workers = workers
+        self.room = asyncio.Semaphore(queue_size)  # Intents waiting for a worker before submitters are held back
+        self.wallet_queues = {}  # wallet key -> deque of (args, kwargs, future) in submission order
+        self.running = collections.Counter()  # wallet key -> trades executing
+        self.ready_slots = collections.Counter()  # wallet key -> entries in ready
+        self.ready = asyncio.Queue()  # One wallet key per intent a worker may take now
+        self.wallet_concurrency = wallet_concurrency
+        self.budget = RpcBudget(rpc_budget, max(rpc_budget, rpc_cost))
+        self.rpc_cost = rpc_cost
+        self.threads = None
+        self.tasks = []
+
+    def start(self):
+        # Each trade runs in its own thread and event loop, so its blocking web3 calls never stall the round
+        self.threads = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='trade')
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        return self
+
+    async def submit(self, wallet_key, *args, **kwargs):
+        # Queue a trade and wait for its result, waits for room first when the queue is full
+        future = asyncio.get_running_loop().create_future()
+        await self.room.acquire()
+        self.wallet_queues.setdefault(wallet_key, collections.deque()).append((args, kwargs, future))
+        self._schedule(wallet_key)
+        return await future
+
+    def _schedule(self, wallet_key):
+        # Offer the wallet's next intents to the workers, as many as it has free slots
+        # Intents start in submission order, with more than one slot a later trade of the wallet may still finish first
+        pending = len(self.wallet_queues.get(wallet_key, ()))
+        while self.ready_slots[wallet_key] < pending and self.running[wallet_key] + self.ready_slots[wallet_key] < self.wallet_concurrency:
+            self.ready_slots[wallet_key] += 1
+            self.ready.put_nowait(wallet_key)
+
+    def _run(self, args, kwargs):
+        return asyncio.run(self.execute(*args, **kwargs))
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            wallet_key = await self.ready.get()
+            self.ready_slots[wallet_key] -= 1
+            self.running[wallet_key] += 1
+            wallet_queue = self.wallet_queues[wallet_key]
+            args, kwargs, future = wallet_queue.popleft()
+            if not wallet_queue:
+                del self.wallet_queues[wallet_key]
+            self.room.release()
+            try:
+                await self.budget.acquire(self.rpc_cost)
+                result = await loop.run_in_executor(self.threads, self._run, args, kwargs)
+                if not future.cancelled():
+                    future.set_result(result)
+            except Exception as e:
+                logger.error(f"Trade for wallet {wallet_key} failed in the trade engine: {e}")
+                if not future.cancelled():
+                    future.set_exception(e)
+            finally:
+                self.running[wallet_key] -= 1
+                self._schedule(wallet_key)  # Before task_done, so close() never sees an empty ready queue with intents left
+                self.ready.task_done()
+
+    async def close(self):
+        # Finish every queued trade, then stop the workers
+        await self.ready.join()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.threads.shutdown(wait=False)
@@ -0,0 +1,102 @@
+import os
+import io
+import sys
+import csv
+import json
+from datetime import datetime
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Layout inside CSV_FOLDER:
+#   trade_actions_log_YYYYMMDD.csv  - daily partition, every round appends its rows in one write
+#   trade_actions_log_latest.json   - where the last round's rows start in its partition, the "latest" view is read from there
+FILE_PREFIX = 'trade_actions_log_'
+LATEST_POINTER = 'trade_actions_log_latest.json'
+
+no_action_policy = os.getenv('TRADE_LOG_NO_ACTION', 'drop').lower()  # 'keep', 'drop' or 'sample' the no_action rows
+no_action_sample_rate = float(os.getenv('TRADE_LOG_SAMPLE_RATE', 0.01))  # Share of no_action rows kept with the 'sample' policy
+
+rng = np.random.default_rng()
+
+
+def partition_name(day=None):
+    return f"{FILE_PREFIX}{(day or datetime.now()).strftime('%Y%m%d')}.csv"
+
+
+class TradeLog:
+    # Trade action rows buffered in memory during a round and appended to the day's partition once per round
+    def __init__(self, folder, header, policy=no_action_policy, sample_rate=no_action_sample_rate):
+        self.folder = folder
+        self.header = header
+        self.policy = policy
+        self.sample_rate = sample_rate
+        self.buffer = []
+        os.makedirs(folder, exist_ok=True)
+
+    def keep(self, actions):
+        # Mask of the rows worth formatting, no_action rows only pass according to the policy
+        actions = np.asarray(actions)
+        keep = actions != 'no_action'
+        if self.policy == 'keep':
+            keep[:] = True
+        elif self.policy == 'sample':
+            keep |= rng.random(len(actions)) < self.sample_rate
+        return keep
+
+    def extend(self, rows):
+        self.buffer.extend(rows)
+
+    def flush(self):
+        # One append per round, the header is written when the day's partition is created
+        rows, self.buffer = self.buffer, []
+        file_name = partition_name()
+        path = os.path.join(self.folder, file_name)
+        offset = os.path.getsize(path) if os.path.exists(path) else 0
+        text = io.StringIO()
+        writer = csv.writer(text)
+        if offset == 0:
+            writer.writerow(self.header)
+        writer.writerows(rows)
+        with open(path, 'a', newline='') as file:
+            file.write(text.getvalue())
+        # The rows are written once, the latest view only records where this round's rows start
+        temporary_path = os.path.join(self.folder, f"{LATEST_POINTER}.tmp")
+        with open(temporary_path, 'w') as file:
+            json.dump({'file': file_name, 'offset': offset, 'rows': len(rows)}, file)
+        os.replace(temporary_path, os.path.join(self.folder, LATEST_POINTER))
+        return len(rows)
+
+
+def read_latest(folder):
+    # (header, rows) of the last flushed round, read back from its partition through the pointer written by flush
+    try:
+        with open(os.path.join(folder, LATEST_POINTER), 'r') as file:
+            pointer = json.load(file)
+        with open(os.path.join(folder, pointer['file']), 'rb') as file:
+            header = next(csv.reader([file.readline().decode()]))
+            file.seek(max(pointer['offset'], file.tell()))  # Byte offset, the partition is read in binary
+            reader = csv.reader(io.StringIO(file.read().decode(), newline=''))
+            return header, [row for _, row in zip(range(pointer['rows']), reader)]
+    except (OSError, ValueError, KeyError, StopIteration):
+        return None, []
+
+
+if __name__ == "__main__":
+    # python -m library.trade_log latest [file.csv], the last round's rows as the old trade_actions_log_latest.csv held them
+    if len(sys.argv) not in (2, 3) or sys.argv[1] != 'latest':
+        print("Usage: python -m library.trade_log latest [file.csv]")
+        sys.exit(1)
+    header, rows = read_latest(os.getenv('CSV_FOLDER', 'csv_data'))
+    if header is None:
+        print("No round has been logged yet")
+        sys.exit(1)
+    output = open(sys.argv[2], 'w', newline='') if len(sys.argv) == 3 else sys.stdout
+    writer = csv.writer(output)
+    writer.writerow(header)
+    writer.writerows(rows)
+    if output is not sys.stdout:
+        output.close()
+
@@ -3,14 +3,24 @@ import requests
 import os, sys
 from dotenv import load_dotenv
 from web3 import Web3
-from library.utils import core_performance_patcher, initialize_web3
+from library.utils import core_performance_patcher, get_web3
+from library.rpc_pool import hedged_calls
+from library.token_registry import get_token_registry
+from library.multicall_executor import get_multicall_executor
+from library.supply_cache import get_supply_cache
+from library.pair_index import get_pair_index
+from library.sync_feed import get_sync_feed
+from library.preflight import fetch_trade_preflight
+from library.nonce_manager import get_nonce_manager
+from library.receipt_tracker import get_receipt_tracker
+from library.reserve_pricing import pricing_mode, fetch_reserve_snapshot, set_latest_reserve_snapshot, get_latest_reserve_snapshot
+from library.notifier import get_notifier
+import numpy as np
 import time
 from loguru import logger
 import asyncio
 import random
-import aiohttp
 from decimal import Decimal
-from tqdm.asyncio import tqdm
 
 # Load environment variables
 load_dotenv()  # Specify the .env file to load
@@ -34,8 +44,8 @@ bnb_price = None
 debug_mode = os.getenv('DEBUG_MODE') == 'True'
 
 
-# Initialize web3 using the function from utils.py
-web3 = initialize_web3()
+# Initialize web3 using the shared connection from utils.py
+web3 = get_web3()
 
 # Default fallback wallet address and private key
 wallet_address = os.getenv('WALLET_ADDRESS')
@@ -48,8 +58,7 @@ abi_data_folder = os.getenv('ABI_DIRECTORY')
 cmc_api = os.getenv('CMC_API_KEY')
 
 # PancakeSwap Router v2 details
-router_address = os.getenv('ROUTER_ADDRESS')
-router_contract = None
+router_address = os.getenv('ROUTER_ADDRESS')  # Default router, a trade's best router is passed along explicitly
 
 # Pancake Factory details
 pancake_factory = os.getenv('PANCAKE_FACTORY_ADDRESS')
@@ -57,6 +66,8 @@ abi_file_path = os.path.join(os.path.dirname(__file__), abi_data_folder, 'pancak
 with open(abi_file_path) as f:
     pancake_factory_abi = json.load(f)
 factory_contract = web3.eth.contract(address=pancake_factory, abi=pancake_factory_abi)
+# Reserve pricing reads PancakeSwap pairs, local quotes only stand in for this router
+pancake_router_address = Web3.to_checksum_address(os.getenv('PANCAKE_ROUTER_ADDRESS', router_address))
 
 # USDT BEP20 address
 real_usdt_address = os.getenv('USDT_ADDRESS')
@@ -67,13 +78,20 @@ real_bnb_address = os.getenv('BNB_ADDRESS')
 bnb_address = Web3.to_checksum_address(real_bnb_address)
 
 
-# Cache Token Data dictionary
-token_supply_cache = {}
+# Process-wide ABI and contract caches, contracts are keyed by checksum address and ABI file
+abi_cache = {}
+contract_cache = {}
+validated_contracts = set()
+token_abi_files = None
+erc20_encoder = None
+
+# Per (router or 'reserves', token): (pair reserves, quote key, quote, totalSupply) of the last pass that priced it.
+# While the token's WBNB pair reserves are unchanged its quote (kept in BNB, so BNB/USD moves do not invalidate it) and
+# totalSupply are reused, only the conversion to USD and the market cap are redone
+pricing_memory = {}
 
 # COIN LIST INITIALIZATION
-coin_list = {}
-with open(available_coin_file, 'r') as f:
-  coin_list = json.load(f)
+token_registry = get_token_registry(available_coin_file)
 
 # Retry count for API calls
 retry_count = 1
@@ -128,37 +146,45 @@ def calculate_slippage(coin_address, slippage_rate, timestamp):
 # END USED IN SIMULATIONS
 
 def get_token_circulating_supply(token_address):
-    current_time = time.time()
-    cache_entry = token_supply_cache.get(token_address)
-
-    # Check if the cache entry exists and is within the 2-minute validity window
-    if cache_entry and (current_time - cache_entry['timestamp'] < 120):
-        return cache_entry['data']
+    # Served from the persistent supply cache, missing or stale entries are refreshed in the background
+    return get_supply_cache().get(token_address)
 
-    # If not cached or cache is outdated, fetch new data
-    api_key = os.getenv("BSCSCAN_API_KEY")
-    api_url = f"https://api.bscscan.com/api?module=stats&action=tokenCsupply&contractaddress={token_address}&apikey={api_key}"
-    response = requests.get(api_url)
-    if response.status_code == 200:
-        result = response.json()
-        
-        if result['status'] == '1':
-            # Update the cache with new data and timestamp
-            result = result['result']
-            token_supply_cache[token_address] = {'data': result, 'timestamp': current_time}
-            return result
-        else:
-            return None
-    return None
+def load_abi(abi_file_path):
+    # Parsed ABIs are shared read-only between all contracts using the same file
+    if abi_file_path not in abi_cache:
+        try:
+            with open(abi_file_path, 'r') as abi_file:
+                abi_cache[abi_file_path] = json.load(abi_file) or None
+        except (OSError, json.JSONDecodeError):
+            abi_cache[abi_file_path] = None
+    return abi_cache[abi_file_path]
 
 def get_mock_abi():
-    with open(os.path.join(os.path.dirname(__file__), abi_data_folder, 'mock_abi.json')) as f:
-        return json.load(f)
+    return load_abi(os.path.join(os.path.dirname(__file__), abi_data_folder, 'mock_abi.json'))
+
+def get_token_abi_path(address):
+    # Token ABIs are stored as {symbol}_{address}.json, index them by address once instead of resolving the symbol per call
+    global token_abi_files
+    if token_abi_files is None:
+        abi_directory = os.path.join(os.path.dirname(__file__), abi_data_folder)
+        token_abi_files = {}
+        for file_name in os.listdir(abi_directory):
+            token_address = file_name[:-len('.json')].rsplit('_', 1)[-1].lower()
+            if file_name.endswith('.json') and token_address.startswith('0x'):
+                token_abi_files[token_address] = os.path.join(abi_directory, file_name)
+    return token_abi_files.get(address.lower())
+
+def encode_erc20_call(fn_name, args=None):
+    # Calldata for ERC-20 calls is independent of the token, encode it without building a contract or touching the network
+    global erc20_encoder
+    if erc20_encoder is None:
+        erc20_encoder = web3.eth.contract(abi=get_mock_abi())
+    return erc20_encoder.encodeABI(fn_name=fn_name, args=args or [])
 
 # Function to get token symbol with space stripping
 def get_token_symbol(token_address, cmc_id=None):
     token_address = token_address.lower()  # Normalize address
-    symbol = next((coin['symbol'].strip() for coin in coin_list.values() if coin['contract_address'].lower() == token_address), None)
+    symbol = token_registry.symbol_of(token_address)
     if symbol:
         return symbol
     # Fetch from CoinGecko if not found locally, ensuring symbols are stripped of spaces
@@ -170,25 +196,19 @@ def get_token_symbol(token_address, cmc_id=None):
         if token_address in data:
             symbol = data[token_address]['symbol'].strip()  # Strip spaces from symbol
             # Update local coin list with stripped symbol
-            coin_list[str(cmc_id)] = {'symbol': symbol, 'contract_address': token_address}
-            with open(available_coin_file, 'w') as f:
-                json.dump(coin_list, f, indent=2)
+            token_registry.add(str(cmc_id), {'symbol': symbol, 'contract_address': token_address})
+            token_registry.save()
             return symbol
     return None
 
 def get_token_address(token_symbol):
-    token_symbol = token_symbol.upper()  # Normalize symbol
-    address = next((coin['contract_address'] for key, coin in coin_list.items() if coin['symbol'].upper() == token_symbol or ('id' in coin and str(coin['id']).upper() == token_symbol) or key == token_symbol), None)
-    if address and address.lower() != "n/a":
-        return address
-    return None
+    return token_registry.address_of(token_symbol)
 
 def save_untraded_coins(coin_address):
-    # Load the available coin list
-    with open(available_coin_file, 'r') as f:
-        coin_list = json.load(f)
-    # Search for the coin by address and get its symbol and ID
-    coin_id, token_symbol = next(((id, coin['symbol']) for id, coin in coin_list.items() if coin['contract_address'] == coin_address), (None, None))
+    # Look up the coin by address and get its symbol and ID
+    token_registry.refresh()
+    coin_id = token_registry.coin_id_of(coin_address)
+    token_symbol = token_registry.coins[coin_id]['symbol'] if coin_id is not None else None
     
     if token_symbol and coin_id:
         logger.error(f"Token Price not found for {token_symbol}")
@@ -208,9 +228,8 @@ def save_untraded_coins(coin_address):
             with open(shit_coin_file, "w") as file:
                 json.dump(new_entry, file, indent=2)
         # Remove the entry from the available coin list and save the updated list
-        del coin_list[coin_id]
-        with open(available_coin_file, 'w') as f:
-            json.dump(coin_list, f, indent=2)
+        token_registry.remove(coin_id)
+        token_registry.save()
     else:
         logger.error(f"Coin with address {coin_address} not found in available coin list.")
 
@@ -221,7 +240,7 @@ def load_router_contract(filename="pancakeswap_router_abi"):
   return router_contract
 
 def determine_best_router(token_address, token_balance_before_swap, mode=True):
-    global router_contract, router_address
+    # Trades run in parallel threads, the chosen router is returned to the caller instead of being kept in module globals
     # Define potential routers and their ABIs including additional routers
     routers = {
         'PancakeSwap': {'address': os.getenv('PANCAKE_ROUTER_ADDRESS'), 'abi_file': 'pancakeswap_router_abi'},
@@ -234,8 +253,16 @@ def determine_best_router(token_address, token_balance_before_swap, mode=True):
     best_router_name = None
     # Check prices on each router
     comparison_table = []
+    multicall = get_contract(os.getenv("MULTICALL_ADDRESS"), filename='multicall_router_abi')
     for name, router in routers.items():
         local_router_contract = get_contract(router['address'], filename=router['abi_file'])
+        # Routers whose factory has no WBNB pair for the token cannot quote it, skip the failing eth_call
+        factory_address = get_pair_index().factory_of(local_router_contract)
+        if factory_address:
+            pairs = get_pair_index().resolve(get_multicall_executor(multicall), factory_address, [(bnb_address, token_address)])
+            if not any(pairs.values()):
+                comparison_table.append({'Router Name': name, 'Price': 'No pair'})
+                continue
         price = get_token_price_from_router(token_address, local_router_contract, name, token_balance_before_swap, is_buy=mode)
         comparison_table.append({'Router Name': name, 'Price': price})
         if price is not None and price != 0 and price != float('inf') and price != float('-inf'):
@@ -245,7 +272,6 @@ def determine_best_router(token_address, token_balance_before_swap, mode=True):
                 best_router_name = name
     if best_router:
         logger.info(f"Best router determined: {best_router_name} with {'Buy' if mode else 'Sell'} price: {best_price}")
-        router_address = best_router['address']
         router_contract = get_contract(best_router['address'], filename=best_router['abi_file'])
         # Print the comparison table in a good table view
         print("\nComparison Table:")
@@ -257,8 +283,7 @@ def determine_best_router(token_address, token_balance_before_swap, mode=True):
         logger.error("Failed to determine the best router.")
         return None, None, None
 
-def get_token_price_from_router(token_address, router_contract=router_contract, router_name="PancakeSwap", token_balance_before_swap=1, is_buy=True):
-    global router_address
+def get_token_price_from_router(token_address, router_contract=None, router_name="PancakeSwap", token_balance_before_swap=1, is_buy=True):
     # This function fetches the token price from a router by simulating a swap
     if router_contract is None:
         router_contract = load_router_contract()
@@ -288,109 +313,162 @@ def get_token_price_from_router(token_address, router_contract=router_contract,
         # logger.error(f"Failed to get price from {router_name} router for {token_address}: {e}")
         return 0
 
+def decode_total_supply(total_supply_output):
+    from eth_abi import abi
+    return abi.decode(['uint256'], total_supply_output[1])[0] if total_supply_output[0] and total_supply_output[1] != b'' else 0
+
+def market_cap_of(token_address, token_price_in_usd, total_supply):
+    # totalSupply from the pricing multicall stands in until the circulating supply is cached
+    circulating_supply = get_token_circulating_supply(token_address)
+    supply_to_use = circulating_supply if circulating_supply else total_supply
+    return supply_to_use * token_price_in_usd
+
 @logger.catch
-async def get_token_price_from_router_2(token_addresses, router_contract=None, router_name="PancakeSwap", token_balance_before_swap=1, is_buy=True):
-    global router_address
+async def get_token_price_from_router_2(token_addresses, router_contract=None, router_name="PancakeSwap", token_balance_before_swap=1, is_buy=True, block_identifier=None):
     if router_contract is None:
         router_contract = load_router_contract()
 
+    if isinstance(token_addresses, str):
+        token_addresses = [token_addresses]
+    # Every call of one pricing pass reads the same block so cross-token ratios are consistent
+    if block_identifier is None:
+        block_identifier = web3.eth.block_number
+    if pricing_mode in ('reserves', 'sync') and Web3.to_checksum_address(router_contract.address) == pancake_router_address:
+        return await get_token_price_from_reserves(token_addresses, router_name, token_balance_before_swap, is_buy, block_identifier)
+
     try:
         multicall = get_contract(os.getenv("MULTICALL_ADDRESS"), filename='multicall_router_abi')
-        
-        if isinstance(token_addresses, str):
-            token_addresses = [token_addresses]
+        executor = get_multicall_executor(multicall)
+
+        bnb_per_usd = usdt_to_bnb(1)
+        amount_in = web3.to_wei(bnb_per_usd, 'ether') if is_buy else token_balance_before_swap
+        quote_key = None if is_buy else (amount_in, is_buy)  # Buy quotes are per BNB, sell quotes depend on the amount sold
+        total_supply_calldata = encode_erc20_call('totalSupply')
+        prices = {token_address: [0, 0] for token_address in token_addresses}
+
+        # Tokens without a WBNB pair on this router's factory would only produce reverted quotes, and tokens
+        # whose pair reserves did not move since the last pass keep their previous price
+        factory_address = get_pair_index().factory_of(router_contract)
+        reserves_of = {}
+        if factory_address:
+            snapshot, _ = await fetch_reserve_snapshot(executor, factory_address, [(bnb_address, token_address) for token_address in token_addresses], block_identifier=block_identifier)
+            priced_addresses = []
+            for token_address in token_addresses:
+                if get_pair_index().has_pair(factory_address, bnb_address, token_address) is False:
+                    continue
+                reserves_of[token_address] = snapshot.get_reserves(bnb_address, token_address)
+                memory = pricing_memory.get((router_contract.address, token_address))
+                if reserves_of[token_address] is not None and memory and memory[0] == reserves_of[token_address] and memory[1] == quote_key:
+                    token_price_in_usd = memory[2] / bnb_per_usd if is_buy else memory[2]
+                    prices[token_address] = [token_price_in_usd, market_cap_of(token_address, token_price_in_usd, memory[3])]
+                else:
+                    priced_addresses.append(token_address)
+            logger.info(f"{len(token_addresses) - len(reserves_of)} tokens have no WBNB pair on {router_name}, {len(reserves_of) - len(priced_addresses)} unchanged since the last pass")
+        else:
+            priced_addresses = token_addresses
+        token_addresses = priced_addresses
+
+        # Two calls per token in a single call list: the router quote and the token's totalSupply
+        calls = []
+        for token_address in token_addresses:
+            checksum_address = web3.to_checksum_address(token_address)
+            path = [bnb_address, checksum_address] if is_buy else [checksum_address, bnb_address]
+            calls.append((router_contract.address, True, router_contract.functions.getAmountsOut(amount_in, path)._encode_transaction_data()))
+            calls.append((checksum_address, True, total_supply_calldata))
+
+        logger.info(f"Fetching prices for {len(token_addresses)} tokens at block {block_identifier}")
+        results = await executor.execute_async(calls, block_identifier)
+
+        from eth_abi import abi
+        for i, token_address in enumerate(token_addresses):
+            output, total_supply_output = results[2 * i], results[2 * i + 1]
+            try:
+                if output[0] and output[1] != b'':
+                    amounts_out = abi.decode(['uint256[]'], output[1])
+                    price = web3.from_wei(amounts_out[0][-1], 'ether')
+                    token_price_in_usd = float(Decimal('1.0') / Decimal(price)) if is_buy else float(price)
+                    total_supply = decode_total_supply(total_supply_output)
+                    prices[token_address] = [token_price_in_usd, market_cap_of(token_address, token_price_in_usd, total_supply)]
+                    if reserves_of.get(token_address) is not None:
+                        quote = token_price_in_usd * bnb_per_usd if is_buy else token_price_in_usd
+                        pricing_memory[(router_contract.address, token_address)] = (reserves_of[token_address], quote_key, quote, total_supply)
+                else:
+                    prices[token_address] = [0, 0]
+            except Exception as e:
+                prices[token_address] = [0, 0]
 
-        amount_in = web3.to_wei(usdt_to_bnb(1), 'ether') if is_buy else token_balance_before_swap
-        paths = [[bnb_address, web3.to_checksum_address(token_address)] if is_buy else [web3.to_checksum_address(token_address), bnb_address] for token_address in token_addresses]
-        
-        chunk_size = 3000
-        token_address_chunks = [token_addresses[i:i + chunk_size] for i in range(0, len(token_addresses), chunk_size)]
-        prices = {}
+        logger.info(f"Completed fetching prices for {len(token_addresses)} tokens")
+        return prices
+    except Exception as e:
+        logger.error(f"Failed to get prices from {router_name} router for tokens: {e}")
 
-        async def fetch_prices_for_chunk(chunk, chunk_index):
-            call_data = [router_contract.functions.getAmountsOut(amount_in, path)._encode_transaction_data() for path in paths if web3.to_checksum_address(path[1]) in chunk]
-            calls = [(router_contract.address, True, data) for data in call_data]
 
-            results = multicall.functions.aggregate3(calls).call()
-            total_supply_calls = [(get_contract(token).address, False, get_contract(token).functions.totalSupply()._encode_transaction_data()) for token in chunk]
-            total_supply_results = multicall.functions.aggregate3(total_supply_calls).call()
+@logger.catch
+async def get_token_price_from_reserves(token_addresses, router_name="PancakeSwap", token_balance_before_swap=1, is_buy=True, block_identifier='latest'):
+    # Same result shape as get_token_price_from_router_2, priced from one getReserves multicall instead of a quote per token
+    try:
+        multicall = get_contract(os.getenv("MULTICALL_ADDRESS"), filename='multicall_router_abi')
+        executor = get_multicall_executor(multicall)
+        checksum_addresses = [web3.to_checksum_address(token_address) for token_address in token_addresses]
+        token_pairs = [(bnb_address, checksum_address) for checksum_address in checksum_addresses] + [(bnb_address, usdt_address)]
 
-            chunk_prices = {}
-            for i, output in enumerate(results):
-                token_address = chunk[i]
-                try:
-                    from eth_abi import abi
-                    if output[1] != b'':
-                        amounts_out = abi.decode(['uint256[]'], output[1])
-                        if amounts_out:
-                            price = amounts_out[0][-1]
-                            price = web3.from_wei(price, 'ether')
-                            token_price_in_usd = float(Decimal('1.0') / Decimal(price)) if is_buy else float(price)
-                            total_supply_output = total_supply_results[i]
-                            total_supply = abi.decode(['uint256'], total_supply_output[1])[0] if total_supply_output[1] != b'' else 0
-                            circulating_supply = get_token_circulating_supply(token_address)
-                            supply_to_use = circulating_supply if circulating_supply else total_supply
-                            market_cap = supply_to_use * token_price_in_usd
-                        else:
-                            token_price_in_usd = 0
-                    else:
-                        token_price_in_usd = 0
-                    chunk_prices[token_address] = [token_price_in_usd, market_cap]
-                except Exception as e:
-                    chunk_prices[token_address] = [0, 0]
-            
-            logger.info(f"Processed chunk {chunk_index + 1}/{len(token_address_chunks)} ({len(chunk)} tokens)")
-            return chunk_prices
-
-        logger.info(f"Fetching prices for {len(token_addresses)} tokens in {len(token_address_chunks)} chunks")
-        
-        async def process_chunks():
-            tasks = [fetch_prices_for_chunk(chunk, i) for i, chunk in enumerate(token_address_chunks)]
-            for task in tqdm(asyncio.as_completed(tasks), total=len(tasks), desc="Processing chunks", unit="chunk"):
-                chunk_prices = await task
-                prices.update(chunk_prices)
+        if pricing_mode == 'sync':
+            # Reserves kept current from Sync events, the full rescan only runs as a periodic reconciliation
+            snapshot = await get_sync_feed(web3, pancake_factory).update(executor, token_pairs, block_identifier)
+        else:
+            logger.info(f"Fetching reserves for {len(token_addresses)} tokens at block {block_identifier}")
+            snapshot, _ = await fetch_reserve_snapshot(executor, web3.to_checksum_address(pancake_factory), token_pairs, block_identifier=block_identifier)
+        set_latest_reserve_snapshot(snapshot)
 
-        await process_chunks()
+        reserve_bnb, reserve_token = snapshot.reserve_arrays(bnb_address, checksum_addresses)
+        if is_buy:
+            # 1 USD worth of BNB, valued from the WBNB/USDT pair of the same snapshot
+            usdt_reserves = snapshot.get_reserves(usdt_address, bnb_address)
+            amount_in = web3.to_wei(usdt_reserves[1] / usdt_reserves[0] if usdt_reserves and usdt_reserves[0] else usdt_to_bnb(1), 'ether')
+            tokens_out = snapshot.amounts_out(amount_in, reserve_bnb, reserve_token) / 10 ** 18
+            with np.errstate(divide='ignore'):
+                token_prices = np.where(tokens_out > 0, 1 / tokens_out, 0.0)
+        else:
+            amount_in = token_balance_before_swap
+            token_prices = snapshot.amounts_out(amount_in, reserve_token, reserve_bnb) / 10 ** 18
 
-        logger.info(f"Completed fetching prices for {len(token_addresses)} tokens")
+        # Prices are recomputed locally every pass, totalSupply is only read again for tokens whose pair reserves moved
+        prices = {}
+        changed = []
+        for token_address, checksum_address, token_price_in_usd in zip(token_addresses, checksum_addresses, token_prices.tolist()):
+            memory = pricing_memory.get(('reserves', token_address))
+            if token_price_in_usd <= 0:
+                prices[token_address] = [0, 0]
+            elif memory and memory[0] == snapshot.get_reserves(bnb_address, checksum_address):
+                prices[token_address] = [token_price_in_usd, market_cap_of(token_address, token_price_in_usd, memory[3])]
+            else:
+                changed.append((token_address, checksum_address, token_price_in_usd))
+
+        total_supply_calldata = encode_erc20_call('totalSupply')
+        total_supply_results = await executor.execute_async([(checksum_address, True, total_supply_calldata) for _, checksum_address, _ in changed], block_identifier)
+        for (token_address, checksum_address, token_price_in_usd), total_supply_output in zip(changed, total_supply_results):
+            try:
+                total_supply = decode_total_supply(total_supply_output)
+                prices[token_address] = [token_price_in_usd, market_cap_of(token_address, token_price_in_usd, total_supply)]
+                pricing_memory[('reserves', token_address)] = (snapshot.get_reserves(bnb_address, checksum_address), None, None, total_supply)
+            except Exception as e:
+                prices[token_address] = [0, 0]
+
+        logger.info(f"Completed pricing {len(token_addresses)} tokens from reserves, {len(changed)} changed since the last pass")
         return prices
     except Exception as e:
-        logger.error(f"Failed to get prices from {router_name} router for tokens: {e}")
-        return {token_address: [None, None] for token_address in token_addresses}
-
-def send_tele_message_sync(message, token=None, chat_id=None, parse_mode="HTML"):
-    telegram_group_id = os.getenv("TELEGRAM_CHAT_ID") if chat_id is None else chat_id
-    telegram_bot_token = os.getenv("TELEGRAM_BOT_TOKEN") if token is None else token
-    telegram_url = f"https://api.telegram.org/bot{telegram_bot_token}/sendMessage"
-    telegram_data = {"chat_id": telegram_group_id, "text": message, "parse_mode": parse_mode}
-    response = requests.post(telegram_url, data=telegram_data)
-    if response.status_code != 200:
-        logger.error(f"Failed to send message: {response.text}")
-
-async def send_tele_message_async(message, token=None, chat_id=None, parse_mode="HTML"):
-    telegram_group_id = os.getenv("TELEGRAM_CHAT_ID") if chat_id is None else chat_id
-    telegram_bot_token = os.getenv("TELEGRAM_BOT_TOKEN") if token is None else token
-    telegram_url = f"https://api.telegram.org/bot{telegram_bot_token}/sendMessage"
-    telegram_data = {"chat_id": telegram_group_id, "text": message, "parse_mode": parse_mode}
-    connector = aiohttp.TCPConnector(ssl=False)  # Disable SSL verification
-    async with aiohttp.ClientSession(connector=connector) as session:
-        response = await session.post(telegram_url, data=telegram_data)
-        if response.status != 200:
-            text = await response.text()
-            logger.error(f"Failed to send async message: {text}")
-
-def send_tele_message(message, is_async=False, token=None, chat_id=None, parse_mode="HTML"):
-    if debug_mode:
-        logger.debug(message)
-    if is_async:
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            return asyncio.create_task(send_tele_message_async(message, token, chat_id, parse_mode))
-        else:
-            return asyncio.run(send_tele_message_async(message, token, chat_id, parse_mode))
-    else:
-        return send_tele_message_sync(message, token, chat_id, parse_mode)
-
+        logger.error(f"Failed to get prices from {router_name} reserves for tokens: {e}")
+
+def max_buy_usd_within_impact(token_address, max_impact):
+    # Largest USD buy through WBNB whose price impact stays within max_impact, None without a fresh reserve snapshot
+    snapshot = get_latest_reserve_snapshot()
+    if snapshot is None or not token_address:
+        return None
+    usdt_reserves = snapshot.get_reserves(usdt_address, bnb_address)
+    if not usdt_reserves or not usdt_reserves[1]:
+        return None
+    max_bnb_in = snapshot.max_amount_within_impact(bnb_address, web3.to_checksum_address(token_address), max_impact)
+    return max_bnb_in * usdt_reserves[0] / usdt_reserves[1] / 10 ** 18
 
 def fetch_and_store_abi(address, abi_file_path):
     api_key = os.getenv("BSCSCAN_API_KEY")
@@ -401,40 +479,41 @@ def fetch_and_store_abi(address, abi_file_path):
             abi_response_json = json.loads(abi_response.text)
             if abi_response_json['status'] == '1':
                 abi = json.loads(abi_response_json['result'])
-                with open(abi_file_path, 'w') as abi_file:
-                    json.dump(abi, abi_file)
-                return abi
             else:
                 abi = get_mock_abi()
-                with open(abi_file_path, 'w') as abi_file:
-                    json.dump(abi, abi_file)
-                return abi
+            with open(abi_file_path, 'w') as abi_file:
+                json.dump(abi, abi_file)
+            abi_cache[abi_file_path] = abi
+            if token_abi_files is not None:
+                token_abi_files[address.lower()] = abi_file_path
+            return abi
         logger.error(f"Failed to fetch ABI: {abi_response.text}")
     except requests.exceptions.RequestException as e:
         logger.error(f"Request to fetch ABI failed: {e}")
     return get_mock_abi()
 
 # Function to get the contract of a token
-def get_contract(address, filename=''):
-    mock_abi = get_mock_abi()
-    if filename:
-        abi_file_path = os.path.join(os.path.dirname(__file__), abi_data_folder, f'{filename}.json')
-    else:
-        abi_file_path = os.path.join(os.path.dirname(__file__), abi_data_folder, f'{get_token_symbol(address)}_{address}.json')
-    
-    try:
-        if os.path.exists(abi_file_path):
-            with open(abi_file_path, 'r') as abi_file:
-                abi = json.load(abi_file)
+def get_contract(address, filename='', validate=False):
+    # Contracts are built once per process, token ABIs are only probed on the network when a caller is about to transact
+    checksum_address = Web3.to_checksum_address(address)
+    key = (checksum_address, filename)
+    contract = contract_cache.get(key)
+    if contract is None:
+        mock_abi = get_mock_abi()
+        if filename:
+            abi = load_abi(os.path.join(os.path.dirname(__file__), abi_data_folder, f'{filename}.json'))
         else:
-            abi = mock_abi
-        
-        contract = web3.eth.contract(address=Web3.to_checksum_address(address), abi=abi if abi else mock_abi)
-        if not filename:
+            abi_file_path = get_token_abi_path(checksum_address)
+            abi = load_abi(abi_file_path) if abi_file_path else None
+            if abi and not any(item.get('name') == 'balanceOf' for item in abi if isinstance(item, dict)):
+                abi = None  # Proxy or partial ABIs cannot serve as a token contract
+        contract = contract_cache[key] = web3.eth.contract(address=checksum_address, abi=abi or mock_abi)
+    if validate and not filename and key not in validated_contracts:
+        try:
             contract.functions.balanceOf(wallet_address).call()  # Test the ABI by calling a function
-    except Exception as e:
-        contract = web3.eth.contract(address=Web3.to_checksum_address(address), abi=mock_abi)
-    
+        except Exception as e:
+            contract = contract_cache[key] = web3.eth.contract(address=checksum_address, abi=get_mock_abi())
+        validated_contracts.add(key)
     return contract
 
 # Function to approve token
@@ -443,34 +522,36 @@ def approve_token(token_contract,
                   amount,
                   wallet_address,
                   private_key,
-                  slippage=0.5):
+                  slippage=0.5,
+                  current_allowance=None,
+                  wait=True):
   if token_contract is None:
     logger.error("Token contract is not available. Cannot proceed with approval.")
     return False
-  # Check current allowance
-  current_allowance = token_contract.functions.allowance(
-      wallet_address, spender_address).call()
+  # Check current allowance, unless the trade preflight already read it
+  if current_allowance is None:
+    current_allowance = token_contract.functions.allowance(
+        wallet_address, spender_address).call()
   if current_allowance >= amount:
     logger.info("Token already approved for the required amount or higher.")
     return True
-  nonce = web3.eth.get_transaction_count(wallet_address, 'pending')
-  txn = token_contract.functions.approve(router_address,
+  txn = token_contract.functions.approve(spender_address,
                                          amount).build_transaction({
                                              'from': wallet_address,
-                                             'nonce': nonce,
                                          })
-  signed_txn = web3.eth.account.sign_transaction(txn, private_key=private_key)
   try:
-    txn_hash = web3.eth.send_raw_transaction(signed_txn.rawTransaction)
+    txn_hash = get_nonce_manager(web3, wallet_address).send(txn, private_key)
     logger.info("Token Approval success!")
-    receipt = web3.eth.wait_for_transaction_receipt(txn_hash, timeout=120)  # Reduced timeout for faster confirmation
+    if not wait:
+        return txn_hash  # The caller queues its next transaction behind the approval and checks the receipt later
+    receipt = get_receipt_tracker(web3).wait_for_receipt(txn_hash, timeout=120)  # Reduced timeout for faster confirmation
     if receipt.status == 1:
         logger.info(f"Transaction approved. Transaction hash: {web3.to_hex(txn_hash)}")
         return True
     else:
         logger.error("Transaction failed with status code: " + str(receipt.status))
         # Retry the transaction in case of failure
-        return approve_token(token_contract, spender_address, amount, wallet_address, private_key, slippage)
+        return approve_token(token_contract, spender_address, amount, wallet_address, private_key, slippage, wait=wait)
   except Exception as e:
     logger.error(f"Error occurred during token approval: {e}.")
     return False
@@ -523,7 +604,7 @@ def bnb_to_usdt(bnb_amount):
 
 
 def fetch_token_balance(token_address, wallet_address):
-    return get_contract(token_address).functions.balanceOf(wallet_address).call()
+    return get_contract(token_address, validate=True).functions.balanceOf(wallet_address).call()
 
 
 def token_price_in_usd(token_address):
@@ -561,18 +642,13 @@ def token_price_in_usd(token_address):
             logger.error(f"Failed to get price from API for {token_address}. Error: {api_error}")
     return 0
 
-        # Use asyncio to fetch balances and prices concurrently to speed up the process
-async def fetch_balances_and_prices(token_address, wallet_address):
-    loop = asyncio.get_event_loop()
-    tasks = [
-        loop.run_in_executor(None, fetch_token_balance, real_usdt_address, wallet_address),
-        loop.run_in_executor(None, fetch_token_balance, token_address, wallet_address),
-        loop.run_in_executor(None, get_bnb_price),
-        loop.run_in_executor(None, fetch_token_balance, real_bnb_address, wallet_address)
-    ]
-    usdt_balance_before_swap, token_balance_before_swap, bnb_price, bnb_balance = await asyncio.gather(*tasks)
-    bnb_balance = web3.from_wei(bnb_balance, 'ether') if bnb_balance else web3.from_wei(web3.eth.get_balance(wallet_address), 'ether')
-    return usdt_balance_before_swap, token_balance_before_swap, bnb_price, bnb_balance
+def fetch_preflight(token_address, wallet_address):
+    # Balances, allowances, BNB price, nonce and gas price of one trade in a single round trip
+    multicall = get_contract(os.getenv("MULTICALL_ADDRESS"), filename='multicall_router_abi')
+    preflight = fetch_trade_preflight(web3, get_multicall_executor(multicall), wallet_address, token_address, router_address)
+    if preflight.bnb_price is None:
+        preflight = preflight._replace(bnb_price=get_bnb_price())  # WBNB/USDT reserves unavailable, fall back to the price APIs
+    return preflight
 
 async def trade_token(token_address, wallet_settings, usdt_amount, is_buy=True, slippage=0.5, expected_price=0, router_contract=None):
     wallet_address = wallet_settings['wallet_address']
@@ -582,96 +658,130 @@ async def trade_token(token_address, wallet_settings, usdt_amount, is_buy=True,
     recent_price = expected_price
     
     response = {"status": False, "message": "Failed to execute trade"}
-    try:
-        logger.debug(f"Starting trade process for {token_address} with is_buy={is_buy}")
-        usdt_balance_before_swap, token_balance_before_swap, bnb_price, bnb_balance = await fetch_balances_and_prices(token_address, wallet_address)
-        if not router_contract:
-            router_address, router_contract, router_filename = determine_best_router(token_address, token_balance_before_swap, is_buy)
-            logger.debug(f"Best router for {token_address} is {router_filename.replace('_abi', '')}")
-            load_router_contract(filename=router_filename)
-            logger.debug("Loaded router contract")
+    # Reads on the trade path are hedged across nodes and the swap is broadcast to several, when RPC_HEDGE_ENABLED is set
+    with hedged_calls():
+        try:
+            logger.debug(f"Starting trade process for {token_address} with is_buy={is_buy}")
+            # asyncio.to_thread carries the caller's context, so the preflight keeps the trade's hedging policy
+            preflight = await asyncio.to_thread(fetch_preflight, token_address, wallet_address)
+            usdt_balance_before_swap, token_balance_before_swap, bnb_price = preflight.usdt_balance, preflight.token_balance, preflight.bnb_price
+            bnb_balance = web3.from_wei(preflight.wbnb_balance or preflight.bnb_balance, 'ether')
+            nonce_manager = get_nonce_manager(web3, wallet_address)
+            nonce_manager.seed(preflight.nonce)
+            # The selected router is passed on to the approval, the swap and the receipt decoding of this trade only
+            if not router_contract:
+                router_address, router_contract, router_filename = determine_best_router(token_address, token_balance_before_swap, is_buy)
+                if router_contract is None:
+                    response["message"] = "No router could quote the token."
+                    return response
+                logger.debug(f"Best router for {token_address} is {router_filename.replace('_abi', '')}")
+            else:
+                router_address = router_contract.address
         
-        usdt_balance = web3.from_wei(usdt_balance_before_swap, 'ether')
-        logger.debug(f"BNB price fetched: {bnb_price}")
-        bnb_amount = round(usdt_amount / bnb_price, 5)
-        logger.debug(f"BNB amount calculated: {bnb_amount}")
+            usdt_balance = web3.from_wei(usdt_balance_before_swap, 'ether')
+            logger.debug(f"BNB price fetched: {bnb_price}")
+            bnb_amount = round(usdt_amount / bnb_price, 5)
+            logger.debug(f"BNB amount calculated: {bnb_amount}")
         
-        if usdt_balance < usdt_amount and bnb_balance < bnb_amount:
-            send_tele_message("Insufficient balance for swap. Exiting swap process.")
-            logger.debug("Insufficient balance for swap")
-            return response
+            if usdt_balance < usdt_amount and bnb_balance < bnb_amount:
+                get_notifier().send("Insufficient balance for swap. Exiting swap process.", parse_mode=None)
+                logger.debug("Insufficient balance for swap")
+                return response
         
-        path_options = generate_path_options(is_buy, bnb_balance, bnb_amount, token_address, usdt_balance_before_swap, usdt_amount)
-        logger.debug(f"Path options generated: {path_options}")
+            path_options = generate_path_options(is_buy, bnb_balance, bnb_amount, token_address, usdt_balance_before_swap, usdt_amount)
+            logger.debug(f"Path options generated: {path_options}")
         
-        if not is_buy and token_balance_before_swap <= 0:
-            response["message"] = "Token Not Available"
-            logger.debug("Token not available for selling")
-            return response
+            if not is_buy and token_balance_before_swap <= 0:
+                response["message"] = "Token Not Available"
+                logger.debug("Token not available for selling")
+                return response
         
-        best_path, best_amount_out_min = find_best_path(router_contract, path_options, bnb_amount, token_balance_before_swap, is_buy, usdt_amount)
-        logger.debug(f"Best path found: {best_path} with amount out min: {web3.from_wei(best_amount_out_min, 'ether')}")
-
-        # Correcting the formula to calculate the price per token in USD
-        if is_buy:
-            recent_price = float(usdt_amount) / float(web3.from_wei(best_amount_out_min, 'ether'))
-        else:
-            recent_price = float(web3.from_wei(best_amount_out_min, 'ether')) / float(token_balance_before_swap)
+            best_path, best_amount_out_min = find_best_path(router_contract, path_options, bnb_amount, token_balance_before_swap, is_buy, usdt_amount)
+            logger.debug(f"Best path found: {best_path} with amount out min: {web3.from_wei(best_amount_out_min, 'ether')}")
 
-        logger.debug(f"Real Price: {recent_price} USD\n Expected Price: {expected_price} USD\n Price Tolerance: {price_tolerance}")
-        if strict_mode and expected_price > 0:
-            if is_buy and recent_price > expected_price * (1 + price_tolerance):
-                response["message"] = "Price exceeds expected buy price with tolerance."
-                logger.debug(response["message"])
-                return response
-            elif not is_buy and recent_price < expected_price * (1 - price_tolerance):
-                response["message"] = "Price below expected sell price with tolerance."
-                logger.debug(response["message"])
-                return response
+            # Correcting the formula to calculate the price per token in USD
+            if is_buy:
+                recent_price = float(usdt_amount) / float(web3.from_wei(best_amount_out_min, 'ether'))
+            else:
+                recent_price = float(web3.from_wei(best_amount_out_min, 'ether')) / float(token_balance_before_swap)
+
+            logger.debug(f"Real Price: {recent_price} USD\n Expected Price: {expected_price} USD\n Price Tolerance: {price_tolerance}")
+            if strict_mode and expected_price > 0:
+                if is_buy and recent_price > expected_price * (1 + price_tolerance):
+                    response["message"] = "Price exceeds expected buy price with tolerance."
+                    logger.debug(response["message"])
+                    return response
+                elif not is_buy and recent_price < expected_price * (1 - price_tolerance):
+                    response["message"] = "Price below expected sell price with tolerance."
+                    logger.debug(response["message"])
+                    return response
         
-        if best_path is None:
-            response["message"] = "No optimal path found."
-            logger.debug("No optimal path found")
-            return response
+            if best_path is None:
+                response["message"] = "No optimal path found."
+                logger.debug("No optimal path found")
+                return response
         
-        if slippage < 1:
-            slippage_percentage = slippage / 100
-        elif 1 <= slippage <= 100:
-            slippage_percentage = slippage
-        else:
-            slippage_percentage = 0  # Default to 0 if slippage is out of expected range
-        min_amount_out = int(best_amount_out_min * (1 - slippage_percentage / 100))
-        approval_amount = calculate_approval_amount(is_buy, bnb_amount, token_balance_before_swap, slippage, usdt_amount)
-        deadline = int(time.time()) + 10000
+            if slippage < 1:
+                slippage_percentage = slippage / 100
+            elif 1 <= slippage <= 100:
+                slippage_percentage = slippage
+            else:
+                slippage_percentage = 0  # Default to 0 if slippage is out of expected range
+            min_amount_out = int(best_amount_out_min * (1 - slippage_percentage / 100))
+            approval_amount = calculate_approval_amount(is_buy, bnb_amount, token_balance_before_swap, slippage, usdt_amount)
+            deadline = int(time.time()) + 10000
         
-        approve_contract_address = determine_approve_contract_address(is_buy, bnb_balance, bnb_amount, token_address, usdt_amount)
-        logger.debug(f"Approving contract address: {approve_contract_address} for spending")
-        approve_token_success = approve_token(get_contract(approve_contract_address), router_address,
-                           approval_amount, wallet_address, private_key,
-                           slippage)
-        if not approve_token_success:
-            logger.error("Failed to approve token for spending. Exiting swap process.")
-            response["message"] = "Failed to approve token for spending."
-            return response
-
-        swap_txn = build_swap_transaction(router_contract, is_buy, bnb_balance > bnb_amount, bnb_amount if is_buy else float(float(web3.from_wei(best_amount_out_min, 'ether'))/bnb_price), usdt_amount, token_balance_before_swap, min_amount_out, best_path, wallet_address, deadline, private_key)
-        logger.debug(f"Swap transaction built: {swap_txn}")
-        swap_tx_hash = web3.eth.send_raw_transaction(swap_txn['rawTransaction'])
-        logger.debug(f"Swap transaction sent: {swap_tx_hash}")
-        txn_receipt = web3.eth.wait_for_transaction_receipt(swap_tx_hash)
+            approve_contract_address = determine_approve_contract_address(is_buy, bnb_balance, bnb_amount, token_address, usdt_amount)
+            logger.debug(f"Approving contract address: {approve_contract_address} for spending")
+            # The preflight read allowances for the default router only
+            current_allowance = preflight.allowance(approve_contract_address) if Web3.to_checksum_address(router_address) == preflight.spender_address else None
+            approve_token_success = approve_token(get_contract(approve_contract_address, validate=True), router_address,
+                               approval_amount, wallet_address, private_key,
+                               slippage, current_allowance, wait=False)
+            if not approve_token_success:
+                logger.error("Failed to approve token for spending. Exiting swap process.")
+                response["message"] = "Failed to approve token for spending."
+                return response
+
+            # A fresh approval is not waited for, the swap takes the next nonce and lands right behind it
+            approval_tx_hash = None if approve_token_success is True else approve_token_success
+            if approval_tx_hash is not None and not is_buy:
+                # The sell swap's gas is estimated on its own against the latest state, where it reverts until the approval is mined
+                approval_receipt = await get_receipt_tracker(web3).wait_for_receipt_async(approval_tx_hash, 120)
+                if approval_receipt.status != 1:
+                    logger.error(f"Approval transaction {web3.to_hex(approval_tx_hash)} failed with status code: {approval_receipt.status}")
+                    response["message"] = "Failed to approve token for spending."
+                    return response
+                approval_tx_hash = None
+            nonce = nonce_manager.reserve()
+            # In a thread, building may wait for the pending approval to be mined
+            swap_txn = await asyncio.to_thread(build_swap_transaction, router_contract, is_buy, bnb_balance > bnb_amount, bnb_amount if is_buy else float(float(web3.from_wei(best_amount_out_min, 'ether'))/bnb_price), usdt_amount, token_balance_before_swap, min_amount_out, best_path, wallet_address, deadline, private_key, preflight.gas_price, nonce, approval_tx_hash)
+            if swap_txn is None:
+                nonce_manager.release(nonce)
+                raise Exception("Failed to build the swap transaction")
+            logger.debug(f"Swap transaction built: {swap_txn}")
+            # Sells sign the swap with a later nonce of their own, see execute_multicall_transaction
+            swap_tx_hash = nonce_manager.send_signed(swap_txn, nonce if is_buy else None)
+            logger.debug(f"Swap transaction sent: {swap_tx_hash}")
+            # The receipt tracker polls every pending hash together, the other trades of the round keep going meanwhile
+            txn_receipt = await get_receipt_tracker(web3).wait_for_receipt_async(swap_tx_hash)
+            if approval_tx_hash is not None:
+                approval_receipt = await get_receipt_tracker(web3).wait_for_receipt_async(approval_tx_hash, 120)
+                if approval_receipt.status != 1:
+                    logger.error(f"Approval transaction {web3.to_hex(approval_tx_hash)} failed with status code: {approval_receipt.status}")
         
-        logger.debug(f"Transaction receipt: {txn_receipt}")
-        if txn_receipt.status == 1:
-            swap_received = calculate_swap_received(is_buy, token_address, wallet_address, token_balance_before_swap, usdt_balance_before_swap, swap_tx_hash)
-            send_tele_message(build_success_message(swap_tx_hash, txn_receipt, swap_received, token_address, is_buy))
-            logger.debug(f"Trade executed successfully: {swap_received} received")
-            response = {"status": True, "message": "Trade executed successfully", "real_price": recent_price}
-        else:
-            response = handle_failed_transaction(swap_tx_hash, txn_receipt, token_address)
-            logger.debug("Trade execution failed")
-    except Exception as e:
-        response = handle_exception(e, token_address)
-        logger.error(f"Exception occurred during trade: {e}")
+            logger.debug(f"Transaction receipt: {txn_receipt}")
+            if txn_receipt.status == 1:
+                swap_received = calculate_swap_received(is_buy, token_address, wallet_address, token_balance_before_swap, usdt_balance_before_swap, swap_tx_hash, router_contract)
+                get_notifier().send(build_success_message(swap_tx_hash, txn_receipt, swap_received, token_address, is_buy))
+                logger.debug(f"Trade executed successfully: {swap_received} received")
+                response = {"status": True, "message": "Trade executed successfully", "real_price": recent_price}
+            else:
+                response = handle_failed_transaction(swap_tx_hash, txn_receipt, token_address)
+                logger.debug("Trade execution failed")
+        except Exception as e:
+            response = handle_exception(e, token_address)
+            logger.error(f"Exception occurred during trade: {e}")
     return response
 
 def adjust_balance(wallet_address, private_key, bnb_balance, usdt_balance):
@@ -680,7 +790,7 @@ def adjust_balance(wallet_address, private_key, bnb_balance, usdt_balance):
         try:
             # If BNB to WBNB conversion fails, attempt converting 75% of USDT to WBNB, accounting for transaction fees
             usdt_to_wbnb_amount_raw = web3.to_wei(float(usdt_balance) * 0.75, 'ether')  # 75% of USDT balance
-            usdt_contract = get_contract(real_usdt_address)
+            usdt_contract = get_contract(real_usdt_address, validate=True)
             gas_price = web3.eth.gas_price
             # Estimate gas for the approval transaction
             estimated_gas_for_approval = usdt_contract.functions.approve(router_address, usdt_to_wbnb_amount_raw).estimateGas({'from': wallet_address})
@@ -704,11 +814,9 @@ def adjust_balance(wallet_address, private_key, bnb_balance, usdt_balance):
                     'from': wallet_address,
                     'gas': total_estimated_gas,
                     'gasPrice': gas_price,
-                    'nonce': web3.eth.get_transaction_count(wallet_address),
                 })
-                signed_txn = web3.eth.account.sign_transaction(swap_txn, private_key=private_key)
-                txn_hash = web3.eth.send_raw_transaction(signed_txn.rawTransaction)
-                txn_receipt = web3.eth.wait_for_transaction_receipt(txn_hash)
+                txn_hash = get_nonce_manager(web3, wallet_address).send(swap_txn, private_key)
+                txn_receipt = get_receipt_tracker(web3).wait_for_receipt(txn_hash)
                 logger.debug(f"Converted {web3.from_wei(usdt_to_wbnb_amount, 'ether')} of USDT to WBNB after fees, transaction hash: {txn_hash.hex()}")
                 usdt_balance = web3.from_wei(fetch_token_balance(real_usdt_address, wallet_address), 'ether')
                 bnb_balance = web3.from_wei(fetch_token_balance(real_bnb_address, wallet_address), 'ether')
@@ -741,13 +849,21 @@ def generate_path_options(is_buy, bnb_balance, bnb_amount, token_address, usdt_b
 
 def find_best_path(router_contract, path_options, bnb_amount, token_balance_before_swap, is_buy, usdt_amount):
     simulated_results = []
+    # Paths with a hop the factory is known not to have would only revert
+    factory_address = get_pair_index().factory_of(router_contract)
+    if factory_address:
+        multicall = get_contract(os.getenv("MULTICALL_ADDRESS"), filename='multicall_router_abi')
+        get_pair_index().resolve(get_multicall_executor(multicall), factory_address, [hop for path in path_options for hop in zip(path, path[1:])])
+        path_options = [path for path in path_options if get_pair_index().path_exists(factory_address, path)]
     for path in path_options:
         try:
             # Determine the amount to simulate with based on the path's starting token
             simulate_amount = web3.to_wei(usdt_amount, 'ether') if path[0] == usdt_address else (web3.to_wei(bnb_amount, 'ether') if is_buy else token_balance_before_swap)
             token_symbol = 'USDT' if path[0] == usdt_address else 'BNB'
-            # Simulate the transaction to find the output amount
-            simulation_output = router_contract.functions.getAmountsOut(simulate_amount, path).call()[-1]
+            # Simulate the transaction to find the output amount, locally when fresh PancakeSwap reserves cover every hop
+            snapshot = get_latest_reserve_snapshot() if Web3.to_checksum_address(router_contract.address) == pancake_router_address else None
+            amounts_out = snapshot.get_amounts_out(simulate_amount, path) if snapshot else None
+            simulation_output = amounts_out[-1] if amounts_out else router_contract.functions.getAmountsOut(simulate_amount, path).call()[-1]
             simulated_results.append((path, simulation_output))
             logger.info(f"Simulation for path {path} with input amount {web3.from_wei(simulate_amount, 'ether')} {token_symbol} | Output = {web3.from_wei(simulation_output, 'ether')}")
         except Exception as e:
@@ -770,12 +886,12 @@ def determine_approve_contract_address(is_buy, bnb_balance, bnb_amount, token_ad
     return usdt_address if is_buy and bnb_balance == 0 else (bnb_address if is_buy else token_address)
 
 @logger.catch
-def build_swap_transaction(router_contract, is_buy, is_bnb, bnb_amount, usdt_amount, token_balance_before_swap, min_amount_out, best_path, wallet_address, deadline, private_key):
+def build_swap_transaction(router_contract, is_buy, is_bnb, bnb_amount, usdt_amount, token_balance_before_swap, min_amount_out, best_path, wallet_address, deadline, private_key, gas_price=None, nonce=None, pending_tx=None):
     try:
         swap_details = generate_swap_details(is_buy, is_bnb, bnb_amount, usdt_amount, token_balance_before_swap, min_amount_out, best_path, wallet_address, deadline)
         logger.info(swap_details)
 
-        gas_price = get_gas_price()
+        gas_price = gas_price or get_gas_price()
         validator_data = get_validator_data()
         bribe_percent, validator_address = validator_data['bribe_percent'], validator_data['validator_address']
 
@@ -785,7 +901,7 @@ def build_swap_transaction(router_contract, is_buy, is_bnb, bnb_amount, usdt_amo
             bribe_txn = create_bribe_transaction(validator_address, bribe_amount, gas_price)
             multicall_transactions.append(bribe_txn)
 
-        signed_transaction = execute_multicall_transaction(multicall_transactions, wallet_address, gas_price, private_key, is_buy)
+        signed_transaction = execute_multicall_transaction(multicall_transactions, wallet_address, gas_price, private_key, is_buy, nonce, pending_tx)
         return signed_transaction
     except Exception as e:
         logger.error(f"Error building swap transaction: {e}")
@@ -820,49 +936,27 @@ def prepare_token_sell_transaction(router_contract, token_balance_before_swap, m
 
 def build_token_swap_transaction(router_contract, usdt_amount, min_amount_out, best_path, wallet_address, deadline, gas_price, bribe_percent):
     adjusted_usdt_amount = web3.to_wei(usdt_amount, 'ether') - int(web3.to_wei(usdt_amount, 'ether') * bribe_percent)
-    gas_estimate = router_contract.functions.swapExactTokensForTokens(
+    # Only the calldata goes into the multicall, which is estimated as a whole
+    data = router_contract.functions.swapExactTokensForTokens(
         adjusted_usdt_amount, 
         min_amount_out, 
         best_path, 
         wallet_address, 
         deadline
-    ).estimate_gas({'from': wallet_address})
-    txn = router_contract.functions.swapExactTokensForTokens(
-        adjusted_usdt_amount, 
-        min_amount_out, 
-        best_path, 
-        wallet_address, 
-        deadline
-    ).build_transaction({
-        'from': wallet_address, 
-        'gas': gas_estimate,
-        'gasPrice': gas_price,
-        'nonce': web3.eth.get_transaction_count(wallet_address)
-    })
-    return adjusted_usdt_amount, {'to': router_contract.address, 'data': txn['data'], 'value': 0}
+    )._encode_transaction_data()
+    return adjusted_usdt_amount, {'to': router_contract.address, 'data': data, 'value': 0}
 
 def build_bnb_buy_transaction(router_contract, bnb_amount, min_amount_out, best_path, wallet_address, deadline, gas_price, bribe_percent):
     adjusted_bnb_amount = web3.to_wei(bnb_amount, 'ether') - int(web3.to_wei(bnb_amount, 'ether') * bribe_percent)
     swap_func = router_contract.functions.swapExactBNBForTokens if router_contract.address == os.getenv("BAKERY_ROUTER_ADDRESS") else router_contract.functions.swapExactETHForTokens
-    gas_estimate = swap_func(
-        min_amount_out, 
-        best_path, 
-        wallet_address, 
-        deadline
-    ).estimate_gas({'from': wallet_address, 'value': adjusted_bnb_amount})
-    txn = swap_func(
+    # Only the calldata goes into the multicall, which is estimated as a whole
+    data = swap_func(
         min_amount_out, 
         best_path, 
         wallet_address, 
         deadline
-    ).build_transaction({
-        'from': wallet_address,
-        'value': adjusted_bnb_amount,
-        'gas': gas_estimate,
-        'gasPrice': gas_price,
-        'nonce': web3.eth.get_transaction_count(wallet_address)
-    })
-    return adjusted_bnb_amount, {'to': router_contract.address, 'data': txn['data'], 'value': adjusted_bnb_amount}
+    )._encode_transaction_data()
+    return adjusted_bnb_amount, {'to': router_contract.address, 'data': data, 'value': adjusted_bnb_amount}
 
 def build_token_sell_transaction(router_contract, token_balance_before_swap, min_amount_out, best_path, wallet_address, deadline, gas_price, bribe_percent):
     adjusted_token_balance = token_balance_before_swap - int(token_balance_before_swap * bribe_percent)
@@ -883,8 +977,7 @@ def build_token_sell_transaction(router_contract, token_balance_before_swap, min
         'from': wallet_address, 
         'gas': gas_estimate,
         'gasPrice': gas_price,
-        'nonce': web3.eth.get_transaction_count(wallet_address)
-    })
+    })  # The nonce is set in execute_multicall_transaction, once the first transaction is mined
     return adjusted_token_balance, {'to': router_contract.address, 'data': txn, 'value': 0}
 
 def create_bribe_transaction(validator_address, bribe_amount, gas_price):
@@ -895,7 +988,7 @@ def create_bribe_transaction(validator_address, bribe_amount, gas_price):
         'gasPrice': gas_price
     }
 
-def execute_multicall_transaction(transactions, wallet_address, gas_price, private_key, is_buy):
+def execute_multicall_transaction(transactions, wallet_address, gas_price, private_key, is_buy, nonce=None, pending_tx=None):
     multicall = get_contract(os.getenv("MULTICALL_ADDRESS"), filename="multicall_router_abi")
     if not is_buy:
         swap_txn = transactions[0].get('data', None)
@@ -903,64 +996,82 @@ def execute_multicall_transaction(transactions, wallet_address, gas_price, priva
     calls = [{'target': txn['to'], 'allowFailure': False, 'value': txn['value'], 'callData': txn.get('data', b'')} for txn in transactions]
     total_value = sum([call['value'] for call in calls])
     
+    nonce_manager = get_nonce_manager(web3, wallet_address)
+    reserved = nonce is None
+    if reserved:
+        nonce = nonce_manager.reserve()
     try:
-        results = build_multicall_transaction(multicall, calls, wallet_address, total_value, gas_price)
-        gas_estimate = estimate_gas(wallet_address, multicall.address, results['data'], results['value'])
+        results = build_multicall_transaction(multicall, calls, wallet_address, total_value, gas_price, nonce)
+        gas_estimate = estimate_gas(wallet_address, multicall.address, results['data'], results['value'], pending_tx)
         signed_transaction = sign_transaction(results, wallet_address, gas_estimate, private_key)
         
         if not is_buy:
-            txn_hash = web3.eth.send_raw_transaction(signed_transaction.rawTransaction)
-            web3.eth.wait_for_transaction_receipt(txn_hash)
-            swap_txn.update({'nonce': web3.eth.get_transaction_count(wallet_address, block_identifier='latest')})
+            nonce_manager.send_signed(signed_transaction, nonce)
+            # The sell is signed with the next nonce and goes out right behind, no need to wait for this receipt
+            swap_txn.update({'nonce': nonce_manager.reserve()})
             signed_swap_txn = web3.eth.account.sign_transaction(swap_txn, private_key)
             signed_transaction = signed_swap_txn
         
         return signed_transaction
     except Exception as e:
         logger.error(f"Multicall3 aggregation failed: {e}")
+        if reserved:
+            nonce_manager.release(nonce)
         raise
 
-def build_multicall_transaction(multicall, calls, wallet_address, total_value, gas_price):
-    return multicall.functions.aggregate3Value([(call['target'], call['allowFailure'], call['value'], call['callData']) for call in calls]).build_transaction({
+def build_multicall_transaction(multicall, calls, wallet_address, total_value, gas_price, nonce):
+    # Gas is left to estimate_gas, which can simulate on top of a pending approval
+    return {
         'from': wallet_address,
+        'to': multicall.address,
         'value': total_value,
         'gasPrice': gas_price,
-        'nonce': web3.eth.get_transaction_count(wallet_address)
-    })
+        'nonce': nonce,
+        'chainId': web3.eth.chain_id,
+        'data': multicall.functions.aggregate3Value([(call['target'], call['allowFailure'], call['value'], call['callData']) for call in calls])._encode_transaction_data(),
+    }
 
-def estimate_gas(wallet_address, to_address, data, value):
+def estimate_gas(wallet_address, to_address, data, value, pending_tx=None):
+    transaction = {
+        'from': wallet_address, 
+        'to': to_address, 
+        'data': data, 
+        'value': value
+    }
     try:
-        gas_estimate = web3.eth.estimate_gas({
-            'from': wallet_address, 
-            'to': to_address, 
-            'data': data, 
-            'value': value
-        }) * 1.2  # Increase gas estimate by 20% as a buffer
+        if pending_tx is not None:
+            # Simulate on top of the transaction still in flight, nodes without it in their pending state make this fail
+            try:
+                return int(web3.eth.estimate_gas(transaction, 'pending') * 1.2)
+            except Exception as e:
+                logger.debug(f"Pending state estimate failed ({e}), waiting for {web3.to_hex(pending_tx)} to be mined")
+                get_receipt_tracker(web3).wait_for_receipt(pending_tx, timeout=120)
+        gas_estimate = web3.eth.estimate_gas(transaction) * 1.2  # Increase gas estimate by 20% as a buffer
         return int(gas_estimate)
     except Exception as e:
         logger.error(f"Failed to estimate gas: {e}")
         raise
 
 def sign_transaction(transaction, wallet_address, gas_estimate, private_key):
+    # build_multicall_transaction already set the nonce
     return web3.eth.account.sign_transaction({
         **transaction, 
-        'nonce': web3.eth.get_transaction_count(wallet_address), 
         'gas': gas_estimate
     }, private_key=private_key)
 
-def calculate_swap_received(is_buy, token_address, wallet_address, token_balance_before_swap, usdt_balance_before_swap, swap_tx_hash):
+def calculate_swap_received(is_buy, token_address, wallet_address, token_balance_before_swap, usdt_balance_before_swap, swap_tx_hash, router_contract):
     contract_address = token_address if is_buy else usdt_address
-    contract = get_contract(contract_address)
+    contract = get_contract(contract_address, validate=True)
     current_balance = contract.functions.balanceOf(wallet_address).call()
     previous_balance = token_balance_before_swap if is_buy else usdt_balance_before_swap
     swap_received = current_balance - previous_balance
     if swap_received <= 0:  # If swap_received is 0 or negative, calculate from swap_tx_hash
-        swap_received = calculate_from_swap_tx_hash(swap_tx_hash, is_buy, wallet_address)
+        swap_received = calculate_from_swap_tx_hash(swap_tx_hash, is_buy, wallet_address, router_contract)
     # Log the precise swap received amount for better transparency
     logger.debug(f"Swap transaction hash: {swap_tx_hash}, Precise swap received: {web3.from_wei(swap_received, 'ether')}")
     return swap_received
 
-def calculate_from_swap_tx_hash(swap_tx_hash, is_buy, wallet_address):
+def calculate_from_swap_tx_hash(swap_tx_hash, is_buy, wallet_address, router_contract):
     try:
         # Fetch the transaction receipt using the transaction hash
         txn_receipt = web3.eth.get_transaction_receipt(swap_tx_hash)
@@ -1014,7 +1125,7 @@ def handle_exception(e, token_address):
         tx = e.args[0]['transaction']
         receipt = web3.eth.get_transaction_receipt(tx)
         revert_reason = web3.to_text(receipt['logs'][0]['data'])
-        send_tele_message(f"Transaction reverted. Raw Error: {e}\nRevert Reason: {revert_reason}")
+        get_notifier().send(f"Transaction reverted. Raw Error: {e}\nRevert Reason: {revert_reason}", parse_mode=None)
     else:
         logger.error(f"Execution reverted, Check Log File : {e}")
     return {"status": False, "message": str(e)}
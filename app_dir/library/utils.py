@@ -7,6 +7,7 @@ from web3.middleware import geth_poa_middleware
 import os, sys
 import json
 from dotenv import load_dotenv
+from library.rpc_pool import create_rpc_pool
 
 load_dotenv()
 
@@ -23,6 +24,9 @@ logger.configure(**config)
 
 debug_mode = os.getenv('DEBUG_MODE') == 'True'
 
+# Shared connection for long-lived processes (see get_web3)
+web3_instance = None
+
 def initialize_web3():
     provider_url = os.getenv('WEB3_PROVIDER')
     
@@ -31,6 +35,19 @@ def initialize_web3():
     with open(json_path, 'r') as f:
         fallback_data = json.load(f)
     fallback_urls = fallback_data['bsc_fallback_urls']
+
+    if os.getenv('RPC_POOL_ENABLED', 'True') == 'True':
+        # One provider over every configured node, each call goes to the healthiest one
+        try:
+            pool = create_rpc_pool([provider_url] + fallback_urls)
+            web3 = Web3(pool)
+            web3.middleware_onion.inject(geth_poa_middleware, layer=0)
+            web3.eth.get_block('latest')
+            pool.start_probing()
+            logger.info(f"Connected to RPC pool of {len(pool.nodes)} nodes")
+            return web3
+        except Exception as e:
+            logger.error(f"Failed to connect through the RPC pool, trying nodes one by one: {e}")
     
     def try_connect(url):
         if url.startswith("http"):
@@ -67,6 +84,13 @@ def initialize_web3():
 
     raise ConnectionError("Failed to connect to all providers")
 
+def get_web3():
+    # Connect once per process, later callers reuse the same provider instead of probing again
+    global web3_instance
+    if web3_instance is None:
+        web3_instance = initialize_web3()
+    return web3_instance
+
 def get_balance(web3, address, token_address=None):
     if token_address:
         contract = web3.eth.contract(address=web3.to_checksum_address(token_address), abi=[
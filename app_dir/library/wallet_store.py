@@ -0,0 +1,162 @@
+import os
+import ast
+import sys
+import json
+import time
+import sqlite3
+import threading
+from contextlib import closing
+from dotenv import load_dotenv
+from loguru import logger
+
+# Load environment variables
+load_dotenv()
+
+wallet_store_db_path = os.getenv('WALLET_STORE_DB_PATH', '../configs/wallet_store.db')
+
+# Trading state the trader writes back every round, kept in columns of their own so settings edits never touch them
+STATE_KEYS = ('AVAILABLE_BALANCE', 'USED_BALANCE', 'CURRENT_BALANCE', 'current_holdings')
+
+wallet_stores = {}
+
+
+def to_holdings(value):
+    # Holdings edited as text may arrive as JSON or as the Python repr the config window shows
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return ast.literal_eval(value)
+    return value or {}
+
+
+def to_balance(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class WalletStore:
+    # One row per wallet in SQLite (WAL), so the GUI and the trader update single wallets concurrently without rewriting the others
+    def __init__(self, db_path=wallet_store_db_path, json_path=None):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')  # Readers never block the writer and the other way around
+            conn.execute('''CREATE TABLE IF NOT EXISTS wallets
+                            (name TEXT PRIMARY KEY, settings TEXT NOT NULL, available_balance REAL, used_balance REAL, current_balance REAL,
+                             current_holdings TEXT NOT NULL, updated_at REAL)''')
+            empty = conn.execute('SELECT COUNT(*) FROM wallets').fetchone()[0] == 0
+        if empty and json_path and os.path.exists(json_path):
+            logger.info(f"Wallet store imported {self.import_json(json_path)} wallets from {json_path}")
+
+    def _connect(self):
+        # Autocommit connection, callers close it with contextlib.closing once done
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA busy_timeout=30000')
+        return conn
+
+    def _row_to_settings(self, row):
+        name, settings, available_balance, used_balance, current_balance, current_holdings = row
+        settings = json.loads(settings)
+        settings.update({'AVAILABLE_BALANCE': available_balance, 'USED_BALANCE': used_balance, 'CURRENT_BALANCE': current_balance,
+                         'current_holdings': json.loads(current_holdings)})
+        return name, settings
+
+    def _state_values(self, wallet_settings):
+        return (to_balance(wallet_settings.get('AVAILABLE_BALANCE')), to_balance(wallet_settings.get('USED_BALANCE')),
+                to_balance(wallet_settings.get('CURRENT_BALANCE')), json.dumps(to_holdings(wallet_settings.get('current_holdings'))))
+
+    def load_all(self):
+        # {wallet name: settings with its state}, in the order wallets were added
+        with closing(self._connect()) as conn:
+            rows = conn.execute('SELECT name, settings, available_balance, used_balance, current_balance, current_holdings FROM wallets ORDER BY rowid').fetchall()
+        return dict(self._row_to_settings(row) for row in rows)
+
+    def get(self, name):
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT name, settings, available_balance, used_balance, current_balance, current_holdings FROM wallets WHERE name = ?', (name,)).fetchone()
+        return self._row_to_settings(row)[1] if row else None
+
+    def save_state(self, name, wallet_settings):
+        # Balances and holdings of one wallet in a single statement, its settings stay as the GUI left them
+        with self.lock, closing(self._connect()) as conn:
+            cursor = conn.execute('UPDATE wallets SET available_balance = ?, used_balance = ?, current_balance = ?, current_holdings = ?, updated_at = ? WHERE name = ?',
+                                  (*self._state_values(wallet_settings), time.time(), name))
+        return cursor.rowcount == 1
+
+    def update_settings(self, name, changes):
+        # Read-modify-write of one wallet inside an immediate transaction, concurrent writers queue instead of losing updates
+        with self.lock, closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT name, settings, available_balance, used_balance, current_balance, current_holdings FROM wallets WHERE name = ?', (name,)).fetchone()
+                if row is None:
+                    conn.execute('ROLLBACK')
+                    return None
+                wallet_settings = self._row_to_settings(row)[1]
+                wallet_settings.update(changes)
+                written = (name, json.dumps({key: value for key, value in wallet_settings.items() if key not in STATE_KEYS}), *self._state_values(wallet_settings))
+                conn.execute('UPDATE wallets SET settings = ?, available_balance = ?, used_balance = ?, current_balance = ?, current_holdings = ?, updated_at = ? WHERE name = ?',
+                             (*written[1:], time.time(), name))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        # The row as this transaction wrote it, another writer may already have moved on
+        return self._row_to_settings(written)[1]
+
+    def add_wallet(self, name, wallet_settings):
+        settings = {key: value for key, value in wallet_settings.items() if key not in STATE_KEYS}
+        try:
+            with self.lock, closing(self._connect()) as conn:
+                conn.execute('INSERT INTO wallets (name, settings, available_balance, used_balance, current_balance, current_holdings, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                             (name, json.dumps(settings), *self._state_values(wallet_settings), time.time()))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def delete_wallet(self, name):
+        with self.lock, closing(self._connect()) as conn:
+            return conn.execute('DELETE FROM wallets WHERE name = ?', (name,)).rowcount == 1
+
+    def import_json(self, json_path):
+        # Wallets from a WALLET_SETTINGS style file, replacing the stored wallets of the same name
+        with open(json_path, 'r') as file:
+            wallets = json.load(file)
+        for name, wallet_settings in wallets.items():
+            if not self.add_wallet(name, wallet_settings):
+                self.update_settings(name, wallet_settings)
+        return len(wallets)
+
+    def export_json(self, json_path):
+        # All wallets in the WALLET_SETTINGS layout, written to a temporary file and swapped in
+        wallets = self.load_all()
+        temporary_path = f"{json_path}.tmp"
+        with open(temporary_path, 'w') as file:
+            json.dump(wallets, file, indent=4)
+        os.replace(temporary_path, json_path)
+        return len(wallets)
+
+
+def get_wallet_store(db_path=None, json_path=None):
+    # The first open of an empty store imports WALLET_SETTINGS
+    db_path = db_path or wallet_store_db_path
+    store = wallet_stores.get(db_path)
+    if store is None:
+        store = wallet_stores[db_path] = WalletStore(db_path, json_path or os.getenv('WALLET_SETTINGS', 'wallet_settings.json'))
+    return store
+
+
+if __name__ == "__main__":
+    # python -m library.wallet_store import|export <file.json>
+    if len(sys.argv) != 3 or sys.argv[1] not in ('import', 'export'):
+        print("Usage: python -m library.wallet_store import|export <file.json>")
+        sys.exit(1)
+    wallet_store = get_wallet_store()
+    count = wallet_store.import_json(sys.argv[2]) if sys.argv[1] == 'import' else wallet_store.export_json(sys.argv[2])
+    print(f"{sys.argv[1].capitalize()}ed {count} wallets")
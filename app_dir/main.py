@@ -4,23 +4,29 @@ import json
 from datetime import datetime
 from dotenv import load_dotenv
 from datetime import timedelta
-import subprocess
 import sched
 import signal
 import pandas as pd
 from prettytable import PrettyTable
-from library.utils import get_balance, initialize_web3, send_tele_message, core_performance_patcher
+from library.utils import get_balance, get_web3, core_performance_patcher
+from library.snapshot_store import get_snapshot_store
+from library.token_state_store import get_token_state_store
+from library.wallet_store import get_wallet_store
+from library.notifier import get_notifier
+from library.round_summary import read_day, summary_from_rows, transactions_count, total_pnl
 from decimal import Decimal
-import platform
 
 load_dotenv()
 cnt = 0
 last_run_day = "0"
 scheduler = sched.scheduler(time.time, time.sleep)
+# Fetcher and trader modules, imported once and kept warm across rounds
+round_modules = None
 
 def signal_handler(signum, frame):
     print("Program stopped due to CTRL+C")
     combine_and_clean_data()
+    get_notifier().drain()  # The dispatcher thread dies with the process, let the daily summary go out first
     exit(0)
 
 signal.signal(signal.SIGINT, signal_handler)
@@ -32,8 +38,8 @@ def combine_and_clean_data():
     today_date_str = datetime.now().strftime("%Y%m%d")
     yesterday_date_str = (datetime.now() - timedelta(days=1)).strftime("%Y%m%d")
     
-    # Extract unique dates from file names
-    unique_dates = {f.split('_')[3] for f in all_csv_files if f.startswith(date_pattern) and len(f.split('_')) > 2 and f.endswith('.csv') and 'combined' not in f}
+    # Extract unique dates from file names, both daily partitions (trade_actions_log_YYYYMMDD.csv) and older per-run files
+    unique_dates = {f[len(date_pattern):len(date_pattern) + 8] for f in all_csv_files if f.startswith(date_pattern) and f.endswith('.csv') and 'combined' not in f}
     for date_str in unique_dates:
         if not date_str.isdigit():
             print(f"Skipping non-numeric date string: {date_str}")
@@ -72,64 +78,32 @@ def combine_and_clean_data():
             
             # Send summary to Telegram if the date is yesterday
             if date_str == yesterday_date_str:
-                # Create a summary table with wallet differentiation
+                # Per wallet counts and PnL come from the day's running summary, rows are only aggregated for days logged without one
+                day_summary = read_day(csv_data_folder, date_str) or summary_from_rows(combined_df['Wallet'], combined_df['Action'], combined_df['Profits/Losses'], combined_df['Symbol'])
+                if not day_summary:
+                    print(f"No trade actions to summarize for {date_str}.")
+                    continue
                 summary_table = PrettyTable()
-                wallet_ids = [wallet_id for wallet_id in combined_df['Wallet'].unique() if pd.notna(wallet_id)]
-                if not wallet_ids:
-                    wallet_ids = ['All Wallets']  # Default to 'All Wallets' if no specific wallet is detected
-
+                wallet_ids = list(day_summary.keys())
                 summary_table.field_names = ["Metric"] + [f"{str(wallet_id).capitalize()}" for wallet_id in wallet_ids]
-                
-                # Count of transactions per wallet
-                transactions_count_per_wallet = [len(combined_df[combined_df['Wallet'] == wallet_id]) for wallet_id in wallet_ids] if wallet_ids != ['All Wallets'] else [len(combined_df)]
-                
-                # Calculate Total PNL per wallet excluding rows with '-' as Profits/Losses
-                total_pnl_per_wallet = []
-                for wallet_id in wallet_ids:
-                    if wallet_id == 'All Wallets':
-                        wallet_df = combined_df[combined_df['Profits/Losses'] != '-']
-                    else:
-                        wallet_df = combined_df[(combined_df['Wallet'] == wallet_id) & (combined_df['Profits/Losses'] != '-')]
-                    wallet_df['Profits/Losses'] = wallet_df['Profits/Losses'].replace('-', '0').astype(float)
-                    total_pnl = wallet_df['Profits/Losses'].sum()
-                    total_pnl_per_wallet.append(total_pnl)
-                
-                # Additional details for more insight per wallet
-                action_types = ['buy', 'sell', 'hold']
-                action_counts = {action: [] for action in action_types}
-                action_pnls = {action: [] for action in action_types}
-                
-                for wallet_id in wallet_ids:
-                    for action in action_types:
-                        if wallet_id == 'All Wallets':
-                            action_df = combined_df[(combined_df['Action'] == action) & (combined_df['Profits/Losses'] != '-')]
-                        else:
-                            action_df = combined_df[(combined_df['Wallet'] == wallet_id) & (combined_df['Action'] == action) & (combined_df['Profits/Losses'] != '-')]
-                        if action == 'hold':
-                            # Count only unique coin symbols for 'hold' action
-                            unique_coins_count = action_df['Symbol'].nunique()
-                            action_counts[action].append(unique_coins_count)
-                            # Sum PNL only for unique coin symbols in 'hold' action
-                            unique_coins_pnl = action_df.groupby('Symbol')['Profits/Losses'].sum().astype(float).sum()
-                            action_pnls[action].append(unique_coins_pnl)
-                        else:
-                            action_counts[action].append(len(action_df))
-                            action_pnls[action].append(action_df['Profits/Losses'].astype(float).sum())
 
+                action_types = ['buy', 'sell', 'hold']
                 for action in action_types:
-                    summary_table.add_row([f"{action.capitalize()} Count"] + action_counts[action])
-                summary_table.add_row(["Transactions Count"] + transactions_count_per_wallet)
+                    # Hold counts distinct coins, the others count the decisions that carried a profit or loss
+                    counts = [len(day_summary[wallet_id].get(action, {}).get('symbols', [])) if action == 'hold' else day_summary[wallet_id].get(action, {}).get('priced', 0) for wallet_id in wallet_ids]
+                    summary_table.add_row([f"{action.capitalize()} Count"] + counts)
+                summary_table.add_row(["Transactions Count"] + [transactions_count(day_summary[wallet_id]) for wallet_id in wallet_ids])
                 for action in action_types:
                     if action != 'buy':
-                        summary_table.add_row([f"{action.capitalize()} PNL"] + [f"{pnl:.2f} USD" for pnl in action_pnls[action]])
+                        summary_table.add_row([f"{action.capitalize()} PNL"] + [f"{day_summary[wallet_id].get(action, {}).get('pnl', 0.0):.2f} USD" for wallet_id in wallet_ids])
 
-                summary_table.add_row(["Total PNL"] + [f"{pnl:.2f} USD" for pnl in total_pnl_per_wallet])
+                summary_table.add_row(["Total PNL"] + [f"{total_pnl(day_summary[wallet_id]):.2f} USD" for wallet_id in wallet_ids])
                 
                 summary_table.align = "l"
                 pretty_date_str = datetime.strptime(date_str, '%Y%m%d').strftime('%B %d, %Y')
                 summary_message = f"📊 Detailed summary for **{pretty_date_str}** 📊:\n```{summary_table.get_string()}```"
                 print(summary_message)
-                send_tele_message(summary_message, is_async=True, parse_mode="Markdown")
+                get_notifier().send(summary_message, parse_mode="Markdown")
                 
         except ValueError as e:
             print(f"Error combining CSV files for {date_str}: {e}")
@@ -138,75 +112,84 @@ def initialize_token_state():
     token_state_path = os.getenv('TOKEN_STATE_FILE', 'configs/token_state.json')
     data_directory = os.getenv('DATA_DIRECTORY', 'newerdata')
     try:
-        # Find the most recent file in the data directory
-        files = [os.path.join(data_directory, f) for f in os.listdir(data_directory) if os.path.isfile(os.path.join(data_directory, f))]
-        if not files:
-            print(f"No files found in the directory: {data_directory}.")
+        # Read the most recent round from the snapshot store
+        most_recent_snapshot, recent_data = get_snapshot_store(data_directory).latest()
+        if most_recent_snapshot is None:
+            print(f"No snapshots found in the directory: {data_directory}.")
             return
-        most_recent_file = max(files, key=os.path.getctime)
-        print(f"Most recent file found: {most_recent_file}")
+        print(f"Most recent snapshot found: {most_recent_snapshot}")
         
-        # Read the most recent data
-        with open(most_recent_file, 'r') as src:
-            recent_data = json.load(src).get("0", {})
-        
-        # Check and update the token state file
-        if os.path.exists(token_state_path):
-            with open(token_state_path, 'r+') as dst:
-                existing_data = json.load(dst).get("0", {})
-                updated_data = {coin: recent_data.get(coin, existing_data.get(coin)) for coin in set(recent_data) | set(existing_data)}
-                
-                dst.seek(0)
-                json.dump({"0": updated_data}, dst, indent=4)
-                dst.truncate()
-                
-            print(f"Token state updated with recent data from: {most_recent_file}")
+        # Merge the snapshot into the shared base, wallet overlays only hold what each wallet changed on top of it
+        created = not os.path.exists(token_state_path)
+        get_token_state_store(token_state_path).update_base(recent_data)
+        if created:
+            print(f"Token state file created and initialized with data from: {most_recent_snapshot}")
         else:
-            with open(token_state_path, 'w') as dst:
-                json.dump({"0": recent_data}, dst, indent=4)
-            print(f"Token state file created and initialized with data from: {most_recent_file}")
+            print(f"Token state updated with recent data from: {most_recent_snapshot}")
     except Exception as e:
         print(f"Error initializing token state: {e}")
         
+def load_round_modules():
+    # Importing pays for pandas/web3/loguru, the provider probe, ABI and coin list loading exactly once
+    global round_modules
+    if round_modules is None:
+        import fetcher
+        import trader
+        round_modules = (fetcher, trader)
+    return round_modules
+
+def run_stage(stage_timings, stage_name, func, *args, **kwargs):
+    stage_start = time.time()
+    try:
+        return func(*args, **kwargs)
+    except Exception as e:
+        print(f"Error running {stage_name}: {e}")
+        return None
+    finally:
+        stage_timings.append((stage_name, time.time() - stage_start))
+
+def print_stage_timings(stage_timings, total_time):
+    table = PrettyTable()
+    table.field_names = ["Stage", "Seconds"]
+    for stage_name, elapsed in stage_timings:
+        table.add_row([stage_name, f"{elapsed:.2f}"])
+    table.add_row(["Total", f"{total_time:.2f}"])
+    table.align = "l"
+    print(f"Stage timings for iteration {cnt}:")
+    print(table)
+
 def run_tasks():
     global cnt
     cnt += 1
     print(f"Starting iteration number: {cnt}")
     start_time = time.time()
+    stage_timings = []
     
     # Check wallet balance and print it
-    check_wallet_balance()
+    run_stage(stage_timings, "Wallet balance", check_wallet_balance)
     
     # Run combine_and_clean_data only on the first iteration of each day
     current_day = datetime.now().strftime('%Y-%m-%d')
     global last_run_day
     if cnt == 1 or (last_run_day != current_day):
-        combine_and_clean_data()
+        run_stage(stage_timings, "Combine CSV", combine_and_clean_data)
         last_run_day = current_day
     
-    # Determine the correct Python command based on the OS
-    python_cmd = 'python' if platform.system() == 'Windows' else 'python3'
-    
-    try:
-        # Use subprocess to handle external script execution
-        subprocess.run([python_cmd, "fetcher.py"], check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error running fetcher.py: {e}")
-    
-    if cnt == 1:
-        try:
-            initialize_token_state()
-        except Exception as e:
-            print(f"Error initializing token state: {e}")
+    # Only the first iteration pays the import and connection cost
+    modules = run_stage(stage_timings, "Module warm-up" if cnt == 1 else "Module reuse", load_round_modules)
+    if modules is not None:
+        fetcher, trader = modules
+        snapshot = run_stage(stage_timings, "Fetch", fetcher.run_fetch_round, provider='birdeye')
+        
+        if cnt == 1:
+            run_stage(stage_timings, "Token state init", initialize_token_state)
 
-    try:
-        subprocess.run([python_cmd, "trader.py"], check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error running trader.py: {e}")
+        run_stage(stage_timings, "Trade", trader.run_trade_round, snapshot)
 
     end_time = time.time()
     elapsed_time = end_time - start_time
     print(f"Time spent on iteration {cnt}: {elapsed_time:.2f} seconds")
+    print_stage_timings(stage_timings, elapsed_time)
     # Schedule the next run regardless of errors
     scheduler.enter(60, 1, run_tasks)
 
@@ -229,42 +212,33 @@ def send_wallet_report(wallet_balances):
         print(f"Error sending report: {e}")
 
 def check_wallet_balance():
-    wallet_balance_path = os.getenv('WALLET_SETTINGS', 'wallet_settings.json')
     wallet_balances = {}
     try:
-        if not os.path.exists(wallet_balance_path):
-            # Try to find the file in app_dir/wallet_settings.json
-            app_dir_wallet_settings = os.path.join('app_dir', wallet_balance_path)
-            if os.path.exists(app_dir_wallet_settings):
-                wallet_balance_path = app_dir_wallet_settings
-            else:
-                raise FileNotFoundError(f"Wallet settings file not found in {wallet_balance_path} or {app_dir_wallet_settings}")
-
-        with open(wallet_balance_path, 'r') as file:
-            wallet_settings = json.load(file)
-            web3 = initialize_web3()
-            usdt_address = os.getenv('USDT_ADDRESS')
-            for wallet_name, wallet_info in wallet_settings.items():
-                wallet_address = wallet_info.get("wallet_address")
-                try:
-                    bnb_balance = get_balance(web3, wallet_address)
-                    usdt_balance = get_balance(web3, wallet_address, usdt_address)
-                    wallet_balances[wallet_name] = {
-                        "wallet_address": wallet_address,
-                        "key": wallet_info['private_key'],
-                        "bnb_balance": float(bnb_balance),
-                        "usdt_balance": float(usdt_balance)
-                    }
-                except Exception as e:
-                    print(f"Error fetching balance for wallet {wallet_name}: {e}")
+        # Wallets come from the wallet store, which imports WALLET_SETTINGS the first time it is opened
+        wallet_settings = get_wallet_store().load_all()
+        if not wallet_settings:
+            print("No wallets found in the wallet store or WALLET_SETTINGS.")
+        web3 = get_web3()
+        usdt_address = os.getenv('USDT_ADDRESS')
+        for wallet_name, wallet_info in wallet_settings.items():
+            wallet_address = wallet_info.get("wallet_address")
+            try:
+                bnb_balance = get_balance(web3, wallet_address)
+                usdt_balance = get_balance(web3, wallet_address, usdt_address)
+                wallet_balances[wallet_name] = {
+                    "wallet_address": wallet_address,
+                    "key": wallet_info['private_key'],
+                    "bnb_balance": float(bnb_balance),
+                    "usdt_balance": float(usdt_balance)
+                }
+            except Exception as e:
+                print(f"Error fetching balance for wallet {wallet_name}: {e}")
         
         if wallet_balances:
             send_wallet_report(wallet_balances)
     
-    except FileNotFoundError as e:
-        print(str(e))
     except json.JSONDecodeError:
-        print(f"Error decoding JSON from wallet settings file: {wallet_balance_path}")
+        print(f"Error decoding JSON from wallet settings file: {os.getenv('WALLET_SETTINGS', 'wallet_settings.json')}")
     except Exception as e:
         print(f"Unexpected error: {e}")
     
@@ -303,4 +277,5 @@ if __name__ == "__main__":
         schedule_tasks()
     except (KeyboardInterrupt, SystemExit):
         print("Scheduler stopped on program exit")
-        combine_and_clean_data()
\ No newline at end of file
+        combine_and_clean_data()
+        get_notifier().drain()
\ No newline at end of file
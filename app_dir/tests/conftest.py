@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The application imports its modules as library.x from app_dir, like main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
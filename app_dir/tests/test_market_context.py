@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from library.market_context import MarketContext
+from library.price_record import PriceRecord
+from library.snapshot_store import SnapshotStore
+
+
+@pytest.fixture
+def context(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    for round_number in range(4):
+        store.append(1000 + round_number, {'a': PriceRecord(1.0 + round_number, 1.0, 1.0, 1.0), 'b': PriceRecord(5.0, 1.0, 1.0, 1.0)})
+    snapshot_id, latest = store.latest()
+    return MarketContext(store, snapshot_id, {**latest, 'c': PriceRecord(9.0, 1.0, 1.0, 1.0)}, {'a': 'aaa'}, ['b'])
+
+
+def test_comparison_rounds_are_read_once_per_timeframe(context, monkeypatch):
+    reads = []
+    read = context.snapshot_store.read
+    monkeypatch.setattr(context.snapshot_store, 'read', lambda position: reads.append(position) or read(position))
+    first = context.comparison_price(2)
+    assert context.comparison_price(2) is first and context.comparison(2) is context.comparison(2)
+    assert reads == [-2]
+    assert first[:2].tolist() == [3.0, 5.0] and np.isnan(first[2])  # c is not in the older round
+    assert context.comparison_price(3)[0] == 2.0 and reads == [-2, -3]
+
+
+def test_shared_inputs_are_read_only(context):
+    with pytest.raises(ValueError):
+        context.universe.price[0] = 0.0
+    with pytest.raises(ValueError):
+        context.comparison_price(1)[0] = 0.0
+    with pytest.raises(TypeError):
+        context.latest_data['a'] = PriceRecord(0.0, 0.0, 0.0, 0.0)
+    with pytest.raises(TypeError):
+        context.filtered_coins['b'] = 'bbb'
+    assert context.round_count == 4 and context.snapshot_id == '00000000000000001003' and 'b' in context.blacklist
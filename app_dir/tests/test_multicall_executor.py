@@ -0,0 +1,93 @@
+import pytest
+from library import multicall_executor
+from library.multicall_executor import MulticallExecutor, FAILED_RESULT
+
+
+class Node:
+    def __init__(self, max_calls=None, bad_target=None, transport_failures=0):
+        self.max_calls = max_calls
+        self.bad_target = bad_target
+        self.transport_failures = transport_failures
+        self.requests = 0
+        self.address = '0xmulticall'
+        self.functions = self
+
+    def aggregate3(self, calls):
+        node = self
+
+        class Call:
+            def call(self, block_identifier='latest'):
+                node.requests += 1
+                if node.transport_failures:
+                    node.transport_failures -= 1
+                    raise ConnectionError('Connection reset by peer')
+                if node.max_calls is not None and len(calls) > node.max_calls:
+                    raise ValueError({'code': -32000, 'message': 'out of gas: gas required exceeds allowance'})
+                if any(target == node.bad_target for target, _, _ in calls) and len(calls) > 1:
+                    raise ValueError({'code': -32000, 'message': 'response size exceeds the limit'})
+                return [(True, target.encode()) if target != node.bad_target else (False, b'') for target, _, _ in calls]
+        return Call()
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(multicall_executor.time, 'sleep', lambda seconds: None)
+
+
+def make_calls(count):
+    return [(f't{i}', True, b'') for i in range(count)]
+
+
+def test_results_keep_call_order_across_chunks():
+    executor = MulticallExecutor(Node(), workers=4, chunk_size=50)
+    results = executor.execute(make_calls(333))
+    assert results == [(True, f't{i}'.encode()) for i in range(333)]
+
+
+def test_oversized_chunks_are_bisected_and_shrink_the_chunk_size():
+    node = Node(max_calls=120)
+    executor = MulticallExecutor(node, workers=1, chunk_size=1000)
+    results = executor.execute(make_calls(1000))
+    assert results == [(True, f't{i}'.encode()) for i in range(1000)]
+    assert executor.chunk_size < 1000
+
+
+def test_a_failing_call_is_isolated_within_the_split_depth(monkeypatch):
+    monkeypatch.setattr(multicall_executor, 'max_split_depth', 10)
+    executor = MulticallExecutor(Node(bad_target='t7'), workers=1, chunk_size=64)
+    results = executor.execute(make_calls(64))
+    assert results[7] == FAILED_RESULT
+    assert all(result[0] for i, result in enumerate(results) if i != 7)
+
+
+def test_split_depth_caps_the_number_of_requests(monkeypatch):
+    monkeypatch.setattr(multicall_executor, 'max_split_depth', 2)
+    node = Node(max_calls=0)
+    executor = MulticallExecutor(node, workers=1, chunk_size=1000)
+    assert executor.execute(make_calls(1000)) == [FAILED_RESULT] * 1000
+    assert node.requests == 7
+
+
+def test_transport_errors_retry_the_whole_chunk():
+    node = Node(transport_failures=1)
+    executor = MulticallExecutor(node, workers=1, chunk_size=1000)
+    assert len(executor.execute(make_calls(1000))) == 1000
+    assert node.requests == 2
+    assert executor.chunk_size >= 1000
+
+
+def test_a_chunk_out_of_transport_attempts_fails_only_its_own_calls():
+    node = Node(transport_failures=multicall_executor.transport_attempts)
+    executor = MulticallExecutor(node, workers=1, chunk_size=50)
+    results = executor.execute(make_calls(150))
+    assert results[:50] == [FAILED_RESULT] * 50
+    assert results[50:] == [(True, f't{i}'.encode()) for i in range(50, 150)]
+    assert node.requests == multicall_executor.transport_attempts + 2
+
+
+def test_transport_errors_on_every_chunk_are_raised_instead_of_bisected():
+    node = Node(transport_failures=100)
+    executor = MulticallExecutor(node, workers=1, chunk_size=1000)
+    with pytest.raises(ConnectionError):
+        executor.execute(make_calls(1000))
+    assert node.requests == multicall_executor.transport_attempts
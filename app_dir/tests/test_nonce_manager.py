@@ -0,0 +1,78 @@
+import threading
+import types
+import pytest
+from library.nonce_manager import NonceManager
+
+WALLET = '0x' + 'ab' * 20
+
+
+class Node:
+    # Accepts transactions in nonce order like a node's mempool, rejects the ones listed in errors
+    def __init__(self, pending=5):
+        self.pending = pending
+        self.syncs = 0
+        self.sent = []
+        self.errors = []
+        self.eth = types.SimpleNamespace(get_transaction_count=self.get_transaction_count, send_raw_transaction=self.send_raw_transaction,
+                                         account=types.SimpleNamespace(sign_transaction=self.sign_transaction))
+
+    def get_transaction_count(self, address, block):
+        self.syncs += 1
+        return self.pending
+
+    def sign_transaction(self, transaction, private_key):
+        return types.SimpleNamespace(rawTransaction=transaction['nonce'], hash=f"hash{transaction['nonce']}")
+
+    def send_raw_transaction(self, nonce):
+        if self.errors:
+            raise ValueError(self.errors.pop(0))
+        self.sent.append(nonce)
+        self.pending = max(self.pending, nonce + 1)
+        return f"hash{nonce}"
+
+
+def test_nonces_are_handed_out_locally_after_one_sync():
+    node = Node()
+    manager = NonceManager(node, WALLET)
+    threads = [threading.Thread(target=lambda: [manager.send({}, 'key') for _ in range(10)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(node.sent) == list(range(5, 45)) and node.syncs == 1
+
+
+def test_a_nonce_error_resyncs_and_retries_once():
+    node = Node()
+    manager = NonceManager(node, WALLET)
+    assert manager.reserve() == 5
+    manager.seed(3)  # An older pending count does not move the nonce back
+    assert manager.reserve() == 6
+    node.pending = 9  # Transactions sent from elsewhere
+    node.errors = ['nonce too low']
+    assert manager.send({}, 'key') == 'hash9'
+    assert node.sent == [9] and node.syncs == 2
+    node.errors = ['nonce too low', 'nonce too low']
+    with pytest.raises(ValueError):
+        manager.send({}, 'key')
+    assert manager.next_nonce is None
+
+
+def test_unsent_nonces_are_handed_out_again():
+    node = Node()
+    manager = NonceManager(node, WALLET)
+    node.errors = ['insufficient funds for gas']
+    with pytest.raises(ValueError):
+        manager.send({}, 'key')
+    assert manager.send({}, 'key') == 'hash5'
+    first, second = manager.reserve(), manager.reserve()
+    manager.release(first)  # Released behind a later nonce, the gap would stall it
+    assert manager.next_nonce is None and manager.reserve() == 6 and node.syncs == 2
+
+
+def test_a_transaction_the_node_already_has_counts_as_sent():
+    node = Node()
+    manager = NonceManager(node, WALLET)
+    node.errors = ['already known']
+    assert manager.send({}, 'key') == 'hash5'
+    assert manager.reserve() == 6
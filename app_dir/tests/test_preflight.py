@@ -0,0 +1,85 @@
+import os
+import types
+import pytest
+from eth_abi import abi
+from web3 import Web3
+
+# Module level settings of the trade path, the BSC addresses from .env.example
+os.environ.setdefault('USDT_ADDRESS', '0x55d398326f99059fF775485246999027B3197955')
+os.environ.setdefault('BNB_ADDRESS', '0xbb4CdB9CBd36B01bD1cBaEBF2De08d9173bc095c')
+
+from library import preflight  # noqa: E402
+from library.preflight import fetch_trade_preflight, AGGREGATE3_SELECTOR, BALANCE_OF_SELECTOR, ALLOWANCE_SELECTOR, GET_ETH_BALANCE_SELECTOR  # noqa: E402
+from library.pair_index import sort_tokens  # noqa: E402
+
+MULTICALL = Web3.to_checksum_address('0xcA11bde05977b3631167028862bE2a173976CA11')
+WALLET = Web3.to_checksum_address('0x%040x' % 0xabc)
+TOKEN = Web3.to_checksum_address('0x%040x' % 0x1234)
+ROUTER = Web3.to_checksum_address('0x10ED43C718714eb63d5aA57B78B54704E256024E')
+PAIR = Web3.to_checksum_address('0x%040x' % 0x5678)
+BALANCES = {preflight.usdt_address: 250 * 10 ** 18, TOKEN: 7, preflight.bnb_address: 3}
+ALLOWANCES = {preflight.usdt_address: 10 ** 30, TOKEN: 0}
+
+
+class Chain:
+    # Answers the preflight batch the way a node and the Multicall3 contract would
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.batches = []
+
+    def answer(self, target, data):
+        if target in self.failing:
+            return False, b''
+        selector = data[:4]
+        if target == MULTICALL:
+            return True, abi.encode(['uint256'], [5 * 10 ** 17 if selector == GET_ETH_BALANCE_SELECTOR else 12345])
+        if selector == BALANCE_OF_SELECTOR:
+            return True, abi.encode(['uint256'], [BALANCES[target]])
+        if selector == ALLOWANCE_SELECTOR:
+            return True, abi.encode(['uint256'], [ALLOWANCES.get(target, 0)])
+        bnb_reserve, usdt_reserve = 1000 * 10 ** 18, 600000 * 10 ** 18
+        reserves = (bnb_reserve, usdt_reserve) if sort_tokens(preflight.bnb_address, preflight.usdt_address)[0] == preflight.bnb_address else (usdt_reserve, bnb_reserve)
+        return True, abi.encode(['uint112', 'uint112', 'uint32'], [*reserves, 0])
+
+    def make_request(self, method, params):
+        self.batches.append(method)
+        if method == 'eth_call':
+            data = Web3.to_bytes(hexstr=params[0]['data'])
+            assert data[:4] == AGGREGATE3_SELECTOR
+            calls = abi.decode(['(address,bool,bytes)[]'], data[4:])[0]
+            results = [self.answer(Web3.to_checksum_address(target), call_data) for target, _, call_data in calls]
+            return {'result': Web3.to_hex(abi.encode(['(bool,bytes)[]'], [results]))}
+        return {'result': {'eth_getTransactionCount': '0x9', 'eth_gasPrice': '0x12a05f200', 'eth_chainId': '0x38'}[method]}
+
+
+def run_preflight(monkeypatch, chain, pair=PAIR):
+    index = types.SimpleNamespace(resolve=lambda executor, factory, pairs: {sort_tokens(*pairs[0]): pair} if pair else {})
+    monkeypatch.setattr(preflight, 'get_pair_index', lambda: index)
+    web3 = types.SimpleNamespace(provider=chain)
+    executor = types.SimpleNamespace(multicall=types.SimpleNamespace(address=MULTICALL))
+    return fetch_trade_preflight(web3, executor, WALLET.lower(), TOKEN, ROUTER)
+
+
+def test_one_batch_reads_every_input_of_the_trade(monkeypatch):
+    chain = Chain()
+    state = run_preflight(monkeypatch, chain)
+    assert chain.batches == ['eth_call', 'eth_getTransactionCount', 'eth_gasPrice', 'eth_chainId']
+    assert (state.wallet_address, state.block_number, state.chain_id, state.nonce, state.gas_price) == (WALLET, 12345, 56, 9, 5 * 10 ** 9)
+    assert (state.bnb_balance, state.usdt_balance, state.token_balance, state.wbnb_balance) == (5 * 10 ** 17, 250 * 10 ** 18, 7, 3)
+    assert state.allowance(preflight.usdt_address.lower()) == 10 ** 30 and state.allowance(TOKEN) == 0
+    assert state.bnb_price == pytest.approx(600.0)
+
+
+def test_failed_calls_read_as_zero_and_a_missing_pair_leaves_the_price_unknown(monkeypatch):
+    state = run_preflight(monkeypatch, Chain(failing={TOKEN}), pair=None)
+    assert state.token_balance == 0 and state.allowance(TOKEN) == 0
+    assert state.bnb_price is None
+    with pytest.raises(Exception):
+        state.allowances[TOKEN] = 1  # Read once, never updated afterwards
+
+
+def test_a_node_error_fails_the_preflight(monkeypatch):
+    chain = Chain()
+    chain.make_request = lambda method, params: {'error': {'code': -32000, 'message': 'header not found'}}
+    with pytest.raises(ValueError):
+        run_preflight(monkeypatch, chain)
@@ -0,0 +1,66 @@
+import types
+import pytest
+from web3.exceptions import TimeExhausted
+from library.receipt_tracker import ReceiptTracker
+
+TX_HASH = '0x' + 'ab' * 32
+
+
+class FlakyProvider:
+    # Answers eth_getTransactionReceipt from mined, failing the first failures calls like a dropped connection
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.mined = {}
+        self.calls = []
+
+    def make_request(self, method, params):
+        self.calls.append(params[0])
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('connection reset')
+        return {'jsonrpc': '2.0', 'id': 0, 'result': self.mined.get(params[0])}
+
+
+def make_tracker(provider, block_number=10):
+    web3 = types.SimpleNamespace(provider=provider, eth=types.SimpleNamespace(block_number=block_number))
+    tracker = ReceiptTracker(web3)
+    tracker.worker = types.SimpleNamespace(is_alive=lambda: True)  # Tests drive _poll themselves
+    return tracker, web3
+
+
+def test_a_failed_poll_keeps_the_hash_unchecked_until_it_is_answered():
+    provider = FlakyProvider(failures=1)
+    tracker, web3 = make_tracker(provider)
+    tracker.last_block = 10  # No new block, only unchecked hashes are polled
+    future = tracker.track(TX_HASH)
+    with pytest.raises(ConnectionError):
+        tracker._poll()
+    assert TX_HASH in tracker.unchecked and TX_HASH in tracker.pending
+    provider.mined[TX_HASH] = {'transactionHash': TX_HASH, 'blockNumber': '0xa', 'status': '0x1', 'gasUsed': '0x5208', 'logs': []}
+    tracker._poll()
+    assert future.result(0).status == 1
+    assert not tracker.pending and not tracker.unchecked
+
+
+def test_a_failed_poll_on_a_new_block_polls_every_hash_again():
+    provider = FlakyProvider(failures=1)
+    tracker, web3 = make_tracker(provider)
+    tracker.last_block = 9
+    tracker.track(TX_HASH)
+    tracker.unchecked.clear()
+    with pytest.raises(ConnectionError):
+        tracker._poll()
+    tracker._poll()  # Same block number, it still counts as new because the failed pass did not poll it
+    assert provider.calls == [TX_HASH, TX_HASH]
+    assert tracker.last_block == 10
+
+
+def test_pending_hashes_expire_after_their_timeout_even_when_polls_fail():
+    provider = FlakyProvider(failures=1)
+    tracker, web3 = make_tracker(provider)
+    future = tracker.track(TX_HASH, timeout=0)
+    with pytest.raises(ConnectionError):
+        tracker._poll()
+    with pytest.raises(TimeExhausted):
+        future.result(0)
+    assert not tracker.pending and not tracker.unchecked
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from library.reserve_pricing import ReserveSnapshot
+from library.pair_index import sort_tokens
+
+WBNB = '0xbb4CdB9CBd36B01bD1cBaEBF2De08d9173bc095c'
+USDT = '0x55d398326f99059fF775485246999027B3197955'
+TOKEN = '0x0E09FaBB73Bd3Ade0a17ECC321fD13a19e81cE82'
+
+
+def router_amount_out(amount_in, reserve_in, reserve_out):
+    # PancakeSwap v2 router getAmountOut
+    amount_in_with_fee = amount_in * 9975
+    return amount_in_with_fee * reserve_out // (reserve_in * 10000 + amount_in_with_fee)
+
+
+def make_snapshot(pairs):
+    reserves = {}
+    for (token_a, token_b), (reserve_a, reserve_b) in pairs.items():
+        key = sort_tokens(token_a, token_b)
+        reserves[key] = (reserve_a, reserve_b) if key[0] == token_a else (reserve_b, reserve_a)
+    return ReserveSnapshot(reserves, 0)
+
+
+@pytest.fixture
+def snapshot():
+    return make_snapshot({(WBNB, TOKEN): (500 * 10 ** 18, 2_000_000 * 10 ** 18), (USDT, WBNB): (3_000_000 * 10 ** 18, 5_000 * 10 ** 18)})
+
+
+def test_reserves_follow_the_asked_direction(snapshot):
+    assert snapshot.get_reserves(WBNB, TOKEN) == (500 * 10 ** 18, 2_000_000 * 10 ** 18)
+    assert snapshot.get_reserves(TOKEN.lower(), WBNB) == (2_000_000 * 10 ** 18, 500 * 10 ** 18)
+    assert snapshot.get_reserves(USDT, TOKEN) is None
+
+
+def test_amount_out_matches_the_router_integer_math(snapshot):
+    for amount_in in (1, 10 ** 15, 3 * 10 ** 18, 400 * 10 ** 18):
+        assert snapshot.get_amount_out(amount_in, WBNB, TOKEN) == router_amount_out(amount_in, 500 * 10 ** 18, 2_000_000 * 10 ** 18)
+
+
+def test_amounts_out_chain_the_hops_and_stop_at_a_missing_pair(snapshot):
+    amounts = snapshot.get_amounts_out(10 ** 18, [USDT, WBNB, TOKEN])
+    assert amounts[1] == router_amount_out(10 ** 18, 3_000_000 * 10 ** 18, 5_000 * 10 ** 18)
+    assert amounts[2] == router_amount_out(amounts[1], 500 * 10 ** 18, 2_000_000 * 10 ** 18)
+    assert snapshot.get_amounts_out(10 ** 18, [USDT, TOKEN]) is None
+
+
+def test_vectorized_amounts_out_agree_with_the_integer_math(snapshot):
+    amounts_in = np.array([10 ** 15, 10 ** 18, 50 * 10 ** 18], dtype=np.float64)
+    reserve_in, reserve_out = snapshot.reserve_arrays(WBNB, [TOKEN, TOKEN, TOKEN])
+    expected = [float(router_amount_out(int(amount), 500 * 10 ** 18, 2_000_000 * 10 ** 18)) for amount in amounts_in]
+    assert np.allclose(snapshot.amounts_out(amounts_in, reserve_in, reserve_out), expected, rtol=1e-12)
+    assert snapshot.amounts_out(10 ** 18, np.zeros(2), np.zeros(2)).tolist() == [0.0, 0.0]
+
+
+def test_max_amount_within_impact_lands_on_the_limit(snapshot):
+    amount = snapshot.max_amount_within_impact(WBNB, TOKEN, 0.02)
+    assert snapshot.price_impact(WBNB, TOKEN, [amount])[0] == pytest.approx(0.02, rel=1e-9)
+    assert snapshot.price_impact(WBNB, TOKEN, [amount * 1.01])[0] > 0.02
+
+
+def test_max_amount_is_zero_when_the_fee_exceeds_the_limit_or_the_pair_is_unknown(snapshot):
+    assert snapshot.max_amount_within_impact(WBNB, TOKEN, 0.0025) == 0.0
+    assert snapshot.max_amount_within_impact(WBNB, TOKEN, 0.001) == 0.0
+    assert snapshot.max_amount_within_impact(USDT, TOKEN, 0.05) == 0.0
+    assert snapshot.price_impact(USDT, TOKEN, [1.0]).tolist() == [1.0]
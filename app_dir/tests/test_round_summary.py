@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+from library.round_summary import RoundSummary, read_day, summary_from_rows, summary_name, transactions_count, total_pnl, FILE_PREFIX
+
+WALLETS = ['w1', 'w2']
+
+
+def logged_rows(count=2000, seed=1):
+    rng = np.random.default_rng(seed)
+    actions = rng.choice(['buy', 'sell', 'hold', 'stop_loss', 'no_action'], count)
+    wallets = rng.choice(WALLETS, count)
+    symbols = rng.choice([f's{i}' for i in range(20)], count)
+    pnl = np.round(np.where(rng.random(count) < 0.6, rng.normal(0, 5, count), np.nan), 2)
+    return wallets, actions, symbols, pnl
+
+
+def baseline_report(frame):
+    # The daily report as main computed it from the combined CSV, which drops no_action rows first
+    frame = frame[frame['Action'] != 'no_action']
+    report = {}
+    for wallet_id in WALLETS:
+        rows = frame[frame['Wallet'] == wallet_id]
+        priced = rows[rows['Profits/Losses'] != '-']
+        hold = priced[priced['Action'] == 'hold']
+        report[wallet_id] = {'buy': len(priced[priced['Action'] == 'buy']), 'sell': len(priced[priced['Action'] == 'sell']), 'hold': hold['Symbol'].nunique(),
+                             'transactions': len(rows), 'pnl': round(priced['Profits/Losses'].astype(float).sum(), 6)}
+    return report
+
+
+def report_of(summary):
+    return {wallet_id: {'buy': actions['buy']['priced'], 'sell': actions['sell']['priced'], 'hold': len(actions['hold']['symbols']),
+                        'transactions': transactions_count(actions), 'pnl': round(total_pnl(actions), 6)} for wallet_id, actions in summary.items()}
+
+
+def test_the_running_summary_reports_what_the_combined_csv_did(tmp_path):
+    wallets, actions, symbols, pnl = logged_rows()
+    frame = pd.DataFrame({'Wallet': wallets, 'Action': actions, 'Symbol': [symbol.upper() for symbol in symbols],
+                          'Profits/Losses': [f"{value:.2f}" if value == value else '-' for value in pnl]})
+    summary = RoundSummary(str(tmp_path))
+    for chunk in np.array_split(np.arange(len(actions)), 5):
+        for wallet_id in WALLETS:
+            rows = chunk[wallets[chunk] == wallet_id]
+            summary.record(wallet_id, actions[rows], pnl[rows], list(symbols[rows]))
+        summary.flush()
+    day = read_day(str(tmp_path), summary_name()[len(FILE_PREFIX):-len('.json')])
+    assert report_of(day) == baseline_report(frame)
+    assert report_of(summary_from_rows(frame['Wallet'], frame['Action'], frame['Profits/Losses'], frame['Symbol'])) == baseline_report(frame)
+
+
+def test_no_action_rows_are_kept_in_the_summary_but_not_counted_as_transactions():
+    summary = RoundSummary(None)
+    summary.record('w1', ['no_action', 'no_action', 'buy'], [np.nan, np.nan, 1.5], ['a', 'b', 'c'])
+    assert summary.current['w1']['no_action']['rows'] == 2
+    assert transactions_count(summary.current['w1']) == 1 and total_pnl(summary.current['w1']) == 1.5
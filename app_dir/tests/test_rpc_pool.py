@@ -0,0 +1,70 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from library.rpc_pool import RpcPool
+
+
+def start_node(accepts_batches, received):
+    # JSON-RPC node answering eth_blockNumber, optionally refusing batches the way some public endpoints do
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            received.append(payload)
+            if isinstance(payload, list):
+                body = [{'jsonrpc': '2.0', 'id': item['id'], 'result': hex(100 + item['id'])} for item in payload] if accepts_batches else \
+                    {'jsonrpc': '2.0', 'id': None, 'error': {'code': -32600, 'message': 'batch requests are not supported'}}
+            else:
+                body = {'jsonrpc': '2.0', 'id': payload['id'], 'result': hex(7)}
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def servers():
+    started = []
+    yield started
+    for server in started:
+        server.shutdown()
+
+
+def make_pool(servers, *accepts_batches):
+    received = [[] for _ in accepts_batches]
+    for accepts, requests in zip(accepts_batches, received):
+        servers.append(start_node(accepts, requests))
+    pool = RpcPool([f"http://127.0.0.1:{server.server_address[1]}" for server in servers])
+    return pool, received
+
+
+def test_a_node_refusing_batches_falls_back_to_single_calls_and_stays_healthy(servers):
+    pool, (received,) = make_pool(servers, False)
+    node = pool.nodes[0]
+    batch = [('eth_blockNumber', []), ('eth_chainId', [])]
+    responses = pool.make_batch_request(batch)
+    assert [response['id'] for response in responses] == [0, 1]
+    assert all(response['result'] == hex(7) for response in responses)
+    assert node.batch_supported is False
+    assert node.consecutive_failures == 0 and node.error_rate == 0 and node.open_until == 0
+    received.clear()
+    pool.make_batch_request(batch)
+    assert all(not isinstance(payload, list) for payload in received)
+
+
+def test_batches_go_to_nodes_that_accept_them(servers):
+    pool, (refusing, accepting) = make_pool(servers, False, True)
+    for _ in range(5):
+        responses = pool.make_batch_request([('eth_blockNumber', [])] * 3)
+        assert [response['result'] for response in responses] == [hex(100), hex(101), hex(102)]
+    assert sum(isinstance(payload, list) for payload in refusing) <= 1
+    assert pool.nodes[0].error_rate == 0 and pool.nodes[1].batch_supported
@@ -0,0 +1,104 @@
+import json
+import numpy as np
+import pytest
+from library import snapshot_store
+from library.price_record import PriceRecord
+from library.snapshot_store import SnapshotStore, COLUMNS_FILE, TOKENS_FILE
+
+
+def market_rounds(count=12, tokens=40, seed=3):
+    # Rounds where a few tokens move, some disappear and new ones are listed, like real market data
+    rng = np.random.default_rng(seed)
+    current = {f'coin{i}': PriceRecord(*rng.random(4)) for i in range(tokens)}
+    rounds = []
+    for number in range(count):
+        for coin_id in rng.choice(list(current), 3, replace=False).tolist():
+            current[coin_id] = PriceRecord(*rng.random(4))
+        if number % 4 == 3:
+            current.pop(next(iter(current)))
+            current[f'new{number}'] = PriceRecord(*rng.random(4))
+        rounds.append(dict(current))
+    return rounds
+
+
+def fill(store, rounds, start=1000):
+    for number, data in enumerate(rounds):
+        store.append(start + number, data, block_number=number + 1)
+
+
+@pytest.mark.parametrize('interval', [1, 5, 60])
+def test_rounds_read_back_as_written_with_keyframes_and_deltas(tmp_path, monkeypatch, interval):
+    monkeypatch.setattr(snapshot_store, 'keyframe_interval', interval)
+    rounds = market_rounds()
+    store = SnapshotStore(str(tmp_path))
+    fill(store, rounds)
+    reopened = SnapshotStore(str(tmp_path))
+    for position, data in enumerate(rounds):
+        assert store.read(position) == data and reopened.read(position) == data
+        assert reopened.block_of(position) == position + 1
+    bases = [reopened.meta_of(position)[1] for position in range(len(rounds))]
+    assert bases[0] == -1 and (interval == 1) == all(base == -1 for base in bases)
+    assert reopened.latest() == ('00000000000000001011', rounds[-1])
+    assert reopened.rounds_ago(2) == ('00000000000000001009', rounds[-3])
+    assert reopened.rounds_ago(len(rounds)) == (None, {})
+
+
+def test_token_range_matches_the_materialized_rounds(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_store, 'keyframe_interval', 5)
+    rounds = market_rounds()
+    store = SnapshotStore(str(tmp_path))
+    fill(store, rounds)
+    for coin_id in ('coin0', 'coin5', 'new3'):
+        timestamps, records = store.token_range(coin_id, 1002, 1010)
+        expected = [(1000 + number, data[coin_id]) for number, data in enumerate(rounds) if coin_id in data and 1002 <= 1000 + number <= 1010]
+        assert timestamps.tolist() == [timestamp for timestamp, _ in expected]
+        assert [tuple(record)[1:] for record in records.tolist()] == [tuple(record) for _, record in expected]
+    assert len(store.token_range('unknown')[0]) == 0
+
+
+def test_patches_apply_to_their_round_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_store, 'keyframe_interval', 5)
+    rounds = market_rounds()
+    store = SnapshotStore(str(tmp_path))
+    fill(store, rounds)
+    assert store.patch('00000000000000001006', 'coin1', 'real_price', 7.5)
+    assert store.patch('00000000000000001006', 'coin1', 'real_price', 8.5)  # The later correction wins
+    assert not store.patch('00000000000000000999', 'coin1', 'real_price', 1.0)
+    assert not store.patch('00000000000000001006', 'unknown', 'real_price', 1.0)
+    reopened = SnapshotStore(str(tmp_path))
+    assert reopened.read(6)['coin1'] == rounds[6]['coin1']._replace(real_price=8.5)
+    assert reopened.read(5) == rounds[5] and reopened.read(7) == rounds[7]
+    timestamps, records = reopened.token_range('coin1')
+    assert records['real_price'][timestamps.tolist().index(1006)] == 8.5
+
+
+def test_an_interrupted_append_is_overwritten_and_partial_token_lines_wait(tmp_path):
+    rounds = market_rounds(count=3)
+    store = SnapshotStore(str(tmp_path))
+    fill(store, rounds[:2])
+    with open(tmp_path / COLUMNS_FILE, 'ab') as file:
+        file.write(b'\x01' * 100)  # Records of an append that never wrote its round entry
+    with open(tmp_path / TOKENS_FILE, 'a') as file:
+        file.write('half')
+    reader = SnapshotStore(str(tmp_path))
+    assert 'half' not in reader.token_index
+    with open(tmp_path / TOKENS_FILE, 'a') as file:
+        file.write('\n')
+    store.append(1002, {**rounds[2], 'half': PriceRecord(1.0, 2.0, 3.0, 4.0)})
+    reader.refresh()
+    assert reader.read(2) == {**rounds[2], 'half': PriceRecord(1.0, 2.0, 3.0, 4.0)}
+    with pytest.raises(ValueError):
+        store.append(1002, rounds[2])
+
+
+def test_legacy_files_are_imported_once(tmp_path):
+    legacy = tmp_path / 'legacy'
+    legacy.mkdir()
+    for timestamp, price in ((1000, '1.5'), (1001, '2.5')):
+        (legacy / str(timestamp)).write_text(json.dumps({'0': {'coin': [price, '10']}}))
+    (legacy / '1002').write_text('{not json')
+    store = SnapshotStore(str(tmp_path / 'store'))
+    store.import_legacy_directory(str(legacy))
+    store.import_legacy_directory(str(legacy))  # Only the unreadable file is left to try again
+    assert store.snapshot_ids() == ['00000000000000001000', '00000000000000001001']
+    assert store.read(1) == {'coin': PriceRecord(2.5, 10.0, 2.5, 0.0)}
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import threading
+import time
+import pytest
+from eth_abi import abi
+from web3 import Web3
+from library import pair_index
+from library.multicall_executor import MulticallExecutor
+from library.pair_index import PairIndex, sort_tokens
+from library.reserve_pricing import fetch_reserve_snapshot
+from library.sync_feed import SyncFeed, SYNC_TOPIC, make_replay_server
+
+FACTORY = Web3.to_checksum_address('0xcA143Ce32Fe78f1f7019d7d551a6402fC5350c73')
+MULTICALL = Web3.to_checksum_address('0xcA11bde05977b3631167028862bE2a173976CA11')
+WBNB = Web3.to_checksum_address('0xbb4CdB9CBd36B01bD1cBaEBF2De08d9173bc095c')
+TOKENS = [Web3.to_checksum_address('0x%040x' % (0x1000 + i)) for i in range(4)]
+AGGREGATE3_ABI = [{'name': 'aggregate3', 'type': 'function', 'stateMutability': 'payable',
+                   'inputs': [{'name': 'calls', 'type': 'tuple[]', 'components': [{'name': 'target', 'type': 'address'}, {'name': 'allowFailure', 'type': 'bool'}, {'name': 'callData', 'type': 'bytes'}]}],
+                   'outputs': [{'name': 'returnData', 'type': 'tuple[]', 'components': [{'name': 'success', 'type': 'bool'}, {'name': 'returnData', 'type': 'bytes'}]}]}]
+START, HEAD = 100, 140
+
+
+def make_recording():
+    # Four WBNB pairs with starting reserves and a few Sync events each, the last pair never trades
+    pairs, logs = [], []
+    for i, token in enumerate(TOKENS):
+        token0, token1 = sort_tokens(WBNB, token)
+        pair = Web3.to_checksum_address('0x%040x' % (0x2000 + i))
+        pairs.append({'token0': token0, 'token1': token1, 'pair': pair, 'reserves': [10 ** 21 + i, 10 ** 24 + i]})
+        for n, block in enumerate(range(START + 3 + i, HEAD + 1, 7) if i < 3 else []):
+            for log_index in range(2):
+                logs.append({'address': pair, 'blockNumber': block, 'blockHash': '0x' + '00' * 32, 'transactionHash': '0x' + '%064x' % (block * 10 + log_index),
+                             'transactionIndex': 0, 'logIndex': log_index + i * 2, 'topics': [SYNC_TOPIC], 'removed': False,
+                             'data': Web3.to_hex(abi.encode(['uint112', 'uint112'], [10 ** 21 + block * 1000 + log_index, 10 ** 24 - block * 1000 - log_index]))})
+    return {'factory': FACTORY, 'start': START, 'head': HEAD, 'pairs': pairs, 'logs': logs}
+
+
+@pytest.fixture
+def replay(tmp_path, monkeypatch):
+    recording_path = tmp_path / 'sync_recording.json'
+    recording_path.write_text(json.dumps(make_recording()))
+    server = make_replay_server(str(recording_path), port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(pair_index, 'pair_index', PairIndex(str(tmp_path / 'pair_index.db')))
+    web3 = Web3(Web3.HTTPProvider(f"http://127.0.0.1:{server.server_address[1]}"))
+    yield web3, MulticallExecutor(web3.eth.contract(address=MULTICALL, abi=AGGREGATE3_ABI), workers=2)
+    server.shutdown()
+
+
+def full_rescan(executor, token_pairs, block_number):
+    # A fresh index and snapshot, the way a reconciliation reads every pair
+    snapshot, _ = asyncio.run(fetch_reserve_snapshot(executor, FACTORY, token_pairs, block_identifier=block_number))
+    return snapshot.reserves
+
+
+def test_replayed_sync_logs_match_a_full_rescan(replay):
+    web3, executor = replay
+    token_pairs = [(WBNB, token) for token in TOKENS[:3]]
+    feed = SyncFeed(web3, FACTORY)
+    start_reserves = dict(asyncio.run(feed.update(executor, token_pairs, START)).reserves)
+    assert start_reserves == full_rescan(executor, token_pairs, START)
+    feed.last_reconcile = time.time()  # Keep the next updates on the Sync log path
+    for block_number in (START + 5, START + 20, HEAD):
+        snapshot = asyncio.run(feed.update(executor, token_pairs, block_number))
+        assert snapshot.block_number == block_number
+        assert snapshot.reserves == full_rescan(executor, token_pairs, block_number)
+    assert feed.last_block == HEAD
+    assert all(snapshot.reserves[key] != start_reserves[key] for key in start_reserves)
+
+
+def test_pairs_added_later_are_reconciled_and_then_followed(replay):
+    web3, executor = replay
+    feed = SyncFeed(web3, FACTORY)
+    asyncio.run(feed.update(executor, [(WBNB, TOKENS[0])], START))
+    feed.last_reconcile = time.time()
+    token_pairs = [(WBNB, token) for token in TOKENS]
+    snapshot = asyncio.run(feed.update(executor, token_pairs, START + 10))
+    assert snapshot.reserves == full_rescan(executor, token_pairs, START + 10)
+    assert asyncio.run(feed.update(executor, token_pairs, HEAD)).reserves == full_rescan(executor, token_pairs, HEAD)
+
+
+def test_unknown_pairs_resolve_to_no_pair(replay):
+    web3, executor = replay
+    unknown = Web3.to_checksum_address('0x%040x' % 0x9999)
+    snapshot, _ = asyncio.run(fetch_reserve_snapshot(executor, FACTORY, [(WBNB, unknown)], block_identifier=HEAD))
+    assert snapshot.reserves == {}
+    assert pair_index.get_pair_index().has_pair(FACTORY, WBNB, unknown) is False
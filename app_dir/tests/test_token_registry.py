@@ -0,0 +1,53 @@
+import json
+from library.token_registry import TokenRegistry
+
+
+def make_registry(tmp_path, coins):
+    path = tmp_path / 'available_coin_list.json'
+    path.write_text(json.dumps(coins))
+    return TokenRegistry(str(path))
+
+
+def test_lookups_by_address_id_and_symbol(tmp_path):
+    registry = make_registry(tmp_path, {'a': {'id': 'id-a', 'symbol': 'AAA ', 'contract_address': '0xAbC'},
+                                        'b': {'id': 'id-b', 'symbol': 'bbb', 'contract_address': 'N/A'}})
+    assert registry.coin_id_of('0xabc') == 'a'
+    assert registry.symbol_of('0xABC') == 'AAA'
+    assert registry.address_of('aaa') == '0xAbC'
+    assert registry.address_of('id-b') is None
+    assert registry.get('id-b')['symbol'] == 'bbb'
+    assert registry.symbols() == {'AAA', 'BBB'}
+
+
+def test_removal_points_shared_values_at_the_next_coin(tmp_path):
+    registry = make_registry(tmp_path, {'a': {'id': '1', 'symbol': 'DUP', 'contract_address': '0x1'},
+                                        'b': {'id': '2', 'symbol': 'DUP', 'contract_address': '0x1'},
+                                        'c': {'id': '3', 'symbol': 'DUP', 'contract_address': '0x3'}})
+    assert registry.by_symbol['DUP'] == 'a'
+    registry.remove('a')
+    assert registry.by_symbol['DUP'] == 'b'
+    assert registry.coin_id_of('0x1') == 'b'
+    registry.add('b', {'id': '2', 'symbol': 'NEW', 'contract_address': '0x2'})
+    assert registry.by_symbol['DUP'] == 'c'
+    assert registry.by_symbol['NEW'] == 'b'
+    assert registry.coin_id_of('0x1') is None
+    registry.remove('c')
+    assert 'DUP' not in registry.by_symbol
+
+
+def test_merge_updates_known_symbols_in_place(tmp_path):
+    registry = make_registry(tmp_path, {'a': {'id': '1', 'symbol': 'AAA', 'contract_address': '0x1'}})
+    registry.merge({'other': {'symbol': 'aaa', 'contract_address': '0x9'}, 'new': {'id': '2', 'symbol': 'NEW', 'contract_address': '0x2'}})
+    assert set(registry.coins) == {'a', 'new'}
+    assert registry.coin_id_of('0x9') == 'a'
+    assert registry.coin_id_of('0x1') is None
+
+
+def test_refresh_reindexes_a_rewritten_file(tmp_path):
+    registry = make_registry(tmp_path, {'a': {'id': '1', 'symbol': 'AAA', 'contract_address': '0x1'}})
+    path = tmp_path / 'available_coin_list.json'
+    path.write_text(json.dumps({'b': {'id': '2', 'symbol': 'AAA', 'contract_address': '0x2'}}))
+    registry.mtime = None
+    assert registry.refresh()
+    assert registry.by_symbol['AAA'] == 'b'
+    assert registry.coin_id_of('0x1') is None
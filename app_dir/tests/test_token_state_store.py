@@ -0,0 +1,92 @@
+import json
+import math
+from library import token_state_store
+from library.price_record import PriceRecord
+from library.strategy import MarketUniverse
+from library.token_state_store import TokenStateStore
+
+OLD = PriceRecord(1.0, 10.0, 1.0, 100.0)
+NEW = PriceRecord(2.0, 20.0, 2.0, 200.0)
+OWN = PriceRecord(5.0, 50.0, 5.0, 500.0)
+
+
+def make_store(tmp_path, base=None):
+    store = TokenStateStore(str(tmp_path / 'token_state.json'))
+    store.update_base(base or {'a': OLD, 'b': OLD})
+    return store
+
+
+def journal(tmp_path, wallet_name):
+    return [json.loads(line) for line in (tmp_path / f'token_state_{wallet_name}.jsonl').read_text().splitlines()]
+
+
+def test_the_journal_round_trips_and_skips_a_line_cut_short(tmp_path):
+    store = make_store(tmp_path)
+    wallet = store.wallet('w1')
+    wallet['a'] = OWN
+    wallet['c'] = NEW
+    assert wallet.save() == 2
+    with open(tmp_path / 'token_state_w1.jsonl', 'a') as file:
+        file.write('["b", 9.0, 9.')
+    reloaded = TokenStateStore(str(tmp_path / 'token_state.json')).wallet('w1')
+    assert reloaded.overlay == {'a': OWN, 'c': NEW}
+    assert dict(reloaded.items()) == {'a': OWN, 'b': OLD, 'c': NEW}
+
+
+def test_entries_equal_to_the_base_are_not_added_to_the_overlay(tmp_path):
+    store = make_store(tmp_path)
+    wallet = store.wallet('w1')
+    wallet['a'] = OLD
+    assert wallet.overlay == {} and wallet.save() == 0
+    wallet['a'] = OWN
+    wallet['a'] = OLD  # Already in the overlay, it changes there
+    assert wallet.overlay == {'a': OLD}
+
+
+def test_a_wallet_keeps_the_base_it_started_from(tmp_path):
+    store = make_store(tmp_path)
+    loaded = store.wallet('loaded')
+    loaded['b'] = OWN
+    loaded.save()
+    store.wallet('on_disk')['b'] = OWN
+    store.wallet('on_disk').save()
+    del store.wallets['on_disk']  # Only its journal is left, as for a wallet of an earlier run
+    store.update_base({'a': NEW, 'b': NEW, 'c': NEW})
+    for wallet in (loaded, TokenStateStore(str(tmp_path / 'token_state.json')).wallet('on_disk')):
+        assert wallet['a'] == OLD and wallet['b'] == OWN
+        assert 'c' not in wallet and wallet.get('c') is None
+        assert sorted(wallet) == ['a', 'b']
+    fresh = store.wallet('fresh')
+    assert dict(fresh.items()) == {'a': NEW, 'b': NEW, 'c': NEW}
+    loaded['c'] = NEW  # First sighting of a hidden coin is recorded even though the base has the same value
+    assert loaded['c'] == NEW
+    universe = MarketUniverse({'a': NEW, 'c': NEW, 'd': NEW})
+    prices = store.wallet('on_disk').aligned_price(universe)
+    assert prices[0] == OLD.price and math.isnan(prices[1]) and math.isnan(prices[2])
+
+
+def test_an_unchanged_base_value_pins_nothing(tmp_path):
+    store = make_store(tmp_path)
+    wallet = store.wallet('w1')
+    store.update_base({'a': OLD})
+    assert wallet.overlay == {}
+
+
+def test_the_legacy_copy_is_folded_whole(tmp_path):
+    store = make_store(tmp_path)
+    (tmp_path / 'token_state_legacy.json').write_text(json.dumps({'0': {'a': list(OLD), 'c': [str(value) for value in OWN]}}))
+    wallet = store.wallet('legacy')
+    assert wallet.overlay == {'a': OLD, 'b': None, 'c': OWN}
+    assert sorted(wallet) == ['a', 'c']
+    assert journal(tmp_path, 'legacy') == [['b'], ['a', *OLD], ['c', *OWN]]
+
+
+def test_compaction_keeps_the_journal_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(token_state_store, 'COMPACT_RATIO', 1)
+    store = make_store(tmp_path)
+    wallet = store.wallet('w1')
+    for price in range(200):
+        wallet['a'] = PriceRecord(float(price), 1.0, 1.0, 1.0)
+        wallet.save()
+    assert len(journal(tmp_path, 'w1')) <= 64
+    assert TokenStateStore(str(tmp_path / 'token_state.json')).wallet('w1').overlay == {'a': PriceRecord(199.0, 1.0, 1.0, 1.0)}
@@ -0,0 +1,73 @@
+import time
+import asyncio
+from library.trade_engine import TradeEngine
+
+
+def run_engine(trades, **options):
+    # Submit (wallet, label, seconds) trades in order and return the labels in completion order plus the results
+    finished = []
+
+    async def execute(label, seconds):
+        time.sleep(seconds)
+        finished.append(label)
+        return label
+
+    async def main():
+        engine = TradeEngine(execute, rpc_budget=0, **options).start()
+        submissions = []
+        for wallet, label, seconds in trades:
+            submissions.append(asyncio.create_task(engine.submit(wallet, label, seconds)))
+            await asyncio.sleep(0)
+        results = await asyncio.gather(*submissions)
+        await engine.close()
+        return results
+
+    return finished, asyncio.run(main())
+
+
+def test_a_busy_wallet_does_not_hold_workers_other_wallets_could_use():
+    trades = [('a', 'a1', 0.3), ('a', 'a2', 0.3), ('a', 'a3', 0.3), ('b', 'b1', 0.05)]
+    finished, results = run_engine(trades, workers=2, wallet_concurrency=1)
+    assert results == ['a1', 'a2', 'a3', 'b1']
+    assert finished.index('b1') < finished.index('a2')
+
+
+def test_one_slot_per_wallet_keeps_its_trades_in_submission_order():
+    trades = [('a', 'a1', 0.1), ('a', 'a2', 0.01), ('a', 'a3', 0.05), ('b', 'b1', 0.01), ('b', 'b2', 0.01)]
+    finished, _ = run_engine(trades, workers=4, wallet_concurrency=1)
+    assert [label for label in finished if label.startswith('a')] == ['a1', 'a2', 'a3']
+    assert [label for label in finished if label.startswith('b')] == ['b1', 'b2']
+
+
+def test_a_wallet_never_runs_more_trades_than_its_slots():
+    running = {'now': 0, 'peak': 0}
+
+    async def execute(seconds):
+        running['now'] += 1
+        running['peak'] = max(running['peak'], running['now'])
+        time.sleep(seconds)
+        running['now'] -= 1
+
+    async def main():
+        engine = TradeEngine(execute, workers=6, queue_size=2, wallet_concurrency=2, rpc_budget=0).start()
+        await asyncio.gather(*[engine.submit('a', 0.05) for _ in range(8)])
+        await engine.close()
+
+    asyncio.run(main())
+    assert running['peak'] == 2
+
+
+def test_failed_trades_free_the_wallet_slot():
+    async def execute(label):
+        if label == 'bad':
+            raise ValueError('reverted')
+        return label
+
+    async def main():
+        engine = TradeEngine(execute, workers=1, wallet_concurrency=1, rpc_budget=0).start()
+        results = await asyncio.gather(engine.submit('a', 'bad'), engine.submit('a', 'good'), return_exceptions=True)
+        await engine.close()
+        return results
+
+    bad, good = asyncio.run(main())
+    assert isinstance(bad, ValueError) and good == 'good'
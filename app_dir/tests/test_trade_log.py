@@ -0,0 +1,58 @@
+import csv
+import os
+from datetime import datetime
+import numpy as np
+from library import trade_log
+from library.trade_log import TradeLog, partition_name, read_latest
+
+HEADER = ['Time', 'Wallet', 'Action']
+
+
+def read_partition(folder, day=None):
+    with open(os.path.join(folder, partition_name(day)), newline='') as file:
+        return list(csv.reader(file))
+
+
+def test_rounds_append_to_the_day_partition_with_one_header(tmp_path):
+    log = TradeLog(str(tmp_path), HEADER)
+    log.extend([['t1', 'w1', 'buy'], ['t1', 'w2', 'sell, partial']])
+    assert log.flush() == 2
+    log.extend([['t2', 'w1', 'hold']])
+    assert log.flush() == 1
+    assert log.flush() == 0
+    assert read_partition(str(tmp_path)) == [HEADER, ['t1', 'w1', 'buy'], ['t1', 'w2', 'sell, partial'], ['t2', 'w1', 'hold']]
+    assert sorted(os.listdir(tmp_path)) == [partition_name(), trade_log.LATEST_POINTER]
+
+
+def test_each_day_gets_its_own_partition(tmp_path, monkeypatch):
+    log = TradeLog(str(tmp_path), HEADER)
+    monkeypatch.setattr(trade_log, 'partition_name', lambda: partition_name(datetime(2024, 1, 1)))
+    log.extend([['t1', 'w1', 'buy']])
+    log.flush()
+    monkeypatch.setattr(trade_log, 'partition_name', lambda: partition_name(datetime(2024, 1, 2)))
+    log.extend([['t2', 'w1', 'sell']])
+    log.flush()
+    assert read_partition(str(tmp_path), datetime(2024, 1, 1)) == [HEADER, ['t1', 'w1', 'buy']]
+    assert read_partition(str(tmp_path), datetime(2024, 1, 2)) == [HEADER, ['t2', 'w1', 'sell']]
+
+
+def test_no_action_rows_follow_the_policy(tmp_path):
+    actions = np.array(['buy', 'no_action', 'hold', 'no_action'])
+    assert TradeLog(str(tmp_path), HEADER, policy='drop').keep(actions).tolist() == [True, False, True, False]
+    assert TradeLog(str(tmp_path), HEADER, policy='keep').keep(actions).tolist() == [True, True, True, True]
+    assert TradeLog(str(tmp_path), HEADER, policy='sample', sample_rate=0).keep(actions).tolist() == [True, False, True, False]
+    assert TradeLog(str(tmp_path), HEADER, policy='sample', sample_rate=1).keep(actions).tolist() == [True, True, True, True]
+
+
+def test_the_latest_view_is_the_last_round_of_its_partition(tmp_path):
+    assert read_latest(str(tmp_path)) == (None, [])
+    log = TradeLog(str(tmp_path), HEADER)
+    log.extend([['t1', 'w1', 'buy'], ['t1', 'w2', 'sell, partial']])
+    log.flush()
+    assert read_latest(str(tmp_path)) == (HEADER, [['t1', 'w1', 'buy'], ['t1', 'w2', 'sell, partial']])
+    log.extend([['t2', 'w1', 'hold\nnote']])
+    log.flush()
+    assert read_latest(str(tmp_path)) == (HEADER, [['t2', 'w1', 'hold\nnote']])
+    log.flush()
+    assert read_latest(str(tmp_path)) == (HEADER, [])
+    assert sorted(os.listdir(tmp_path)) == [partition_name(), trade_log.LATEST_POINTER]
@@ -0,0 +1,74 @@
+import json
+import sqlite3
+import threading
+import pytest
+from library.wallet_store import WalletStore
+
+SETTINGS = {'BUY_TARGET': '1.05', 'SLIPPAGE': '5', 'AVAILABLE_BALANCE': '100', 'USED_BALANCE': 0, 'CURRENT_BALANCE': 100.0,
+            'current_holdings': {'coin': [1.0, 2.0, 3.0, 4.0]}}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = WalletStore(str(tmp_path / 'db' / 'wallets.db'))
+    assert store.add_wallet('w1', SETTINGS)
+    return store
+
+
+def test_wallets_round_trip_through_json(store, tmp_path):
+    assert store.export_json(str(tmp_path / 'wallets.json')) == 1
+    imported = WalletStore(str(tmp_path / 'copy.db'), str(tmp_path / 'wallets.json'))
+    assert imported.load_all() == store.load_all()
+    assert imported.get('w1') == {**SETTINGS, 'AVAILABLE_BALANCE': 100.0, 'USED_BALANCE': 0.0}
+    assert imported.get('missing') is None
+
+
+def test_state_and_settings_writes_do_not_overwrite_each_other(store):
+    store.save_state('w1', {**SETTINGS, 'AVAILABLE_BALANCE': 42, 'current_holdings': {}, 'BUY_TARGET': 'ignored'})
+    assert store.update_settings('w1', {'SLIPPAGE': '9'}) == {**SETTINGS, 'SLIPPAGE': '9', 'AVAILABLE_BALANCE': 42.0, 'USED_BALANCE': 0.0, 'current_holdings': {}}
+    assert store.update_settings('w1', {'current_holdings': "{'x': (1, 2)}"})['current_holdings'] == {'x': [1, 2]}
+    assert store.update_settings('missing', {'SLIPPAGE': '9'}) is None
+    assert not store.save_state('missing', SETTINGS)
+
+
+def test_update_settings_returns_the_row_it_wrote(store, monkeypatch):
+    monkeypatch.setattr(store, 'get', lambda name: pytest.fail('read back outside the transaction'))
+    assert store.update_settings('w1', {'BUY_TARGET': '2'})['BUY_TARGET'] == '2'
+
+
+def test_a_failed_update_rolls_back(store):
+    with pytest.raises(SyntaxError):
+        store.update_settings('w1', {'current_holdings': 'not holdings('})
+    assert store.load_all()['w1']['current_holdings'] == SETTINGS['current_holdings']
+    assert store.update_settings('w1', {'SLIPPAGE': '7'})['SLIPPAGE'] == '7'  # The write lock was released
+
+
+def test_concurrent_settings_updates_are_not_lost(store, tmp_path):
+    def writer(key):
+        other = WalletStore(str(tmp_path / 'db' / 'wallets.db'))
+        for value in range(20):
+            other.update_settings('w1', {key: value})
+
+    threads = [threading.Thread(target=writer, args=(f'KEY{i}',)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(store.get('w1')[f'KEY{i}'] == 19 for i in range(4))
+
+
+def test_every_connection_is_closed(store, monkeypatch):
+    opened = []
+    connect = store._connect
+    monkeypatch.setattr(store, '_connect', lambda: opened.append(connect()) or opened[-1])
+    store.load_all()
+    store.get('w1')
+    store.save_state('w1', SETTINGS)
+    store.update_settings('w1', {'SLIPPAGE': '1'})
+    store.add_wallet('w2', SETTINGS)
+    store.add_wallet('w2', SETTINGS)
+    store.delete_wallet('w2')
+    assert len(opened) == 7
+    for conn in opened:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute('SELECT 1')
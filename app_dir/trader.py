@@ -1,12 +1,23 @@
 import json
 import os
-import time, sys, csv
+import time, sys
 from dotenv import load_dotenv
-from library.transaction_builder import get_token_address, send_tele_message, trade_token as execute_trade
+from library.transaction_builder import get_token_address, max_buy_usd_within_impact, trade_token as execute_trade
+from library.token_registry import get_token_registry
+from library.snapshot_store import get_snapshot_store
+from library.price_record import EMPTY_RECORD, PriceRecord
+from library.trade_engine import TradeEngine
+from library.strategy import WalletStrategy
+from library.market_context import MarketContext
+from library.trade_log import TradeLog
+from library.round_summary import RoundSummary
+from library.token_state_store import get_token_state_store
+from library.wallet_store import get_wallet_store
+from library.notifier import get_notifier
 from loguru import logger
 import asyncio
+import numpy as np
 from datetime import datetime
-import shutil
 from prettytable import PrettyTable
 
 # Get the base directory (one level up from the current directory)
@@ -29,10 +40,11 @@ load_dotenv()
 error_conditions = set(os.getenv('SKIP_ERROR_CONDITIONS', 'insufficient input amount,transfer_from_failed').replace(" ", "").lower().split(','))
 debug_mode = os.getenv('DEBUG_MODE') == 'True'
 
-# Load trade settings for multiple wallets
+# Load trade settings for multiple wallets, the store imports WALLET_SETTINGS on first use
+wallet_store = get_wallet_store()
+
 def load_trade_settings():
-    with open(os.getenv('WALLET_SETTINGS'), 'r') as file:
-        return json.load(file)
+    return wallet_store.load_all()
 
 trade_settings = load_trade_settings()
 
@@ -43,73 +55,61 @@ twilio_auth_token = os.getenv('TWILIO_AUTH_TOKEN')
 desired_coin_list = os.getenv('DESIRED_COIN_FILE')
 available_coin_list = os.getenv('AVAILABLE_COIN_FILE')
 shit_coin_list = os.getenv('SHIT_COIN_FILE')
-token_state = os.getenv('TOKEN_STATE_FILE')
+token_state_store = get_token_state_store(os.getenv('TOKEN_STATE_FILE'))
+
+token_registry = get_token_registry(available_coin_list)
+
+# Telegram dispatcher, trades of a round are coalesced into one digest sent from its background thread
+notifier = get_notifier()
 
-available_coins = None
+# Executes the trades decided by analyze_market_conditions, created for each round's event loop in run_trade_round
+trade_engine = None
 
 
-# Initialize CSV file for logging trade actions
+# Trade action log, buffered during the round and appended to the day's CSV partition when it ends
 csv_folder = os.getenv('CSV_FOLDER')
-os.makedirs(csv_folder, exist_ok=True)
-csv_file_name = f"trade_actions_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-csv_file = open(os.path.join(csv_folder, csv_file_name), 'w', newline='')
-csv_writer = csv.writer(csv_file)
-# Initialize a CSV file for always updated log
-csv_latest_file_name = "trade_actions_log_latest.csv"
-csv_latest_file = open(os.path.join(csv_folder, csv_latest_file_name), 'w', newline='')
-csv_latest_writer = csv.writer(csv_latest_file)
+csv_header = ['Time', 'Wallet', 'Symbol', 'Volume', 'Comparison Price', 'Current Price', 'Real Price', 'Price Ratio', 'Action', 'Profits/Losses']
+trade_log = TradeLog(csv_folder, csv_header)
+round_summary = RoundSummary(csv_folder)  # Counts and PnL per wallet and action, saved next to the log every round
 
 def load_json_file(file_path):
     with open(file_path, 'r') as file:
         return json.load(file)
 
-def filter_market_data(binance_coins):
-    coin_lists = load_json_file(available_coin_list)
-    shit_coin_lists = set(load_json_file(shit_coin_list))
-    filtered_coins = {coin_id: coin_info['symbol'].lower() for coin_id, coin_info in coin_lists.items() if coin_info['symbol'].lower() in binance_coins and coin_id not in shit_coin_lists}
+def filter_market_data(binance_coins, blacklist):
+    filtered_coins = {coin_id: coin_info['symbol'].lower() for coin_id, coin_info in token_registry.coins.items() if coin_info['symbol'].lower() in binance_coins and coin_id not in blacklist}
     return filtered_coins
 
-def save_token_state(data, wallet_name):
-    wallet_specific_token_state = token_state.replace('token_state.json', f'token_state_{wallet_name}.json')
-    with open(wallet_specific_token_state, 'w') as file:
-        json.dump({"0": data}, file, indent=4)
-
-def load_token_state(wallet_name):
-    wallet_specific_token_state = token_state.replace('token_state.json', f'token_state_{wallet_name}.json')
-    if not os.path.exists(wallet_specific_token_state):
-        shutil.copy(token_state, wallet_specific_token_state)
-    with open(wallet_specific_token_state, 'r') as file:
-        data = json.load(file)
-        return data["0"]
-
-def modify_market_file_data(market_file, coin_id, real_price):
-    with open(market_file, 'r+') as file:
-        data = json.load(file)
-        if "0" in data and coin_id in data["0"]:
-            if len(data["0"][coin_id]) > 2:
-                data["0"][coin_id][-1] = real_price
-            else:
-                data["0"][coin_id].append(real_price)
-            file.seek(0)
-            json.dump(data, file, indent=4)
-            file.truncate()
-        logger.info(f"Updated market file {market_file} with real price for {coin_id}")
+def build_market_context(snapshot=None):
+    # Coin lists, blacklist and snapshots are loaded once per round, every wallet reads the same context
+    snapshot_store = get_snapshot_store(os.getenv('DATA_DIRECTORY'))
+    if snapshot is not None:
+        # Snapshot handed over in memory by the round engine, no need to read it back
+        latest_file, latest_data = snapshot
+    else:
+        latest_file, latest_data = snapshot_store.latest()
+
+    # Desired coins plus the shared registry, refreshed at round start, normalized to lowercase symbols
+    desired_coin_symbols = {coin.lower() for coin in load_json_file(desired_coin_list) if coin}
+    available_coin_symbols = {coin['symbol'].lower() for coin in token_registry.coins.values() if 'symbol' in coin and coin['symbol'] and 'id' in coin}
+    blacklist = set(load_json_file(shit_coin_list))
+    filtered_coins = filter_market_data(desired_coin_symbols | available_coin_symbols, blacklist)
+    logger.info(f"Notifier, Market Coin Data for this round: {len(filtered_coins)} coins")
+    return MarketContext(snapshot_store, latest_file, latest_data, filtered_coins, blacklist)
+
+def modify_market_file_data(snapshot_id, coin_id, real_price):
+    # Journal the executed price, readers of the snapshot store merge it on load
+    if get_snapshot_store(os.getenv('DATA_DIRECTORY')).patch(snapshot_id, coin_id, 'real_price', float(real_price)):
+        logger.info(f"Updated snapshot {snapshot_id} with real price for {coin_id}")
 
 def get_symbol_from_id(coin_id, filtered_coins=None):
-    global available_coins
     if filtered_coins is not None:
         symbol = filtered_coins.get(coin_id, {})
         if symbol:
             return symbol
-
-    if available_coins is None:
-        available_coins = load_json_file(available_coin_list)
-    # Directly access the symbol if coin_id is present in available_coins
-    symbol = available_coins.get(coin_id, {}).get('symbol')
-    if symbol:
-        return symbol
-    # Check if the coin_id matches any id in the available_coins
-    return next((coin['symbol'] for coin in available_coins.values() if coin.get('id') == coin_id), 'N/A')
+    # The registry resolves both coin keys and coin['id'] values
+    coin = token_registry.get(coin_id)
+    return coin.get('symbol') or 'N/A' if coin else 'N/A'
 
 async def determine_token_amount(wallet_settings, token_price, buy_amount):
     slippage = float(wallet_settings['SLIPPAGE'])
@@ -128,294 +128,272 @@ async def update_wallet_balance(wallet_settings, current_price):
         holding_price = float(holding_info[0])
         holding_usd_amount = float(holding_info[2]) if len(holding_info) > 2 else 0
         holding_token_amount = float(holding_info[3]) if len(holding_info) > 3 else 0
-        current_token_price = current_price.get(coin_id, [0, 0])[0]
+        current_token_price = current_price.get(coin_id, EMPTY_RECORD).price
         token_usd_amount = await determine_token_sell_amount(wallet_settings, current_token_price, holding_token_amount)
         current_balance += token_usd_amount
     wallet_settings['CURRENT_BALANCE'] = wallet_settings['AVAILABLE_BALANCE'] + current_balance
     return wallet_settings
 
 
+def log_signals(wallet_id, universe, signals):
+    # One row per evaluated coin the trade log keeps, no_action rows are dropped or sampled before any formatting
+    round_summary.record(wallet_id, signals.actions, signals.pnl, signals.symbols)
+    rows_kept = np.nonzero(trade_log.keep(signals.actions))[0]
+    positions = signals.positions[rows_kept]
+    now = time.strftime("%Y-%m-%d %H:%M:%S")
+    trade_log.extend([[now, wallet_id, signals.symbols[row].upper(), volume, f"{reference_price:.18f}", f"{price:.18f}", f"{real_price:.18f}", f"{ratio:.3f}", action, f"{pnl:.2f}" if pnl == pnl else "-"]
+                      for row, volume, reference_price, price, real_price, ratio, action, pnl in zip(
+                          rows_kept.tolist(), universe.volume[positions].tolist(), signals.reference_price[rows_kept].tolist(), universe.price[positions].tolist(),
+                          universe.real_price[positions].tolist(), signals.ratio[rows_kept].tolist(), signals.actions[rows_kept].tolist(), signals.pnl[rows_kept].tolist())])
+
 @logger.catch
-async def analyze_coin(coin_id, wallet_settings, wallet_id, latest_data, comparison_data, filtered_coins, token_state_data, wins_losses_lists, latest_file, tolerance, processed_coins, unprocessed_coins):
+async def exit_position(coin_id, action, wallet_settings, coin_data, coin_symbol, token_state_data, wins_losses_lists, latest_file):
     wins, losses, win_list, loss_list, buy_list = wins_losses_lists
-    coin_data = latest_data.get(coin_id, [0, 0])
-    coin_volume = float(coin_data[1])
-    current_price = float(coin_data[0])
-    token_price = current_price if len(coin_data) == 2 else float(coin_data[2])
-    coin_symbol = get_symbol_from_id(coin_id, filtered_coins)
-
-    # Early exit for low volume, invalid price, or significant price discrepancy
-    if (coin_volume < float(wallet_settings['MINIMUM_VOLUME']) or 
-        token_price <= 0.0 or 
-        coin_symbol == 'N/A' or 
-        (current_price > 0 and (token_price / current_price > 10 or current_price / token_price > 10))):
-        unprocessed_coins.add(coin_id)
-        return
-    
+    current_price = coin_data.price
+    token_price = coin_data.real_price
+    holding_info = wallet_settings['current_holdings'][coin_id]
+    holding_price = float(holding_info[0])
+    holding_usd_amount = float(holding_info[2]) if len(holding_info) > 2 else 0
+    holding_token_amount = float(holding_info[3]) if len(holding_info) > 3 else 0
     trade_status = {"status": False, "message": "Failed to execute trade", "real_price": token_price}
-    if coin_id in wallet_settings['current_holdings']:
-        holding_info = wallet_settings['current_holdings'][coin_id]
-        holding_price = float(holding_info[0])
-        holding_usd_amount = float(holding_info[2]) if len(holding_info) > 2 else 0
-        holding_token_amount = float(holding_info[3]) if len(holding_info) > 3 else 0
-        price_ratio = token_price / holding_price if holding_price != 0 else 0
-        sell_target_reached = round(price_ratio, len(str(wallet_settings['SELL_TARGET']).split('.')[1])) >= float(wallet_settings['SELL_TARGET'])
-        stop_loss_target_reached = round(price_ratio, len(str(wallet_settings['STOP_LOSS_TARGET']).split('.')[1])) <= float(wallet_settings['STOP_LOSS_TARGET'])
+    try:
+        if not wallet_settings.get('SIMULATION') == "True":
+            trade_status = await trade_engine.submit(wallet_settings.get('wallet_address'), get_token_address(coin_symbol.upper()), wallet_settings, 0, False, float(wallet_settings['SLIPPAGE']), expected_price=current_price)
+        holding_duration = (int(latest_file) - int(holding_info[1])) // 1000000
+        trade_list = win_list if action == 'sell' else loss_list
+        if trade_status["status"] or wallet_settings.get('SIMULATION') == "True":
+            real_price = trade_status.get("real_price", 0)
+            token_price = real_price if real_price != 0 else token_price
+            token_usd_amount = await determine_token_sell_amount(wallet_settings, token_price, holding_token_amount)
+            trade_list.append((holding_duration, coin_symbol.upper(), int(holding_info[1]), holding_price, int(latest_file), token_price, token_usd_amount, holding_usd_amount))
+            token_state_data[coin_id] = PriceRecord(current_price, coin_data.volume, token_price, coin_data.market_cap)  # Update specific token state on trade event
+            if action == 'sell':
+                wins += 1
+                wallet_settings['USED_BALANCE'] -= holding_usd_amount
+                wallet_settings['AVAILABLE_BALANCE'] += token_usd_amount
+            else:
+                losses += 1
+            wallet_settings['current_holdings'].pop(coin_id)
+            modify_market_file_data(latest_file, coin_id, token_price)
+        if not trade_status["status"] and not wallet_settings.get('SIMULATION', "False") == "True":
+            if any(error_condition in trade_status['message'].replace(" ", "").lower() for error_condition in error_conditions):
+                logger.error(f"Error executing {action} for coin {coin_id}: {trade_status['message']}")
+                wallet_settings['current_holdings'].pop(coin_id)
         if debug_mode:
-            logger.debug(f"[DEBUG] Comparing coin {coin_id} [DEBUG]\n\tCurrent price: {current_price:.18f}\n\tReal price: {token_price:.18f}\n\tHolding price: {holding_price:.18f}. \n\tPrice ratio: {price_ratio:.3f}. \n\tVolume: {coin_volume}. \n\tBuy: False \n\tSell: {sell_target_reached} \n\tStop Loss: {stop_loss_target_reached}")
-        action = 'sell' if sell_target_reached else 'stop_loss' if stop_loss_target_reached else 'hold'
-        token_usd_amount = await determine_token_sell_amount(wallet_settings, token_price, holding_token_amount)
-        csv_writer.writerow([time.strftime("%Y-%m-%d %H:%M:%S"), wallet_id, coin_symbol.upper(), coin_volume, f"{holding_price:.18f}", f"{current_price:.18f}", f"{token_price:.18f}", f"{price_ratio:.3f}", action, f"{token_usd_amount - holding_usd_amount:.2f}" if action != 'buy' and action != 'no_action' else "-"])
-        csv_latest_writer.writerow([time.strftime("%Y-%m-%d %H:%M:%S"), wallet_id, coin_symbol.upper(), coin_volume, f"{holding_price:.18f}", f"{current_price:.18f}", f"{token_price:.18f}", f"{price_ratio:.3f}", action, f"{token_usd_amount - holding_usd_amount:.2f}" if action != 'buy' and action != 'no_action' else "-"])
-        processed_coins.add(coin_id)
-        if sell_target_reached or stop_loss_target_reached:
-            should_execute = False
-            if wallet_settings.get('SIMULATION') == "True":
-                should_execute = True
-            elif action == 'sell' and current_price >= (token_price * (1 - tolerance)):
-                should_execute = True
-            elif action == 'stop_loss' and current_price <= (token_price * (1 + tolerance)):
-                should_execute = True
-            if should_execute:
-                try:
-                    if not wallet_settings.get('SIMULATION') == "True":
-                        trade_status = await execute_trade(get_token_address(coin_symbol.upper()), wallet_settings, 0, False, float(wallet_settings['SLIPPAGE']), expected_price=current_price)
-                    holding_duration = (int(latest_file) - int(holding_info[1])) // 1000000
-                    trade_list = win_list if action == 'sell' else loss_list
-                    if trade_status["status"] or wallet_settings.get('SIMULATION') == "True":
-                        real_price = trade_status.get("real_price", 0)
-                        token_price = real_price if real_price != 0 else token_price
-                        token_usd_amount = await determine_token_sell_amount(wallet_settings, token_price, holding_token_amount)
-                        trade_list.append((holding_duration, coin_symbol.upper(), int(holding_info[1]), "{:.18f}".format(holding_price), int(latest_file), "{:.18f}".format(token_price), "{:.18f}".format(token_usd_amount), holding_usd_amount))
-                        token_state_data[coin_id] = [str(current_price), str(coin_volume), str(token_price)]  # Update specific token state on trade event
-                        if action == 'sell':
-                            wins += 1
-                            wallet_settings['USED_BALANCE'] -= holding_usd_amount
-                            wallet_settings['AVAILABLE_BALANCE'] += token_usd_amount
-                        else:
-                            losses += 1
-                        wallet_settings['current_holdings'].pop(coin_id)
-                        modify_market_file_data(f"{os.getenv('DATA_DIRECTORY')}/{latest_file}", coin_id, token_price)
-                    if not trade_status["status"] and not wallet_settings.get('SIMULATION', "False") == "True":
-                        if any(error_condition in trade_status['message'].replace(" ", "").lower() for error_condition in error_conditions):
-                            logger.error(f"Error executing {action} for coin {coin_id}: {trade_status['message']}")
-                            wallet_settings['current_holdings'].pop(coin_id)
-                    if debug_mode:
-                        logger.debug(f"[DEBUG] Action {action} executed for coin {coin_id}. \n\tWins: {wins}, Losses: {losses}.")
-                except Exception as e:
-                    logger.error(f"Error executing {action} for coin {coin_id}: {e}")
-    else: 
-        if float(wallet_settings.get("AVAILABLE_BALANCE")) < float(wallet_settings.get("MINIMUM_BUY")):
-            unprocessed_coins.add(coin_id)
-            return
-        comparison_data_coin = comparison_data.get(coin_id, [0, 0])
-        if comparison_data_coin == [0, 0]:
-            token_state_data[coin_id] = [str(current_price), str(coin_volume), str(token_price)]  # Update token state data with new coin information
-        elif coin_id in filtered_coins or any(coin_id == coin_data['id'] for coin_data in available_coins.values() if 'id' in coin_data):
-            processed_coins.add(coin_id)
-            comparison_price = float(comparison_data_coin[0])
-            if current_price == 0 or comparison_price == 0:
-                unprocessed_coins.add(coin_id)
-                return
-            price_ratio = token_price / comparison_price
-            buy_target_reached = round(price_ratio, len(str(wallet_settings['BUY_TARGET']).split('.')[1])) <= float(wallet_settings['BUY_TARGET'])
+            logger.debug(f"[DEBUG] Action {action} executed for coin {coin_id}. \n\tWins: {wins}, Losses: {losses}.")
+    except Exception as e:
+        logger.error(f"Error executing {action} for coin {coin_id}: {e}")
+
+@logger.catch
+async def enter_position(coin_id, wallet_settings, coin_data, coin_symbol, token_state_data, wins_losses_lists, latest_file, tolerance):
+    buy_list = wins_losses_lists[4]
+    coin_volume = coin_data.volume
+    current_price = coin_data.price
+    token_price = coin_data.real_price
+    # Earlier buys of this round may have used up the balance since the signals were evaluated
+    if wallet_settings['AVAILABLE_BALANCE'] < float(wallet_settings['MINIMUM_BUY']):
+        return
+    if debug_mode:
+        logger.debug(f"[DEBUG] Buy target reached for coin {coin_id}. Try to buy...")
+    trade_status = {"status": False, "message": "Failed to execute trade", "real_price": token_price}
+    reserved_amount = 0
+    try:
+        if wallet_settings.get('SIMULATION') == "True" or (token_price * (1 - tolerance)) > 0:
+            buy_amount = max(min(float(wallet_settings['MAXIMUM_BUY']), coin_volume / float(wallet_settings['MAXIMUM_BUY'])), float(wallet_settings['MINIMUM_BUY']))
+            max_price_impact = float(wallet_settings.get('MAX_PRICE_IMPACT', 0))
+            if max_price_impact > 0:
+                # Size the buy from the round's reserve snapshot so it does not move the pool more than allowed
+                impact_limit = max_buy_usd_within_impact(get_token_address(coin_symbol.upper()), max_price_impact / 100)
+                if impact_limit is not None and impact_limit < float(wallet_settings['MINIMUM_BUY']):
+                    # Even the smallest allowed buy would move the pool too much (the pool fee alone may exceed the limit)
+                    logger.info(f"Skipping buy of {coin_symbol.upper()}: at most {impact_limit:.2f} USD fits within {max_price_impact}% price impact, below MINIMUM_BUY")
+                    return
+                if impact_limit is not None:
+                    buy_amount = min(buy_amount, impact_limit)
+            # Reserved before waiting on the trade engine, the wallet's other buys see the amount as spent
+            reserved_amount = buy_amount
+            wallet_settings['AVAILABLE_BALANCE'] -= buy_amount
+            wallet_settings['USED_BALANCE'] += buy_amount
+            if not wallet_settings.get('SIMULATION') == "True":
+                trade_status = await trade_engine.submit(wallet_settings.get('wallet_address'), get_token_address(coin_symbol.upper()), wallet_settings, buy_amount, True, float(wallet_settings['SLIPPAGE']), expected_price=current_price)
+            if wallet_settings.get('SIMULATION') == "True" or trade_status["status"]:
+                reserved_amount = 0
+                real_price = trade_status.get("real_price", 0)
+                token_price = real_price if real_price != 0 else token_price
+                token_amount = await determine_token_amount(wallet_settings, token_price, buy_amount)
+                wallet_settings['current_holdings'][coin_id] = (token_price, int(latest_file), buy_amount, token_amount)
+                buy_list.append((coin_symbol.upper(), token_price, buy_amount, token_amount))
+                modify_market_file_data(latest_file, coin_id, token_price)
+                token_state_data[coin_id] = PriceRecord(token_price, coin_volume, token_price, coin_data.market_cap)  # Update token state data with current coin information
             if debug_mode:
-                logger.debug(f"[DEBUG] Comparing coin {coin_id} [DEBUG]\n\tCurrent price: {current_price:.18f}\n\tReal price: {token_price:.18f}\n\tComparison price: {comparison_price:.18f}. \n\tPrice ratio: {price_ratio:.3f}. \n\tVolume: {coin_volume}. \n\tBuy: {buy_target_reached} \n\tSell: False \n\tStop Loss: False")
-            action = 'buy' if buy_target_reached else 'no_action'
-            csv_writer.writerow([time.strftime("%Y-%m-%d %H:%M:%S"), wallet_id, coin_symbol.upper(), coin_volume, f"{comparison_price:.18f}", f"{current_price:.18f}", f"{token_price:.18f}", f"{price_ratio:.3f}", action, "-"])
-            csv_latest_writer.writerow([time.strftime("%Y-%m-%d %H:%M:%S"), wallet_id, coin_symbol.upper(), coin_volume, f"{comparison_price:.18f}", f"{current_price:.18f}", f"{token_price:.18f}", f"{price_ratio:.3f}", action, "-"])
-            if buy_target_reached and wallet_settings['AVAILABLE_BALANCE'] >= float(wallet_settings['MINIMUM_BUY']):
-                if debug_mode:
-                    logger.debug(f"[DEBUG] Buy target reached for coin {coin_id}. Try to buy...")
-                try:
-                    if wallet_settings.get('SIMULATION') == "True" or (token_price * (1 - tolerance)) > 0:
-                        buy_amount = max(min(float(wallet_settings['MAXIMUM_BUY']), coin_volume / float(wallet_settings['MAXIMUM_BUY'])), float(wallet_settings['MINIMUM_BUY']))
-                        if not wallet_settings.get('SIMULATION') == "True":
-                            trade_status = await execute_trade(get_token_address(coin_symbol.upper()), wallet_settings, buy_amount, True, float(wallet_settings['SLIPPAGE']), expected_price=current_price)
-                        if wallet_settings.get('SIMULATION') == "True" or trade_status["status"]:
-                            real_price = trade_status.get("real_price", 0)
-                            token_price = real_price if real_price != 0 else token_price
-                            token_amount = await determine_token_amount(wallet_settings, token_price, buy_amount)
-                            wallet_settings['current_holdings'][coin_id] = ("{:.18f}".format(token_price), int(latest_file), buy_amount, token_amount)
-                            buy_list.append((coin_symbol.upper(), "{:.18f}".format(token_price), buy_amount, token_amount))
-                            modify_market_file_data(f"{os.getenv('DATA_DIRECTORY')}/{latest_file}", coin_id, token_price)
-                            token_state_data[coin_id] = [str(token_price), str(coin_volume), str(token_price)]  # Update token state data with current coin information
-                            wallet_settings['AVAILABLE_BALANCE'] -= buy_amount
-                            wallet_settings['USED_BALANCE'] += buy_amount
-                        if debug_mode:
-                            logger.debug(f"[DEBUG] Buy action prepared for coin {coin_id}. \n\tCurrent price: {current_price}, \n\tToken price: {token_price}, \n\tVolume considered for buy: {min(wallet_settings['MAXIMUM_BUY'], coin_volume / wallet_settings['MAXIMUM_BUY'])}.")
-                except Exception as e:
-                    logger.error(f"Error preparing buy for coin {coin_id}: {e}")
+                logger.debug(f"[DEBUG] Buy action prepared for coin {coin_id}. \n\tCurrent price: {current_price}, \n\tToken price: {token_price}, \n\tBuy amount: {buy_amount}.")
+    except Exception as e:
+        logger.error(f"Error preparing buy for coin {coin_id}: {e}")
+    if reserved_amount:
+        # The buy did not go through, release the reservation
+        wallet_settings['AVAILABLE_BALANCE'] += reserved_amount
+        wallet_settings['USED_BALANCE'] -= reserved_amount
 
 @logger.catch
-async def analyze_market_conditions(wallet_settings, wallet_id, filtered_coins, data_folder):
+async def analyze_market_conditions(wallet_settings, wallet_id, context):
     tolerance = float(wallet_settings.get('PRICE_DIFF_TOLERANCE', '0'))
-    market_data_files = sorted(os.listdir(data_folder))
     if float(wallet_settings.get("AVAILABLE_BALANCE")) < float(wallet_settings.get("MINIMUM_BUY")):
         logger.warning(f"No available balance in wallet {wallet_id}.\n Buy actions will not happens, please add more funds to your wallet.")
-    if len(market_data_files) < 10:
+    if context.round_count < 10:
         logger.warning(f"Not enough market data files for analysis in wallet {wallet_id}.")
         return 0, 0, [], [], [], wallet_settings
     
     trade_mode = wallet_settings.get('TRADE_MODE', 'TimeFrame')
-    comparison_file_index = -int(wallet_settings.get('TIMEFRAME', 1))
-    comparison_file = f"{data_folder}/{market_data_files[comparison_file_index]}" if trade_mode == 'TimeFrame' else token_state
-    latest_file = market_data_files[-1]
-    latest_data = load_json_file(f"{data_folder}/{latest_file}")["0"]
-    comparison_data = load_json_file(comparison_file)["0"] if comparison_file != token_state else load_token_state(wallet_id)
+    latest_file, latest_data, universe, filtered_coins = context.snapshot_id, context.latest_data, context.universe, context.filtered_coins
+    # The wallet's overlay on the shared token state, updated by its trades and newly seen coins
+    token_state_data = token_state_store.wallet(wallet_id)
+    if trade_mode == 'TimeFrame':
+        comparison_price = context.comparison_price(int(wallet_settings.get('TIMEFRAME', 1)))
+    else:
+        comparison_price = token_state_data.aligned_price(universe)
     wins, losses, win_list, loss_list, buy_list = 0, 0, [], [], []
-    token_state_data = comparison_data
-    coin_ids = set(latest_data.keys()) | set(wallet_settings['current_holdings'].keys())
-
-    processed_coins = set()
-    unprocessed_coins = set()
     wins_losses_lists = [wins, losses, win_list, loss_list, buy_list]
-    
-    logger.info(f"Analyzing {len(coin_ids)} coins based on recent and comparable data.")
+
+    logger.info(f"Analyzing {len(set(latest_data) | set(wallet_settings['current_holdings']))} coins based on recent and comparable data.")
     wallet_settings = await update_wallet_balance(wallet_settings, latest_data)
-    tasks = [analyze_coin(coin_id, wallet_settings, wallet_id, latest_data, comparison_data, filtered_coins, token_state_data, wins_losses_lists, latest_file, tolerance, processed_coins, unprocessed_coins) for coin_id in coin_ids]
+
+    # Conditions are evaluated for the whole universe at once, only coins that trigger a trade reach the per-coin path
+    strategy = WalletStrategy(wallet_settings)
+    symbol_of = lambda coin_id: get_symbol_from_id(coin_id, filtered_coins)
+    exits = strategy.evaluate_exits(universe, wallet_settings['current_holdings'], symbol_of)
+    log_signals(wallet_id, universe, exits)
+    processed_coins, unprocessed_coins = len(exits.coin_ids), len(exits.skipped)
+    tasks = [exit_position(coin_id, action, wallet_settings, latest_data[coin_id], symbol, token_state_data, wins_losses_lists, latest_file)
+             for coin_id, symbol, action, execute in zip(exits.coin_ids, exits.symbols, exits.actions.tolist(), exits.execute.tolist()) if execute]
+    if float(wallet_settings.get("AVAILABLE_BALANCE")) >= float(wallet_settings.get("MINIMUM_BUY")):
+        entries = strategy.evaluate_entries(universe, comparison_price, wallet_settings['current_holdings'], symbol_of, lambda coin_id: coin_id in filtered_coins or token_registry.has_id(coin_id))
+        log_signals(wallet_id, universe, entries)
+        processed_coins += len(entries.coin_ids)
+        unprocessed_coins += len(entries.skipped)
+        for coin_id in entries.unseen:
+            token_state_data[coin_id] = latest_data[coin_id]  # First sighting becomes the coin's comparison point
+        tasks += [enter_position(coin_id, wallet_settings, latest_data[coin_id], symbol, token_state_data, wins_losses_lists, latest_file, tolerance)
+                  for coin_id, symbol, execute in zip(entries.coin_ids, entries.symbols, entries.execute.tolist()) if execute]
+    else:
+        unprocessed_coins += len(universe) - len(set(latest_data) & set(wallet_settings['current_holdings']))
+    if debug_mode:
+        logger.debug(f"[DEBUG] Wallet {wallet_id}: {len(tasks)} of {processed_coins} evaluated coins trigger a trade.")
     await asyncio.gather(*tasks)
 
     wins, losses, win_list, loss_list, buy_list = wins_losses_lists
-    # Update the token state data file with the latest analysis results
-    save_token_state(token_state_data, wallet_id)
-    logger.info(f"Analysis complete on wallet {wallet_id}. Processed Coins: {len(processed_coins)}, Unprocessed Coins: {len(unprocessed_coins)}")
+    # Append the entries this round changed to the wallet's token state overlay
+    token_state_data.save()
+    logger.info(f"Analysis complete on wallet {wallet_id}. Processed Coins: {processed_coins}, Unprocessed Coins: {unprocessed_coins}")
     
     return wins, losses, win_list, loss_list, buy_list, wallet_settings
 
 @logger.catch
-async def notify_trades(win_list, loss_list, buy_list, notification_targets, twilio_account_sid, twilio_auth_token, wallet_id):
-    tasks = []
-    delay_between_messages = 60  # Delay in seconds, adjust as needed based on rate limit specifics
-
-    async def schedule_message(trade, action):
-        try:
-            price_change_percentage = 0
-            if action != "Buy":
-                profit_gained = float(trade[6]) - float(trade[7])
-                price_change_percentage = ((float(trade[6]) / float(trade[7]) - 1.0) * 100) if float(trade[7]) != 0 else 0
-            if action == "Buy":
-                message_content = f"🚀 <b>BUY ALERT</b> 🚀\n<b>Coin:</b> {trade[0].upper()} on <b>Wallet:</b> {wallet_id}\n<b>Price:</b> {format(float(trade[1]), '.18f')} USD\n<b>Amount:</b> ${format(trade[2], '.2f')}\n<b>Expected Tokens:</b> {format(trade[3], '.5f')} {trade[0].upper()}"
-            else:
-                change_direction = 'increase' if profit_gained >= 0 else 'decrease'
-                message_content = f"🔔 <b>{action.upper()} ALERT</b> 🔔\n<b>Coin:</b> {trade[1].upper()} on <b>Wallet:</b> {wallet_id}\n<b>Price:</b> {format(float(trade[5]), '.18f')} USD\n<b>Change:</b> {change_direction} of {format(price_change_percentage, '.2f')}%\n<b>USD Received:</b> {format(float(trade[6]), '.5f')} USD\n<b>Profit:</b> ${format(profit_gained, '.5f')}"
-                days, remainder = divmod(trade[0], 86400)
-                hours, remainder = divmod(remainder, 3600)
-                minutes, seconds = divmod(remainder, 60)
-                message_content += f"\n<b>Holding Duration:</b> {days} days, {hours} hours, {minutes} minutes, and {seconds} seconds"
-            await asyncio.sleep(delay_between_messages)  # Delay to prevent rate limit issues
-            await send_tele_message(message_content, True)
-        except Exception as e:
-            logger.error(f"Error in wallet {wallet_id}: {e}")
-
-    tasks.extend([asyncio.create_task(schedule_message(trade, action)) for action, trade_list in [("Sell", win_list), ("Stop Loss", loss_list), ("Buy", buy_list)] for trade in trade_list])
-
-    # Await all scheduled tasks to complete
-    await asyncio.gather(*tasks)
+def notify_trades(win_list, loss_list, buy_list, notification_targets, twilio_account_sid, twilio_auth_token, wallet_id):
+    # Each trade becomes a line of the round's digest, sent once by the notifier when the round ends
+    for action, trade_list in [("Sell", win_list), ("Stop Loss", loss_list), ("Buy", buy_list)]:
+        for trade in trade_list:
+            try:
+                if action == "Buy":
+                    line = f"🚀 <b>BUY</b> {trade[0].upper()} at {format(float(trade[1]), '.18f')} USD, ${format(trade[2], '.2f')} for {format(trade[3], '.5f')} {trade[0].upper()}"
+                else:
+                    profit_gained = float(trade[6]) - float(trade[7])
+                    price_change_percentage = ((float(trade[6]) / float(trade[7]) - 1.0) * 100) if float(trade[7]) != 0 else 0
+                    change_direction = 'increase' if profit_gained >= 0 else 'decrease'
+                    days, remainder = divmod(trade[0], 86400)
+                    hours, remainder = divmod(remainder, 3600)
+                    minutes, seconds = divmod(remainder, 60)
+                    line = (f"🔔 <b>{action.upper()}</b> {trade[1].upper()} at {format(float(trade[5]), '.18f')} USD, {change_direction} of {format(price_change_percentage, '.2f')}%, "
+                            f"received {format(float(trade[6]), '.5f')} USD, profit ${format(profit_gained, '.5f')}, held {days}d {hours}h {minutes}m {seconds}s")
+                notifier.add(f"Wallet: {wallet_id}", line)
+            except Exception as e:
+                logger.error(f"Error in wallet {wallet_id}: {e}")
 
 @logger.catch
-async def process_wallet(wallet_id, wallet_settings):
-    global available_coins
+async def process_wallet(wallet_id, wallet_settings, context):
     try:
-        # Load desired and available coins from configuration files
-        desired_coins = load_json_file(desired_coin_list)
-        available_coins = load_json_file(available_coin_list)
-        
-        # Extract symbols and normalize to lowercase
-        desired_coin_symbols = {coin.lower() for coin in desired_coins if coin}
-        available_coin_symbols = {coin['symbol'].lower() for coin in available_coins.values() if 'symbol' in coin and coin['symbol'] and 'id' in coin}
-        
-        # Combine symbols from both sets to form a comprehensive list
-        binance_coins = list(desired_coin_symbols | available_coin_symbols)
-        
-        # Filter out unwanted coins based on market data
-        filtered_coins = filter_market_data(binance_coins)
-        
-        # Log the number of coins processed
-        logger.info(f"Notifier, Market Coin Data for {wallet_id}: {len(filtered_coins)} coins")
-        
         # Analyze market conditions and update wallet settings
-        wins, losses, win_list, loss_list, buy_list, wallet_settings = await analyze_market_conditions(wallet_settings, wallet_id, filtered_coins, os.getenv('DATA_DIRECTORY'))
+        wins, losses, win_list, loss_list, buy_list, wallet_settings = await analyze_market_conditions(wallet_settings, wallet_id, context)
         
-        # Persist updated wallet settings to file
-        with open(os.getenv('WALLET_SETTINGS'), "r+") as f:
-            data = json.load(f)
-            data[wallet_id] = wallet_settings
-            f.seek(0)
-            json.dump(data, f, indent=4)
-            f.truncate()
+        # Persist this wallet's balances and holdings, settings edited meanwhile in the GUI are left alone
+        wallet_store.save_state(wallet_id, wallet_settings)
         
-        # Notify trades asynchronously to improve performance
-        await notify_trades(win_list, loss_list, buy_list, notification_targets, twilio_account_sid, twilio_auth_token, wallet_id)
+        # Queue the wallet's trades for the round digest, the round never waits on Telegram
+        notify_trades(win_list, loss_list, buy_list, notification_targets, twilio_account_sid, twilio_auth_token, wallet_id)
     except Exception as e:
         logger.error(f"Error processing wallet {wallet_id}: {e}")
 
 
-if __name__ == "__main__":
+def summarize_round():
+    # Summarize the round in a table, from the running counts and PnL kept while wallets decided
+    wallet_summary = {}
+    for wallet_id, actions in round_summary.round_totals().items():
+        totals = {action: actions.get(action, {'rows': 0, 'pnl': 0.0}) for action in ('buy', 'sell', 'stop_loss', 'hold')}
+        wallet_summary[wallet_id] = {'Processed Coins': sum(entry['rows'] for action, entry in actions.items() if action != 'no_action'),
+                                     'Buy Count': totals['buy']['rows'], 'Sell Count': totals['sell']['rows'] + totals['stop_loss']['rows'], 'Hold Count': totals['hold']['rows'],
+                                     'Sell PNL': totals['sell']['pnl'], 'Hold PNL': totals['hold']['pnl'], 'Total PNL': sum(entry['pnl'] for entry in actions.values())}
+
+    # Creating a beautiful table for the summary for each wallet
+    table = PrettyTable()
+    wallet_ids = list(wallet_summary.keys())
+    table.field_names = ["Metric"] + [f"{wallet_id.upper()}" for wallet_id in wallet_ids]
+    
+    processed_coins = ["Processed Coins"] + [summary['Processed Coins'] for summary in wallet_summary.values()]
+    buy_counts = ["Buy Count"] + [summary['Buy Count'] for summary in wallet_summary.values()]
+    sell_counts = ["Sell Count"] + [summary['Sell Count'] for summary in wallet_summary.values()]
+    hold_counts = ["Hold Count"] + [summary['Hold Count'] for summary in wallet_summary.values()]
+    sell_pnls = ["Sell PNL"] + [f"{summary['Sell PNL']:.2f} USD" for summary in wallet_summary.values()]
+    hold_pnls = ["Hold PNL"] + [f"{summary['Hold PNL']:.2f} USD" for summary in wallet_summary.values()]
+    total_pnls = ["Total PNL"] + [f"{summary['Total PNL']:.2f} USD" for summary in wallet_summary.values()]
+    
+    table.add_row(processed_coins)
+    table.add_row(buy_counts)
+    table.add_row(sell_counts)
+    table.add_row(hold_counts)
+    table.add_row(sell_pnls)
+    table.add_row(hold_pnls)
+    table.add_row(total_pnls)
+    
+    print("Round Summary for All Wallets:")
+    print(table)
+
+async def run_wallets(snapshot=None):
+    # Every enabled wallet analyzes at once, their trades go through one engine bound to this round's event loop
+    global trade_engine
+    context = build_market_context(snapshot)
+    trade_engine = TradeEngine(execute_trade).start()
+    try:
+        tasks = [process_wallet(wallet_id, wallet_settings, context) for wallet_id, wallet_settings in trade_settings.items() if wallet_settings.get('enabled') == "True"]
+        await asyncio.gather(*tasks)
+    finally:
+        await trade_engine.close()
+        notifier.flush_digest(f"📈 <b>Trades of the round at {datetime.now().strftime('%Y-%m-%d %H:%M')}</b>")
+
+def run_trade_round(snapshot=None):
+    # One trading round as a plain function, callable repeatedly from the long-lived round engine
+    global trade_settings
+    trade_settings = load_trade_settings()  # Wallet settings change between rounds (GUI edits, previous round results)
     if not trade_settings:
-        logger.error("No trade settings found. Please check your WALLET_SETTINGS configuration.")
-        sys.exit(1)
-    else:
-        try:
-            csv_writer.writerow(['Time', 'Wallet', 'Symbol', 'Volume', 'Comparison Price', 'Current Price', 'Real Price', 'Price Ratio', 'Action', 'Profits/Losses'])
-            csv_latest_writer.writerow(['Time', 'Wallet', 'Symbol', 'Volume', 'Comparison Price', 'Current Price', 'Real Price', 'Price Ratio', 'Action', 'Profits/Losses'])
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            tasks = [process_wallet(wallet_id, wallet_settings) for wallet_id, wallet_settings in trade_settings.items() if wallet_settings.get('enabled') == "True"]
-            loop.run_until_complete(asyncio.gather(*tasks))
-            # Close the CSV files after all tasks are completed
-            csv_file.close()
-            csv_latest_file.close()
-            # Summarize the round in a table
-            with open(os.path.join(csv_folder, csv_file_name), 'r') as file:
-                reader = csv.DictReader(file)
-                wallet_summary = {}
-                for row in reader:
-                    wallet_id = row['Wallet']
-                    if wallet_id not in wallet_summary:
-                        wallet_summary[wallet_id] = {'Processed Coins': 0, 'Buy Count': 0, 'Sell Count': 0, 'Hold Count': 0, 'Sell PNL': 0, 'Hold PNL': 0, 'Total PNL': 0}
-                    
-                    if row['Action'] != 'no_action':
-                        wallet_summary[wallet_id]['Processed Coins'] += 1
-                    if row['Action'] == 'buy':
-                        wallet_summary[wallet_id]['Buy Count'] += 1
-                    elif row['Action'] == 'sell' or row['Action'] == 'stop_loss':
-                        wallet_summary[wallet_id]['Sell Count'] += 1
-                    elif row['Action'] == 'hold':
-                        wallet_summary[wallet_id]['Hold Count'] += 1
-                    
-                    if row['Profits/Losses'] != "-":
-                        pnl = float(row['Profits/Losses'])
-                        if row['Action'] == 'sell':
-                            wallet_summary[wallet_id]['Sell PNL'] += pnl
-                        elif row['Action'] == 'hold':
-                            wallet_summary[wallet_id]['Hold PNL'] += pnl
-                        wallet_summary[wallet_id]['Total PNL'] += pnl
-
-                # Creating a beautiful table for the summary for each wallet
-                table = PrettyTable()
-                wallet_ids = list(wallet_summary.keys())
-                table.field_names = ["Metric"] + [f"{wallet_id.upper()}" for wallet_id in wallet_ids]
-                
-                processed_coins = ["Processed Coins"] + [summary['Processed Coins'] for summary in wallet_summary.values()]
-                buy_counts = ["Buy Count"] + [summary['Buy Count'] for summary in wallet_summary.values()]
-                sell_counts = ["Sell Count"] + [summary['Sell Count'] for summary in wallet_summary.values()]
-                hold_counts = ["Hold Count"] + [summary['Hold Count'] for summary in wallet_summary.values()]
-                sell_pnls = ["Sell PNL"] + [f"{summary['Sell PNL']:.2f} USD" for summary in wallet_summary.values()]
-                hold_pnls = ["Hold PNL"] + [f"{summary['Hold PNL']:.2f} USD" for summary in wallet_summary.values()]
-                total_pnls = ["Total PNL"] + [f"{summary['Total PNL']:.2f} USD" for summary in wallet_summary.values()]
-                
-                table.add_row(processed_coins)
-                table.add_row(buy_counts)
-                table.add_row(sell_counts)
-                table.add_row(hold_counts)
-                table.add_row(sell_pnls)
-                table.add_row(hold_pnls)
-                table.add_row(total_pnls)
-                
-                print("Round Summary for All Wallets:")
-                print(table)
-        except Exception as e:
-            logger.error(f"Unexpected error encountered: {e}")
-            sys.exit(1)
+        logger.error("No trade settings found. Please check your WALLET_SETTINGS configuration or the wallet store.")
+        return False
+    token_registry.refresh()  # The fetcher rewrites the coin list every round
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(run_wallets(snapshot))
+    finally:
+        # Append the round's trade actions once all tasks are completed
+        trade_log.flush()
+        round_summary.flush()
+        loop.close()
+    summarize_round()
+    return True
 
+
+if __name__ == "__main__":
+    try:
+        if not run_trade_round():
+            sys.exit(1)
+        notifier.drain()  # The dispatcher thread dies with the process, let the round's digest go out first
+    except Exception as e:
+        logger.error(f"Unexpected error encountered: {e}")
+        sys.exit(1)